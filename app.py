@@ -1,10 +1,33 @@
+import importlib
 import streamlit as st
-from module.data_downloader import show_downloader
-from module.candlestick import show_candlestick
-from module.monthly_analysis import show_monthly_analysis
-from module.sharpe_ratio import show_sharpe_analysis
-from module.november_analysis import show_november_analysis
-from module.market_cycle import show_market_cycle
+from module.instrumentation import (PERF_LOG_TAIL_RECORDS, span, trace_page, new_session_id, load_perf_log,
+                                    summarize_perf_log)
+
+# 页面注册表：页面名称 -> (按钮 key, 页面模块, 页面函数)，按侧边栏顺序排列
+# 页面模块在第一次打开该页面时才导入，启动和导航栏的首次渲染不需要加载 pandas、yfinance、plotly 等依赖
+PAGES = {
+    '下载数据': ('btn_download', 'module.data_downloader', 'show_downloader'),
+    'K线图': ('btn_candlestick', 'module.candlestick', 'show_candlestick'),
+    '月度分析': ('btn_monthly', 'module.monthly_analysis', 'show_monthly_analysis'),
+    '月夏普比率': ('btn_sharpe', 'module.sharpe_ratio', 'show_sharpe_analysis'),
+    '单月分析': ('btn_november', 'module.november_analysis', 'show_november_analysis'),
+    '牛熊市分析': ('btn_market_cycle', 'module.market_cycle', 'show_market_cycle'),
+}
+
+
+def load_page(page):
+    """导入页面模块并返回页面函数；已导入的模块由 sys.modules 缓存，之后的重新运行不再有导入开销"""
+    _, module_name, function_name = PAGES[page]
+    return getattr(importlib.import_module(module_name), function_name)
+
+def show_perf_panel(trace):
+    """侧边栏性能调试面板：本次渲染的各计时区间和跨会话汇总"""
+    from module.db_manager import frame_cache
+    st.sidebar.subheader('性能调试')
+    st.sidebar.caption(f"{trace.page}: {trace.total_ms:.0f} ms；数据缓存命中 {frame_cache.hits} 次，未命中 {frame_cache.misses} 次")
+    st.sidebar.dataframe(trace.to_frame(), hide_index=True)
+    with st.sidebar.expander(f'最近 {PERF_LOG_TAIL_RECORDS} 次渲染汇总(ms)'):
+        st.dataframe(summarize_perf_log(load_perf_log()))
 
 def main():
     st.sidebar.title('导航')
@@ -41,37 +64,33 @@ def main():
     if 'current_page' not in st.session_state:
         st.session_state.current_page = '下载数据'
     
-    # 创建按钮
-    if st.sidebar.button('下载数据', key='btn_download'):
-        st.session_state.current_page = '下载数据'
-    
-    if st.sidebar.button('K线图', key='btn_candlestick'):
-        st.session_state.current_page = 'K线图'
+    # 标的选择框的位置，导航按钮渲染之后再填充
+    symbol_slot = st.sidebar.container()
     
-    if st.sidebar.button('月度分析', key='btn_monthly'):
-        st.session_state.current_page = '月度分析'
-        
-    if st.sidebar.button('月夏普比率', key='btn_sharpe'):
-        st.session_state.current_page = '月夏普比率'
-        
-    if st.sidebar.button('11月分析', key='btn_november'):
-        st.session_state.current_page = '11月分析'
-        
-    if st.sidebar.button('牛熊市分析', key='btn_market_cycle'):
-        st.session_state.current_page = '牛熊市分析'
+    # 创建按钮
+    for page, (button_key, _, _) in PAGES.items():
+        if st.sidebar.button(page, key=button_key):
+            st.session_state.current_page = page
     
-    # 页面映射
-    pages = {
-        '下载数据': show_downloader,
-        'K线图': show_candlestick,
-        '月度分析': show_monthly_analysis,
-        '月夏普比率': show_sharpe_analysis,
-        '11月分析': show_november_analysis,
-        '牛熊市分析': show_market_cycle
-    }
+    # db_manager 依赖 pandas，首次导入较慢，放在导航按钮渲染之后
+    from module.db_manager import DBManager, DEFAULT_SYMBOL, symbol_name
+
+    # 选择分析的标的，各页面从session_state读取
+    symbols = DBManager().get_symbols() or [DEFAULT_SYMBOL]
+    if st.session_state.get('symbol') not in symbols:
+        st.session_state.symbol = DEFAULT_SYMBOL if DEFAULT_SYMBOL in symbols else symbols[0]
+    symbol_slot.selectbox('标的', symbols, key='symbol', format_func=lambda s: s if symbol_name(s) == s else f"{s} {symbol_name(s)}")
     
-    # 显示当前选中的页面
-    pages[st.session_state.current_page]()
+    # 显示当前选中的页面，并记录各阶段耗时
+    if 'session_id' not in st.session_state:
+        st.session_state.session_id = new_session_id()
+    debug = st.sidebar.checkbox('性能调试', key='perf_debug')
+    with trace_page(st.session_state.current_page, session=st.session_state.session_id, symbol=st.session_state.symbol) as trace:
+        with span('import_page'):
+            show_page = load_page(st.session_state.current_page)
+        show_page()
+    if debug:
+        show_perf_panel(trace)
 
 if __name__ == '__main__':
     main() 
\ No newline at end of file
@@ -0,0 +1,121 @@
+"""并发读取与写入：多个读线程在 save_data 写入期间的读取延迟
+
+在临时目录中生成多标的合成数据，先测量空闲时 N 个读线程的读取延迟，
+再在另一个线程批量写入新标的期间重复测量。WAL 模式下读取不等待写入事务，
+写入期间的最大读取延迟应远小于写入耗时。
+另外对比每次新建连接与从连接池借出连接的开销。
+用法: python -m benchmarks.bench_concurrency [--readers 8] [--symbols 50] [--years 15] [--writes 20]
+"""
+import argparse
+import sqlite3
+import tempfile
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.synthetic import make_ohlcv
+from module.db_manager import DBManager, frame_cache
+
+
+def _reader(db_manager, symbols, stop, latencies, errors, seed):
+    """不断读取随机标的最近一年的收盘价（不经过缓存），记录每次读取的耗时"""
+    rng = np.random.default_rng(seed)
+    while not stop.is_set():
+        symbol = symbols[rng.integers(len(symbols))]
+        start = time.perf_counter()
+        try:
+            db_manager._read_data(symbol, '2014-01-01', None, ['close'], False)
+        except sqlite3.Error as e:
+            errors.append(repr(e))
+            continue
+        latencies.append((time.perf_counter() - start) * 1000)
+
+
+def _run_readers(db_manager, symbols, n_readers, work):
+    """启动读线程，执行 work()（或等待 work 秒），返回 (读取延迟, 错误, work 的耗时)"""
+    stop = threading.Event()
+    latencies, errors = [], []
+    threads = [
+        threading.Thread(target=_reader, args=(db_manager, symbols, stop, latencies, errors, i))
+        for i in range(n_readers)
+    ]
+    for thread in threads:
+        thread.start()
+    start = time.perf_counter()
+    if callable(work):
+        work()
+    else:
+        time.sleep(work)
+    elapsed = time.perf_counter() - start
+    stop.set()
+    for thread in threads:
+        thread.join()
+    return np.array(latencies), errors, elapsed
+
+
+def _summary(label, latencies, errors, elapsed):
+    return {
+        '场景': label,
+        '读取次数': len(latencies),
+        '读取/秒': len(latencies) / elapsed,
+        'p50_ms': np.percentile(latencies, 50) if len(latencies) else np.nan,
+        'p95_ms': np.percentile(latencies, 95) if len(latencies) else np.nan,
+        'max_ms': latencies.max() if len(latencies) else np.nan,
+        '错误': len(errors),
+        '耗时_s': elapsed,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--readers', type=int, default=8)
+    parser.add_argument('--symbols', type=int, default=50)
+    parser.add_argument('--years', type=int, default=15)
+    parser.add_argument('--writes', type=int, default=20, help='写入期间新增的标的数')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as db_dir:
+        db_manager = DBManager(db_dir)
+        symbols = [f"SYM{i:04d}" for i in range(args.symbols)]
+        for i, symbol in enumerate(symbols):
+            db_manager.save_data(make_ohlcv(args.years * 252, seed=i), symbol)
+        frame_cache.invalidate()
+        new_data = [make_ohlcv(args.years * 252, seed=args.symbols + i) for i in range(args.writes)]
+
+        def ingest():
+            for i, df in enumerate(new_data):
+                db_manager.save_data(df, f"NEW{i:04d}")
+
+        rows = [_summary('写入(无读取)', *_run_readers(db_manager, symbols, 0, ingest))]
+        writes_alone = rows[0]['耗时_s']
+        rows.append(_summary('空闲', *_run_readers(db_manager, symbols, args.readers, writes_alone)))
+        new_data = [make_ohlcv(args.years * 252, seed=2 * args.symbols + i) for i in range(args.writes)]
+        during = _run_readers(db_manager, symbols, args.readers, ingest)
+        rows.append(_summary('写入期间', *during))
+
+        print(f"{args.readers} 个读线程，{args.symbols} 个标的 × {args.years} 年，写入 {args.writes} 个标的")
+        print(pd.DataFrame(rows).to_string(index=False, float_format=lambda x: f'{x:.2f}'))
+        if during[1]:
+            print("读取错误示例:", during[1][0])
+
+        # 连接开销：每次新建连接 vs 从连接池借出
+        query = "SELECT close FROM prices WHERE symbol = ? ORDER BY date DESC LIMIT 1"
+        n = 2000
+        start = time.perf_counter()
+        for _ in range(n):
+            conn = sqlite3.connect(db_manager.db_path)
+            conn.execute(query, (symbols[0],)).fetchone()
+            conn.close()
+        fresh = (time.perf_counter() - start) / n * 1e6
+        start = time.perf_counter()
+        for _ in range(n):
+            with db_manager.pool.reader() as conn:
+                conn.execute(query, (symbols[0],)).fetchone()
+        pooled = (time.perf_counter() - start) / n * 1e6
+        print(f"\n单条查询: 每次新建连接 {fresh:.1f} us，连接池 {pooled:.1f} us")
+
+
+if __name__ == '__main__':
+    main()
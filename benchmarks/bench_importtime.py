@@ -0,0 +1,108 @@
+"""应用启动和各页面的导入耗时（python -X importtime）
+
+每个场景在新的解释器中运行，先导入 streamlit（服务进程运行脚本前已经加载），
+再解析 -X importtime 的输出，统计之后各顶层导入的累计耗时，多次运行取中位数：
+  app               只导入 app.py，即导航栏首次渲染前需要的模块
+  app+<页面模块>    导入 app.py 后打开某个页面，额外导入该页面模块（包括 db_manager 和 pandas）
+  eager             一次导入所有页面模块（页面按需导入之前的启动方式）
+结果与保存的基准比较，超过容差即标记为退化并以非零状态退出。
+
+用法: python -m benchmarks.bench_importtime [--repeat 5] [--top 10] [--save-baseline]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+import pandas as pd
+
+from app import PAGES
+from benchmarks.bench_suite import TOLERANCE, environment, load_baseline
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), 'importtime_baseline.json')
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# 绝对差值低于该值(ms)时不算退化，避免导入耗时的抖动被误报
+MIN_DELTA_MS = 20.0
+PAGE_MODULES = [module_name for _, module_name, _ in PAGES.values()]
+
+
+def import_profile(statements):
+    """在已导入 streamlit 的新解释器中执行 import 语句
+
+    返回 (总耗时(ms), {包名: 累计耗时(ms)})；总耗时为顶层导入累计耗时之和，
+    嵌套导入已计入其上层模块。包名只取不含点号的模块，用于找出最耗时的依赖
+    """
+    marker = '__bench_importtime__'
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c',
+         f'import streamlit; import sys; print({marker!r}, file=sys.stderr); ' + '; '.join(statements)],
+        cwd=ROOT, capture_output=True, text=True, check=True
+    )
+    output = result.stderr.split(marker, 1)[1]
+    total = 0.0
+    packages = {}
+    for line in output.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        ms = int(cumulative) / 1000
+        if not name.startswith('  '):
+            total += ms
+        if '.' not in name:
+            packages[name.strip()] = ms
+    return total, packages
+
+
+def scenarios():
+    cases = {'app': ['import app']}
+    for module_name in PAGE_MODULES:
+        cases[f'app+{module_name}'] = ['import app', f'import {module_name}']
+    cases['eager'] = ['import app'] + [f'import {module_name}' for module_name in PAGE_MODULES]
+    return cases
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--top', type=int, default=10, help='列出导入全部页面时最耗时的包')
+    parser.add_argument('--baseline', default=BASELINE_PATH)
+    parser.add_argument('--save-baseline', action='store_true', help='把本次结果写入基准文件')
+    parser.add_argument('--tolerance', type=float, default=TOLERANCE)
+    args = parser.parse_args()
+
+    baseline = load_baseline(args.baseline)
+    results = {}
+    rows = []
+    for name, statements in scenarios().items():
+        profiles = [import_profile(statements) for _ in range(args.repeat)]
+        ms = float(pd.Series([total for total, _ in profiles]).median())
+        results[name] = {'ms': round(ms, 1)}
+        reference = baseline.get('results', {}).get(name)
+        regressed = bool(reference) and ms > reference['ms'] * args.tolerance and ms - reference['ms'] > MIN_DELTA_MS
+        rows.append({
+            '场景': name,
+            '导入耗时_ms': ms,
+            '基准_ms': reference['ms'] if reference else None,
+            '退化': regressed,
+        })
+
+    print(pd.DataFrame(rows).to_string(index=False, float_format=lambda x: f'{x:.1f}'))
+    # 各包的耗时包含其依赖（如 yfinance 中包含首次导入的 requests），不能相加
+    top = pd.DataFrame([packages for _, packages in profiles]).median().sort_values(ascending=False).head(args.top)
+    print(f"\n导入全部页面时最耗时的包(ms，含其依赖):\n{top.round(1).to_string()}")
+
+    if args.save_baseline:
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump({'environment': environment(), 'results': results}, f, indent=4, ensure_ascii=False)
+        print(f"\n基准已保存到 {args.baseline}")
+        return
+
+    if baseline and baseline.get('environment') != environment():
+        print("\n注意: 基准是在不同的环境中记录的，比较结果仅供参考")
+    if any(row['退化'] for row in rows):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+"""DBManager.load_data 列裁剪与日期范围下推的效果
+
+在临时目录中生成多标的合成数据，对比全列读取与只读收盘价、全历史与只读最近一段时间，
+并打印各查询的执行计划，确认日期范围查询都走 (symbol, date) 主键。
+用法: python -m benchmarks.bench_load_data [--symbols 200] [--years 15] [--repeat 3]
+"""
+import argparse
+import sqlite3
+import tempfile
+import time
+
+import pandas as pd
+
+from benchmarks.synthetic import make_ohlcv
+from module.db_manager import DBManager, frame_cache
+
+
+def _best_time(func, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        frame_cache.invalidate()
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    return result, best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--symbols', type=int, default=200)
+    parser.add_argument('--years', type=int, default=15)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as db_dir:
+        db_manager = DBManager(db_dir)
+        symbols = [f"SYM{i:04d}" for i in range(args.symbols)]
+        for i, symbol in enumerate(symbols):
+            db_manager.save_data(make_ohlcv(args.years * 252, seed=i), symbol)
+        # 生成规划器统计信息
+        db_manager.optimize()
+
+        last_date = db_manager.load_data(symbols=symbols[0], columns=['close']).index[-1]
+        recent = (last_date - pd.Timedelta(days=30)).strftime('%Y-%m-%d')
+        cases = [
+            ('单标的 全列 全历史', {'symbols': symbols[0]}),
+            ('单标的 收盘价 全历史', {'symbols': symbols[0], 'columns': ['close']}),
+            ('单标的 收盘价 近30天', {'symbols': symbols[0], 'columns': ['close'], 'start_date': recent}),
+            ('全部标的 全列 全历史', {'symbols': symbols}),
+            ('全部标的 收盘价 全历史', {'symbols': symbols, 'columns': ['close']}),
+            ('全部标的 收盘价 近30天', {'symbols': symbols, 'columns': ['close'], 'start_date': recent}),
+        ]
+
+        rows = []
+        for label, kwargs in cases:
+            df, seconds = _best_time(lambda: db_manager.load_data(**kwargs), args.repeat)
+            rows.append({
+                '查询': label,
+                '行数': len(df),
+                '内存(MB)': df.memory_usage(deep=True).sum() / 2 ** 20,
+                '耗时(s)': seconds,
+            })
+        print(f"{args.symbols} 个标的 × {args.years} 年")
+        print(pd.DataFrame(rows).to_string(index=False, float_format=lambda x: f'{x:.4f}'))
+
+        conn = sqlite3.connect(db_manager.db_path)
+        print("\n执行计划:")
+        for label, sql, params in [
+            ('单标的 近30天', "SELECT symbol, date, close FROM prices WHERE symbol IN (?) AND date >= ?",
+             [symbols[0], recent]),
+            ('全部标的 近30天', f"SELECT symbol, date, close FROM prices WHERE symbol IN ({', '.join('?' * len(symbols))}) AND date >= ?",
+             symbols + [recent]),
+        ]:
+            plan = conn.execute(f"EXPLAIN QUERY PLAN {sql}", params).fetchall()
+            detail = '; '.join(row[-1] for row in plan)
+            print(f"  {label}: {detail}")
+            assert 'PRIMARY KEY' in detail, f"{label} 没有使用 (symbol, date) 主键"
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()
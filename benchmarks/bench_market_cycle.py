@@ -0,0 +1,115 @@
+"""牛熊市周期识别基准测试：NumPy 引擎 vs 原 iterrows 实现
+
+用法: python -m benchmarks.bench_market_cycle [--sizes 10000 100000 1000000]
+"""
+import argparse
+import time
+
+import pandas as pd
+
+from benchmarks.synthetic import make_ohlcv
+from module.cycle_engine import detect_cycles
+from module.market_cycle import identify_market_cycles
+
+
+def identify_market_cycles_iterrows(df, threshold=20):
+    """原逐行实现，作为正确性和性能的参照"""
+    cycles = []
+    current_cycle = {'type': None, 'start_date': None, 'end_date': None, 'start_price': None, 'end_price': None}
+    high_price = low_price = df['close'].iloc[0]
+    high_date = low_date = df.index[0]
+    
+    for date, row in df.iterrows():
+        price = row['close']
+        
+        if current_cycle['type'] is None:
+            # 初始化第一个周期
+            current_cycle = {
+                'type': 'bull' if price > df['close'].iloc[0] else 'bear',
+                'start_date': df.index[0],
+                'start_price': df['close'].iloc[0]
+            }
+        
+        if current_cycle['type'] == 'bull':
+            if price > high_price:
+                high_price = price
+                high_date = date
+            elif price < high_price * (1 - threshold/100):
+                # 确认熊市开始
+                current_cycle['end_date'] = high_date
+                current_cycle['end_price'] = high_price
+                cycles.append(current_cycle)
+                current_cycle = {
+                    'type': 'bear',
+                    'start_date': high_date,
+                    'start_price': high_price
+                }
+                low_price = price
+                low_date = date
+        else:  # bear market
+            if price < low_price:
+                low_price = price
+                low_date = date
+            elif price > low_price * (1 + threshold/100):
+                # 确认牛市开始
+                current_cycle['end_date'] = low_date
+                current_cycle['end_price'] = low_price
+                cycles.append(current_cycle)
+                current_cycle = {
+                    'type': 'bull',
+                    'start_date': low_date,
+                    'start_price': low_price
+                }
+                high_price = price
+                high_date = date
+    
+    # 添加最后一个未完成的周期
+    if current_cycle['type'] == 'bull':
+        current_cycle['end_date'] = high_date
+        current_cycle['end_price'] = high_price
+    else:
+        current_cycle['end_date'] = low_date
+        current_cycle['end_price'] = low_price
+    cycles.append(current_cycle)
+    
+    return cycles
+
+
+def _timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 100_000, 1_000_000])
+    parser.add_argument('--thresholds', type=float, nargs='+', default=[10, 20, 30])
+    args = parser.parse_args()
+
+    rows = []
+    for n_bars in args.sizes:
+        # 日线超过 pandas 时间戳范围，统一使用分钟线索引
+        df = make_ohlcv(n_bars, seed=n_bars, freq='min')
+        close = df['close'].to_numpy()
+        for threshold in args.thresholds:
+            expected, loop_seconds = _timed(identify_market_cycles_iterrows, df, threshold)
+            actual, frame_seconds = _timed(identify_market_cycles, df, threshold)
+            _, engine_seconds = _timed(detect_cycles, close, threshold)
+            if actual != expected:
+                raise AssertionError(f"结果不一致: n_bars={n_bars}, threshold={threshold}")
+            rows.append({
+                'bars': n_bars,
+                'threshold': threshold,
+                'cycles': len(actual),
+                'iterrows_s': loop_seconds,
+                'identify_s': frame_seconds,
+                'engine_s': engine_seconds,
+                'speedup': loop_seconds / frame_seconds,
+            })
+
+    print(pd.DataFrame(rows).to_string(index=False, float_format=lambda x: f'{x:.4f}'))
+
+
+if __name__ == '__main__':
+    main()
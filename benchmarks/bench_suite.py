@@ -0,0 +1,250 @@
+"""各分析函数的基准测试套件
+
+用确定性的合成行情数据（benchmarks.synthetic.make_universe）在不同规模下测量每个函数的
+耗时（多次运行取最短）和峰值内存（tracemalloc 单独运行一次），结果与保存的基准比较，
+超过容差即标记为退化并以非零状态退出。全部离线运行，不需要网络。
+
+规模写作 "标的数x年数"，如 1x15、100x30、1000x50；默认只跑较小的规模，
+1000x50（约 1260 万行，写库需要较长时间和数 GB 内存）需显式指定。
+峰值内存只统计经过 Python 分配器的内存（包括 NumPy/pandas 数组），不含 SQLite 内部缓存。
+
+用法: python -m benchmarks.bench_suite [--scales 1x15 10x15] [--only load_data] [--save-baseline]
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+import warnings
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.synthetic import make_universe
+from module.analytics import analyze_monthly_patterns, analyze_november, calculate_monthly_returns, identify_market_cycles
+from module.charts import plot_market_cycles, plot_rolling_sharpe
+from module.cross_section import cross_sectional_seasonality
+from module.data_downloader import analyze_yearly_data
+from module.db_manager import DBManager, frame_cache
+from module.drawdown import drawdown_analysis
+from module.incremental import AnalyticsState
+
+DEFAULT_SCALES = ['1x15', '10x15', '100x30']
+# 周期图基准使用的牛熊市阈值(%)，阈值越低周期越多
+PLOT_CYCLE_THRESHOLD = 5
+# 增量更新基准中追加的交易日数
+APPEND_BARS = 5
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), 'baseline.json')
+# 耗时或峰值内存超过基准的倍数时视为退化
+TOLERANCE = 1.3
+# 绝对差值低于以下数值时不算退化，避免毫秒级的计时抖动被误报
+MIN_DELTA_SECONDS = 0.01
+MIN_DELTA_MB = 1.0
+
+
+def _per_symbol(universe):
+    return [df.droplevel('symbol') for _, df in universe.groupby(level='symbol', sort=False)]
+
+
+def _monthly_returns(universe):
+    return [calculate_monthly_returns(df) for df in _per_symbol(universe)]
+
+
+def _save_all(db_manager, universe):
+    for symbol, df in universe.groupby(level='symbol', sort=False):
+        db_manager.save_data(df.droplevel('symbol'), symbol)
+
+
+_state_payloads = {}
+
+
+def _states_before_append(universe):
+    """每个标的除最后 APPEND_BARS 个交易日外的分析状态（序列化后）和待追加的收盘价；同一数据只构建一次"""
+    key = id(universe)
+    if key not in _state_payloads:
+        _state_payloads.clear()
+        payloads = []
+        for df in _per_symbol(universe):
+            state = AnalyticsState()
+            state.update(df['close'].iloc[:-APPEND_BARS])
+            payloads.append((state.dumps(), df['close'].iloc[-APPEND_BARS:]))
+        _state_payloads[key] = payloads
+    return _state_payloads[key]
+
+
+def _append_states(payloads):
+    """读取持久化的状态、追加新交易日并重新序列化，对应每日更新的全部开销"""
+    for payload, tail in payloads:
+        state = AnalyticsState.loads(payload)
+        state.update(tail)
+        state.dumps()
+        state.cycles.closed_rows()
+
+
+def _saved_db(universe, tmp_root):
+    db_dir = tempfile.mkdtemp(dir=tmp_root)
+    db_manager = DBManager(db_dir)
+    _save_all(db_manager, universe)
+    return db_manager
+
+
+# 名称 -> (准备函数, 被测函数)；准备函数在每次运行前执行且不计时，返回值传给被测函数
+BENCHMARKS = {
+    'identify_market_cycles': (
+        lambda universe, tmp: _per_symbol(universe[['close']]),
+        lambda frames: [identify_market_cycles(df) for df in frames],
+    ),
+    'analyze_monthly_patterns': (
+        lambda universe, tmp: _monthly_returns(universe),
+        lambda returns: [analyze_monthly_patterns(r) for r in returns],
+    ),
+    'plot_rolling_sharpe': (
+        lambda universe, tmp: _monthly_returns(universe),
+        lambda returns: [plot_rolling_sharpe(r, 12) for r in returns],
+    ),
+    'plot_market_cycles': (
+        lambda universe, tmp: [
+            (df, identify_market_cycles(df, PLOT_CYCLE_THRESHOLD)) for df in _per_symbol(universe[['close']])
+        ],
+        lambda items: [plot_market_cycles(df, cycles) for df, cycles in items],
+    ),
+    'analyze_november': (
+        lambda universe, tmp: _per_symbol(universe),
+        lambda frames: [analyze_november(df) for df in frames],
+    ),
+    'analyze_yearly_data': (
+        lambda universe, tmp: universe,
+        analyze_yearly_data,
+    ),
+    'cross_sectional_seasonality': (
+        lambda universe, tmp: universe['close'].unstack('symbol'),
+        cross_sectional_seasonality,
+    ),
+    'drawdown_analysis': (
+        lambda universe, tmp: universe['close'].unstack('symbol'),
+        drawdown_analysis,
+    ),
+    'analytics_state_rebuild': (
+        lambda universe, tmp: _per_symbol(universe[['close']]),
+        lambda frames: [AnalyticsState().update(df['close']) for df in frames],
+    ),
+    'analytics_state_append': (
+        lambda universe, tmp: _states_before_append(universe),
+        _append_states,
+    ),
+    'save_data': (
+        lambda universe, tmp: (DBManager(tempfile.mkdtemp(dir=tmp)), universe),
+        lambda args: _save_all(*args),
+    ),
+    'load_data': (
+        lambda universe, tmp: _saved_db(universe, tmp),
+        lambda db_manager: (frame_cache.invalidate(), db_manager.load_data(symbols=db_manager.get_symbols())),
+    ),
+}
+
+
+def parse_scale(scale):
+    n_symbols, years = scale.lower().split('x')
+    return int(n_symbols), int(years)
+
+
+def measure(prepare, func, universe, tmp_root, repeat):
+    """返回 (最短耗时秒数, 峰值内存 MB)"""
+    best = float('inf')
+    for _ in range(repeat):
+        args = prepare(universe, tmp_root)
+        start = time.perf_counter()
+        func(args)
+        best = min(best, time.perf_counter() - start)
+
+    # 峰值内存单独测一次，避免 tracemalloc 的开销计入耗时
+    args = prepare(universe, tmp_root)
+    tracemalloc.start()
+    func(args)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return best, peak / 2 ** 20
+
+
+def environment():
+    return {
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'machine': platform.machine(),
+        'processor': platform.processor(),
+        'cpu_count': os.cpu_count(),
+    }
+
+
+def load_baseline(path):
+    if not os.path.exists(path):
+        return {}
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--scales', nargs='+', default=DEFAULT_SCALES, help='标的数x年数，如 1x15 1000x50')
+    parser.add_argument('--only', nargs='+', choices=list(BENCHMARKS), help='只运行指定的函数')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--baseline', default=BASELINE_PATH)
+    parser.add_argument('--save-baseline', action='store_true', help='把本次结果写入基准文件')
+    parser.add_argument('--tolerance', type=float, default=TOLERANCE)
+    args = parser.parse_args()
+    # resample('M') 等用法在新版 pandas 中的弃用警告会淹没输出
+    warnings.simplefilter('ignore', FutureWarning)
+
+    baseline = load_baseline(args.baseline)
+    results = {}
+    rows = []
+    with tempfile.TemporaryDirectory() as tmp_root:
+        for scale in args.scales:
+            n_symbols, years = parse_scale(scale)
+            universe = make_universe(n_symbols, years)
+            results[scale] = {}
+            for name in args.only or BENCHMARKS:
+                prepare, func = BENCHMARKS[name]
+                seconds, peak_mb = measure(prepare, func, universe, tmp_root, args.repeat)
+                results[scale][name] = {'seconds': round(seconds, 6), 'peak_mb': round(peak_mb, 3)}
+
+                reference = baseline.get('results', {}).get(scale, {}).get(name)
+                row = {'规模': scale, '函数': name, '行数': len(universe), '耗时(s)': seconds, '峰值内存(MB)': peak_mb}
+                if reference:
+                    row['耗时/基准'] = seconds / reference['seconds']
+                    row['内存/基准'] = peak_mb / reference['peak_mb'] if reference['peak_mb'] else np.nan
+                    row['退化'] = (
+                        (row['耗时/基准'] > args.tolerance and seconds - reference['seconds'] > MIN_DELTA_SECONDS)
+                        or (row['内存/基准'] > args.tolerance and peak_mb - reference['peak_mb'] > MIN_DELTA_MB)
+                    )
+                rows.append(row)
+                print(f"{scale:>8} {name:<26} {seconds:10.4f}s {peak_mb:10.1f}MB", flush=True)
+
+    table = pd.DataFrame(rows)
+    print()
+    print(table.to_string(index=False, float_format=lambda x: f'{x:.4f}'))
+
+    if args.save_baseline:
+        # 只覆盖本次运行过的规模和函数，保留其余基准
+        merged = baseline.get('results', {})
+        for scale, functions in results.items():
+            merged.setdefault(scale, {}).update(functions)
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump({'environment': environment(), 'results': merged}, f, ensure_ascii=False, indent=4)
+        print(f"\n基准已保存到 {args.baseline}")
+        return
+
+    if baseline and baseline.get('environment') != environment():
+        print("\n注意: 基准是在不同的环境中记录的，比较结果仅供参考")
+    if '退化' in table and table['退化'].fillna(False).any():
+        print(f"\n以下函数超过基准的 {args.tolerance} 倍:")
+        print(table.loc[table['退化'].fillna(False), ['规模', '函数', '耗时/基准', '内存/基准']].to_string(index=False))
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,53 @@
+import numpy as np
+import pandas as pd
+
+from module.trading_calendar import trading_days
+
+
+def make_close(n_bars, seed=0, start_price=100.0, drift=0.0003, volatility=0.015):
+    """生成确定性的几何布朗运动收盘价序列"""
+    rng = np.random.default_rng(seed)
+    log_returns = rng.normal(drift, volatility, n_bars)
+    log_returns[0] = 0.0
+    return start_price * np.exp(np.cumsum(log_returns))
+
+
+def make_ohlcv(n_bars, seed=0, start='2000-01-03', freq='B'):
+    """生成与 DBManager.load_data 返回格式一致的 OHLCV 数据
+
+    日线数据超过 pandas 时间戳范围时可改用 freq='min'（分钟线）
+    """
+    rng = np.random.default_rng(seed + 1)
+    close = make_close(n_bars, seed)
+    open_ = np.concatenate(([close[0]], close[:-1])) * (1 + rng.normal(0, 0.002, n_bars))
+    spread = np.abs(rng.normal(0, 0.006, n_bars))
+    high = np.maximum(open_, close) * (1 + spread)
+    low = np.minimum(open_, close) * (1 - spread)
+
+    index = pd.date_range(start, periods=n_bars, freq=freq, name='date')
+    return pd.DataFrame({
+        'open': open_,
+        'high': high,
+        'low': low,
+        'close': close,
+        'volume': rng.integers(1_000_000, 10_000_000, n_bars).astype(float),
+        'dividends': 0.0,
+        'stock_splits': 0.0,
+        'pe_ratio': np.nan,
+    }, index=index)
+
+
+def make_universe(n_symbols, years, seed=0, end='2024-12-31'):
+    """生成多标的日线长表，格式与 DBManager.load_data(symbols=[...]) 相同（(symbol, date) 索引）
+
+    日期为截至 end 的最近 years 年纽约证券交易所交易日，每个标的使用不同的随机种子
+    """
+    end = pd.Timestamp(end)
+    dates = pd.DatetimeIndex(trading_days(end - pd.DateOffset(years=years) + pd.Timedelta(days=1), end), name='date')
+    symbols = [f"SYM{i:04d}" for i in range(n_symbols)]
+    frames = []
+    for i in range(n_symbols):
+        df = make_ohlcv(len(dates), seed=seed + i)
+        df.index = dates
+        frames.append(df)
+    return pd.concat(frames, keys=symbols, names=['symbol', 'date'])
@@ -0,0 +1,103 @@
+import pandas as pd
+
+from module.cycle_engine import detect_cycles
+from module.rolling_stats import RISK_FREE_RATE, rolling_stats
+from module.seasonality import analyze_month, monthly_seasonality
+
+# 各页面和批量报表共用的纯计算函数，不依赖 Streamlit 和 Plotly
+
+MONTH_NAMES = ['一月', '二月', '三月', '四月', '五月', '六月',
+               '七月', '八月', '九月', '十月', '十一月', '十二月']
+
+
+def calculate_monthly_returns(df):
+    """计算月度收益率"""
+    monthly_returns = df['close'].resample('M').last().pct_change() * 100
+    return monthly_returns
+
+
+def analyze_monthly_patterns(monthly_returns):
+    """分析每个月的平均涨幅"""
+    # 为每个收益率添加月份信息
+    monthly_returns.index = pd.to_datetime(monthly_returns.index)
+    monthly_data = pd.DataFrame({
+        'month': monthly_returns.index.month,
+        'returns': monthly_returns.values
+    })
+
+    # 计算每个月的平均收益率
+    monthly_stats = monthly_data.groupby('month')['returns'].agg([
+        ('平均收益率', 'mean'),
+        ('最大涨幅', 'max'),
+        ('最大跌幅', 'min'),
+        ('标准差', 'std'),
+        ('样本数', 'count')
+    ]).round(2)
+
+    # 添加月份名称
+    monthly_stats.index = MONTH_NAMES
+
+    return monthly_stats
+
+
+def calculate_monthly_sharpe(df):
+    """计算月度夏普比率"""
+    # 计算月度收益率
+    monthly_returns = df['close'].resample('M').last().pct_change() * 100
+
+    return (monthly_returns, *calculate_sharpe_stats(monthly_returns))
+
+
+def calculate_sharpe_stats(monthly_returns):
+    """根据月度收益率(%)计算 (夏普比率, 年化收益率, 年化波动率)"""
+    # 计算年化收益率和标准差
+    annual_return = monthly_returns.mean() * 12
+    annual_std = monthly_returns.std() * (12 ** 0.5)
+
+    # 计算夏普比率
+    sharpe_ratio = (annual_return - RISK_FREE_RATE) / annual_std
+
+    return sharpe_ratio, annual_return, annual_std
+
+
+def rolling_sharpe(monthly_returns, window=12):
+    """滚动夏普比率"""
+    return rolling_stats(monthly_returns, windows=(window,))['sharpe'][window].rename(None)
+
+
+def analyze_november(df):
+    """分析历年11月表现"""
+    return analyze_month(monthly_seasonality(df), 11)
+
+
+def identify_market_cycles(df, threshold=20):
+    """识别牛熊市周期
+    threshold: 从高点下跌或从低点上涨超过该百分比则认为是新的周期
+    """
+    close = df['close'].to_numpy(dtype=float)
+    return cycles_to_records(df, detect_cycles(close, threshold))
+
+
+def cycles_to_records(df, cycle_arrays):
+    """将周期引擎返回的 (is_bull, start_idx, end_idx) 转为周期字典列表"""
+    close = df['close'].to_numpy(dtype=float)
+    is_bull, starts, ends = cycle_arrays
+
+    return [
+        {
+            'type': 'bull' if bull else 'bear',
+            'start_date': df.index[start],
+            'start_price': close[start],
+            'end_date': df.index[end],
+            'end_price': close[end]
+        }
+        for bull, start, end in zip(is_bull, starts, ends)
+    ]
+
+
+def cycles_table(cycles):
+    """周期字典列表转为表格，并加上持续天数和涨跌幅(%)"""
+    cycles_df = pd.DataFrame(cycles)
+    cycles_df['持续天数'] = (cycles_df['end_date'] - cycles_df['start_date']).dt.days
+    cycles_df['涨跌幅(%)'] = ((cycles_df['end_price'] - cycles_df['start_price']) / cycles_df['start_price'] * 100).round(2)
+    return cycles_df
@@ -0,0 +1,234 @@
+"""并发下载多个标的并直接写入数据库，可以在页面中使用，也可以在命令行运行
+
+数据源默认为 yfinance；--source-dir 或环境变量 DOWNLOAD_SOURCE_DIR 指定 CSV 目录时读取本地文件，用于测试和离线运行。
+
+用法: python -m module.bulk_downloader ^NDX QQQ --start 2000-01-01
+      python -m module.bulk_downloader ^NDX --start 2000-01-01 --source-dir data/csv --db-dir db
+"""
+import argparse
+import json
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import date, datetime
+from pathlib import Path
+
+import pandas as pd
+
+from module.db_manager import DBManager
+from module.incremental import refresh_states
+from module.trading_calendar import trading_days
+
+# 并发下载的线程数
+MAX_WORKERS = 8
+# 每个分块失败后的重试次数和首次重试等待秒数（之后指数增长）
+RETRIES = 3
+BACKOFF_SECONDS = 1.0
+# 同时在下载或等待写入的分块数 = 线程数 × 该倍数，限制驻留内存的数据量
+IN_FLIGHT_FACTOR = 2
+# 已完成分块的断点记录，与数据库文件放在同一目录，不同的数据库各自记录
+CHECKPOINT_FILE = "download_checkpoint.json"
+# 设置该环境变量为 CSV 目录时，未指定数据源的下载（包括下载页面）改用本地文件数据源
+SOURCE_DIR_ENV = "DOWNLOAD_SOURCE_DIR"
+
+
+class YFinanceSource:
+    """从 yfinance 下载行情数据"""
+
+    def fetch(self, symbol, start, end):
+        # 延迟导入，使用本地数据源时不依赖 yfinance
+        import yfinance as yf
+        return yf.Ticker(symbol).history(start=start, end=end)
+
+
+class FileSource:
+    """本地文件数据源，用于测试和无法联网的环境
+
+    目录中每个标的一个 CSV 文件（如 ^NDX.csv），格式与 yfinance history 导出的 CSV 相同
+    """
+
+    def __init__(self, directory):
+        self.directory = Path(directory)
+
+    def fetch(self, symbol, start, end):
+        path = self.directory / f"{symbol}.csv"
+        if not path.exists():
+            raise FileNotFoundError(f"没有 {symbol} 的数据文件: {path}")
+        df = pd.read_csv(path, index_col=0)
+        df.index = pd.to_datetime(df.index, utc=True).tz_localize(None)
+        return df.loc[(df.index >= pd.Timestamp(start)) & (df.index < pd.Timestamp(end))]
+
+
+def default_source():
+    """未指定数据源时使用的数据源：设置了 DOWNLOAD_SOURCE_DIR 时为该目录的 FileSource，否则为 yfinance"""
+    directory = os.environ.get(SOURCE_DIR_ENV)
+    return FileSource(directory) if directory else YFinanceSource()
+
+
+class DownloadCheckpoint:
+    """记录已完成的 (标的, 分块)，下载中断后重新运行时跳过这些分块"""
+
+    def __init__(self, path):
+        self.path = path
+        self.done = set()
+        if os.path.exists(path):
+            with open(path, 'r') as f:
+                self.done = set(json.load(f))
+
+    @staticmethod
+    def key(symbol, start, end):
+        return f"{symbol}|{start}|{end}"
+
+    def is_done(self, symbol, start, end):
+        return self.key(symbol, start, end) in self.done
+
+    def mark_done(self, symbol, start, end):
+        self.done.add(self.key(symbol, start, end))
+        # 先写临时文件再替换，避免中断时留下损坏的断点文件
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(sorted(self.done), f, indent=4)
+        os.replace(tmp_path, self.path)
+
+
+def year_chunks(start_date, end_date):
+    """把 [start_date, end_date) 按自然年切分，返回 [(分块开始, 分块结束), ...]（结束日期不含）"""
+    start = pd.Timestamp(start_date).date()
+    end = pd.Timestamp(end_date).date()
+    chunks = []
+    while start < end:
+        chunk_end = min(date(start.year + 1, 1, 1), end)
+        chunks.append((start, chunk_end))
+        start = chunk_end
+    return chunks
+
+
+def fetch_with_retry(source, symbol, start, end, retries=RETRIES, backoff=BACKOFF_SECONDS):
+    """下载一个分块，失败时按指数退避重试，重试用尽后抛出最后一次的异常"""
+    for attempt in range(retries + 1):
+        try:
+            return source.fetch(symbol, start, end)
+        except Exception:
+            if attempt == retries:
+                raise
+            time.sleep(backoff * 2 ** attempt)
+
+
+def _before_first_trade(end, first_date):
+    """分块 [start, end) 是否一定早于标的的第一个交易日
+
+    数据库中最早的数据晚于 end 之后的第一个交易日时，说明数据确实从之后才开始，
+    而不是中间某个分块临时下载失败；无法确定时返回 False，分块下次重新下载
+    """
+    if first_date is None:
+        return False
+    following = trading_days(end, pd.Timestamp(end) + pd.Timedelta(days=14))
+    return len(following) > 0 and pd.Timestamp(first_date) > pd.Timestamp(following[0])
+
+
+def download_symbols(symbols, start_date, end_date, db_manager=None, source=None,
+                     max_workers=MAX_WORKERS, retries=RETRIES, backoff=BACKOFF_SECONDS,
+                     checkpoint_path=None, progress=None):
+    """并发下载多个标的并直接写入数据库
+
+    每个标的按年份分块，分块在线程池中并发下载，下载完成的分块在主线程中依次写入
+    DBManager（SQLite 写入不并发）。同时提交的分块不超过 max_workers × IN_FLIGHT_FACTOR 个，
+    已下载未写入的数据不会随分块数增长。
+    已经结束且返回了数据的分块写入后记入断点文件（默认与数据库在同一目录），重新运行时只下载未完成的分块。
+    yfinance 限流等临时错误时也可能返回空数据，已经结束的空分块只有确定早于标的上市时才记入断点，
+    否则计入失败，下次重新下载。
+    source: 数据源，默认见 default_source
+    progress: 可选回调 progress(已完成分块数, 分块总数)
+    返回 {标的: {'inserted': 新增行数, 'updated': 更新行数, 'failed': [(分块开始, 分块结束, 错误信息), ...]}}
+    """
+    db_manager = db_manager or DBManager()
+    source = source or default_source()
+    checkpoint = DownloadCheckpoint(
+        checkpoint_path or os.path.join(os.path.dirname(db_manager.db_path), CHECKPOINT_FILE)
+    )
+    today = datetime.now().date()
+
+    summary = {symbol: {'inserted': 0, 'updated': 0, 'failed': []} for symbol in symbols}
+    tasks = [
+        (symbol, start, end)
+        for symbol in symbols
+        for start, end in year_chunks(start_date, end_date)
+        if not checkpoint.is_done(symbol, start, end)
+    ]
+    # 已经结束但没有返回数据的分块，全部写入后再判断是否早于上市
+    empty = []
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        pending = {}
+        queued = iter(tasks)
+        completed = 0
+
+        def submit(count):
+            for symbol, start, end in queued:
+                future = executor.submit(fetch_with_retry, source, symbol, start, end, retries, backoff)
+                pending[future] = (symbol, start, end)
+                count -= 1
+                if count == 0:
+                    break
+
+        submit(max_workers * IN_FLIGHT_FACTOR)
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                symbol, start, end = pending.pop(future)
+                try:
+                    df = future.result()
+                except Exception as e:
+                    summary[symbol]['failed'].append((start, end, str(e)))
+                else:
+                    if df is not None and not df.empty:
+                        result = db_manager.save_data(df, symbol)
+                        summary[symbol]['inserted'] += result['inserted']
+                        summary[symbol]['updated'] += result['updated']
+                        # 包含今天的分块之后还会有新数据，不记入断点
+                        if end <= today:
+                            checkpoint.mark_done(symbol, start, end)
+                    elif end <= today:
+                        empty.append((symbol, start, end))
+                completed += 1
+                if progress:
+                    progress(completed, len(tasks))
+            submit(len(done))
+
+    for symbol, start, end in empty:
+        if _before_first_trade(end, db_manager.get_metadata(symbol)['start_date']):
+            checkpoint.mark_done(symbol, start, end)
+        else:
+            summary[symbol]['failed'].append((start, end, '没有返回数据'))
+
+    # 分块的写入顺序不确定，全部写入后再统一更新有变化的标的的分析状态
+    refresh_states(db_manager, [
+        symbol for symbol, result in summary.items() if result['inserted'] or result['updated']
+    ])
+    return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='并发下载多个标的并写入数据库')
+    parser.add_argument('symbols', nargs='+', help='标的代码，如 ^NDX')
+    parser.add_argument('--start', required=True, help='开始日期，如 2010-01-01')
+    parser.add_argument('--end', default=datetime.now().strftime('%Y-%m-%d'), help='结束日期（不含），默认为今天')
+    parser.add_argument('--db-dir', default='db')
+    parser.add_argument('--source-dir', default=None,
+                        help=f'从该目录的 CSV 文件读取（离线运行），默认读取环境变量 {SOURCE_DIR_ENV}，都没有时使用 yfinance')
+    parser.add_argument('--workers', type=int, default=MAX_WORKERS, help='下载线程数')
+    args = parser.parse_args(argv)
+
+    source = FileSource(args.source_dir) if args.source_dir else default_source()
+    summary = download_symbols(
+        args.symbols, args.start, args.end, db_manager=DBManager(args.db_dir), source=source, max_workers=args.workers
+    )
+    for symbol, result in summary.items():
+        print(f"{symbol}: 新增 {result['inserted']} 条，更新 {result['updated']} 条，失败分块 {len(result['failed'])} 个")
+        for start, end, error in result['failed']:
+            print(f"    {start} 至 {end}: {error}")
+    return summary
+
+
+if __name__ == '__main__':
+    main()
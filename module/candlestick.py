@@ -1,13 +1,43 @@
 import streamlit as st
 import plotly.graph_objects as go
 from datetime import datetime
-import yfinance as yf
 import numpy as np
-from module.db_manager import DBManager
+from module.db_manager import DBManager, DEFAULT_SYMBOL, symbol_name
+from module.instrumentation import span
+from module.figure_cache import show_figure
 from plotly.subplots import make_subplots
 import pandas as pd
 
-def plot_candlestick_with_pe(df):
+# 图表中最多绘制的K线数量，超过时自动聚合为更大的周期，使图表数据量不随历史长度增长
+MAX_CANDLES = 1500
+# 可选的K线周期，按从细到粗排列；None 表示不聚合
+RESOLUTIONS = {
+    '日线': None,
+    '周线': 'W-FRI',
+    '月线': 'M',
+    '季线': 'Q',
+}
+
+def downsample_ohlc(df, rule):
+    """将日线聚合为周线/月线等更大周期的K线"""
+    if rule is None:
+        return df
+    agg = {'open': 'first', 'high': 'max', 'low': 'min', 'close': 'last'}
+    if 'volume' in df.columns:
+        agg['volume'] = 'sum'
+    if 'pe_ratio' in df.columns:
+        agg['pe_ratio'] = 'last'
+    return df.resample(rule).agg(agg).dropna(subset=['close'])
+
+def choose_resolution(df, max_points=MAX_CANDLES):
+    """选择K线数量不超过 max_points 的最细周期"""
+    for name, rule in RESOLUTIONS.items():
+        count = len(df) if rule is None else df.index.to_period(rule).nunique()
+        if count <= max_points:
+            return name
+    return name
+
+def plot_candlestick_with_pe(df, symbol=DEFAULT_SYMBOL):
     """绘制K线图和市盈率分析（双Y轴）"""
     # 创建带有双Y轴的图表
     fig = make_subplots(specs=[[{"secondary_y": True}]])
@@ -31,8 +61,9 @@ def plot_candlestick_with_pe(df):
             x=df.index,
             y=df['pe_ratio'],
             mode='lines',
-            line=dict(color='red', dash='dash'),
-            name='QQQ ETF市盈率',
+            # 估值为离散观测，两次观测之间沿用上一次的值，用阶梯线表示
+            line=dict(color='red', dash='dash', shape='hv'),
+            name=f'{symbol_name(symbol)}市盈率',
             hovertemplate='PE=%{y:.2f}'
         ),
         secondary_y=True
@@ -63,14 +94,14 @@ def plot_candlestick_with_pe(df):
                 mode='lines',
                 line=dict(color=colors[level], dash='dot', width=1),
                 name=f'PE {level}: {pe}',
-                hovertemplate=f'PE {level}=%{y:.2f}'
+                hovertemplate=f'PE {level}=%{{y:.2f}}'
             ),
             secondary_y=True
         )
     
     # 更新布局
     fig.update_layout(
-        title='纳斯达克100指数K线图与QQQ ETF市盈率分析',
+        title=f'{symbol_name(symbol)}K线图与市盈率分析',
         height=800,
         showlegend=True,
         legend=dict(
@@ -84,10 +115,13 @@ def plot_candlestick_with_pe(df):
     
     # 更新Y轴标题
     fig.update_yaxes(title_text="价格", secondary_y=False)
+    # 市盈率Y轴至少覆盖参考线区间，历史估值超出时自动扩展
+    pe_min = min(10, df['pe_ratio'].min() - 2) if df['pe_ratio'].notna().any() else 10
+    pe_max = max(40, df['pe_ratio'].max() + 2) if df['pe_ratio'].notna().any() else 40
     fig.update_yaxes(
         title_text="市盈率", 
         secondary_y=True,
-        range=[10, 40]  # 设置市盈率Y轴范围
+        range=[pe_min, pe_max]  # 设置市盈率Y轴范围
     )
     
     return fig
@@ -96,41 +130,71 @@ def show_candlestick():
     st.title('K线图分析')
     
     db_manager = DBManager()
-    metadata = db_manager.get_metadata()
+    symbol = st.session_state.get('symbol', DEFAULT_SYMBOL)
+    metadata = db_manager.get_metadata(symbol)
     
     if metadata["total_records"] == 0:
-        st.warning("数据库中没有数据，请先在'下载数据'页面下载数据。")
+        st.warning(f"数据库中没有 {symbol} 的数据，请先在'下载数据'页面下载数据。")
         return
     
-    st.info(f"""当前数据范围: {metadata["start_date"]} 至 {metadata["end_date"]}
+    st.info(f"""{symbol_name(symbol)} 当前数据范围: {metadata["start_date"]} 至 {metadata["end_date"]}
     总记录数: {metadata["total_records"]}""")
     
     # 加载并显示K线图
     with st.spinner('正在加载数据...'):
-        df = db_manager.load_data()
+        df = db_manager.load_data(symbols=symbol, columns=['open', 'high', 'low', 'close', 'pe_ratio'])
         
     if not df.empty:
+        # 选择显示区间和K线周期；缩小区间后自动切换为更细的周期
+        first_day, last_day = df.index[0].date(), df.index[-1].date()
+        col1, col2 = st.columns([3, 1])
+        with col1:
+            start_day, end_day = st.slider(
+                '显示区间',
+                min_value=first_day,
+                max_value=last_day,
+                value=(first_day, last_day),
+                format='YYYY-MM-DD'
+            )
+        with col2:
+            resolution = st.selectbox('K线周期', ['自动'] + list(RESOLUTIONS))
+        
+        view = df.loc[str(start_day):str(end_day)]
+        auto_resolution = choose_resolution(view)
+        if resolution == '自动':
+            resolution = auto_resolution
+        elif list(RESOLUTIONS).index(resolution) < list(RESOLUTIONS).index(auto_resolution):
+            st.info(f"所选区间内{resolution}超过 {MAX_CANDLES} 根，已自动切换为{auto_resolution}，缩小显示区间可查看{resolution}")
+            resolution = auto_resolution
+        with span('compute', rows=len(view), resolution=resolution) as record:
+            chart_df = downsample_ohlc(view, RESOLUTIONS[resolution])
+            record['candles'] = len(chart_df)
+        
         # 显示当前市盈率信息
         current_pe = df['pe_ratio'].iloc[-1]
         if not pd.isna(current_pe):
-            # 计算市盈率百分位
-            pe_range = (35 - 15)  # 最高PE - 最低PE
-            pe_percentile = ((current_pe - 15) / pe_range) * 100
-            pe_percentile = max(0, min(100, pe_percentile))  # 确保在0-100之间
+            # 历史百分位：有估值数据的交易日中，市盈率不高于当前值的比例
+            pe_history = df['pe_ratio'].dropna()
+            pe_percentile = (pe_history <= current_pe).mean() * 100
+            observations = len(db_manager.load_valuation(symbol))
             
             col1, col2 = st.columns(2)
             with col1:
-                st.metric("当前QQQ ETF市盈率", f"{current_pe:.2f}")
+                st.metric(f"当前{symbol_name(symbol)}市盈率", f"{current_pe:.2f}")
             with col2:
                 st.metric("历史百分位", f"{pe_percentile:.1f}%")
+            st.caption(f"百分位基于 {pe_history.index[0].date()} 以来 {len(pe_history)} 个交易日的估值（{observations} 次估值观测）")
         
         # 绘制图表
-        fig = plot_candlestick_with_pe(df)
-        st.plotly_chart(fig, use_container_width=True)
+        st.caption(f"{resolution}，共 {len(chart_df)} 根K线")
+        show_figure(
+            (db_manager.db_path, db_manager.data_version(), 'candlestick', symbol, str(start_day), str(end_day), resolution),
+            lambda: plot_candlestick_with_pe(chart_df, symbol)
+        )
         
         # 添加市盈率说明
-        st.info("""
-        📈 QQQ ETF市盈率(PE)解释：
+        st.info(f"""
+        📈 {symbol_name(symbol)}市盈率(PE)解释：
         - PE < 20: 相对便宜
         - 20 ≤ PE ≤ 25: 正常估值
         - 25 < PE ≤ 30: 偏贵
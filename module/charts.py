@@ -0,0 +1,260 @@
+import plotly.graph_objects as go
+
+from module.db_manager import DEFAULT_SYMBOL, symbol_name
+from module.analytics import rolling_sharpe
+
+# 各页面和批量报表共用的图表，只依赖 Plotly
+
+# 滚动指标在图表上的名称
+ROLLING_METRIC_LABELS = {
+    'return': '年化收益率(%)',
+    'volatility': '年化波动率(%)',
+    'sharpe': '夏普比率',
+    'sortino': '索提诺比率',
+}
+
+def plot_monthly_patterns(monthly_stats, symbol=DEFAULT_SYMBOL, significance=None):
+    """绘制月度模式图表
+
+    significance: 可选的 seasonality_significance 结果，以误差线显示各月平均收益率的置信区间
+    """
+    # 计算年化平均收益率
+    annual_return = (1 + monthly_stats['平均收益率'].mean() / 100) ** 12 - 1
+    annual_return_percentage = annual_return * 100
+    
+    # 计算月度平均收益率
+    monthly_avg = monthly_stats['平均收益率'].mean()
+    
+    # 创建柱状图
+    fig = go.Figure()
+    
+    # 添加柱状图
+    fig.add_trace(go.Bar(
+        x=monthly_stats.index,
+        y=monthly_stats['平均收益率'],
+        name='月度收益率',
+        text=monthly_stats['平均收益率'].apply(lambda x: f'{x:.2f}%'),
+        textposition='auto',
+        error_y=None if significance is None else dict(
+            type='data',
+            symmetric=False,
+            array=significance['置信上限'] - significance['平均收益率'],
+            arrayminus=significance['平均收益率'] - significance['置信下限'],
+            color='gray'
+        ),
+    ))
+    
+    # 添加月度平均线
+    fig.add_trace(go.Scatter(
+        x=monthly_stats.index,
+        y=[monthly_avg] * len(monthly_stats),
+        mode='lines',
+        line=dict(dash='dash', color='yellow', width=2),
+        name=f'月度平均: {monthly_avg:.2f}%'
+    ))
+    
+    # 更新布局
+    fig.update_layout(
+        title=f'{symbol_name(symbol)}月度平均收益率(%) (年化收益率: {annual_return_percentage:.2f}%)',
+        xaxis_title='月份',
+        yaxis_title='收益率(%)',
+        height=600,
+        showlegend=True,
+        barmode='relative',
+        legend=dict(
+            yanchor="top",
+            y=0.99,
+            xanchor="left",
+            x=0.01
+        )
+    )
+    
+    # 设置正负值的颜色
+    fig.update_traces(
+        marker_color=['red' if x > 0 else 'green' for x in monthly_stats['平均收益率']],
+        selector=dict(type='bar')
+    )
+    
+    return fig
+
+def plot_rolling_sharpe(monthly_returns, window=12):
+    """绘制滚动夏普比率"""
+    # 计算滚动夏普比率
+    sharpe = rolling_sharpe(monthly_returns, window)
+    return plot_rolling_metric(sharpe, window, 'sharpe')
+
+def plot_rolling_metric(series, window=12, metric='sharpe'):
+    """绘制滚动指标（夏普比率、索提诺比率、年化波动率等）"""
+    label = ROLLING_METRIC_LABELS[metric]
+    
+    # 创建图表
+    fig = go.Figure()
+    
+    # 添加滚动指标线
+    fig.add_trace(go.Scatter(
+        x=series.index,
+        y=series.values,
+        mode='lines',
+        name=f'滚动{label}'
+    ))
+    
+    # 添加零线
+    fig.add_hline(y=0, line_dash="dash", line_color="red")
+    
+    # 更新布局
+    fig.update_layout(
+        title=f'{window}个月滚动{label}',
+        xaxis_title='日期',
+        yaxis_title=label,
+        height=500,
+        showlegend=True
+    )
+    
+    return fig
+
+def plot_november_returns(nov_returns, month=11):
+    """绘制某个月份（默认11月）的历年收益率柱状图"""
+    fig = go.Figure()
+    
+    # 添加柱状图
+    fig.add_trace(go.Bar(
+        x=nov_returns['年份'],
+        y=nov_returns['收益率'],
+        text=nov_returns['收益率'].apply(lambda x: f'{x:.2f}%'),
+        textposition='auto',
+    ))
+    
+    # 添加平均线
+    avg_return = nov_returns['收益率'].mean()
+    fig.add_hline(
+        y=avg_return,
+        line_dash="dash",
+        line_color="yellow",
+        annotation_text=f"平均收益率: {avg_return:.2f}%"
+    )
+    
+    # 更新布局
+    fig.update_layout(
+        title=f'历年{month}月收益率分析',
+        xaxis_title='年份',
+        yaxis_title='收益率(%)',
+        height=500,
+        showlegend=False
+    )
+    
+    # 设置正负值的颜色
+    fig.update_traces(
+        marker_color=['red' if x > 0 else 'green' for x in nov_returns['收益率']]
+    )
+    
+    return fig
+
+def plot_market_cycles(df, cycles, symbol=DEFAULT_SYMBOL):
+    """绘制带有牛熊市标记的价格图
+
+    牛市、熊市区域各用一条填充曲线绘制（每个周期一个矩形，矩形之间以 None 断开），
+    不逐个调用 add_vrect，周期数多时图表的构建和渲染耗时不随周期数明显增加。
+    区域画在隐藏的 0~1 纵轴上以覆盖整个高度，价格线画在叠加的纵轴上，位于区域之上
+    """
+    fig = go.Figure()
+    
+    # 添加牛熊市区域
+    for cycle_type, name, color in (('bull', '牛市', 'rgba(255,0,0,0.1)'), ('bear', '熊市', 'rgba(0,255,0,0.1)')):
+        x, y = [], []
+        for cycle in cycles:
+            if cycle['type'] == cycle_type:
+                x += [cycle['start_date'], cycle['start_date'], cycle['end_date'], cycle['end_date'], None]
+                y += [0, 1, 1, 0, None]
+        if x:
+            fig.add_trace(go.Scatter(
+                x=x,
+                y=y,
+                mode='none',
+                fill='toself',
+                fillcolor=color,
+                name=name,
+                hoverinfo='skip'
+            ))
+    
+    # 添加价格线
+    fig.add_trace(go.Scatter(
+        x=df.index,
+        y=df['close'],
+        mode='lines',
+        name='价格',
+        line=dict(color='white'),
+        yaxis='y2'
+    ))
+    
+    # 更新布局
+    fig.update_layout(
+        title=f'{symbol_name(symbol)}牛熊市周期',
+        xaxis_title='日期',
+        yaxis=dict(range=[0, 1], visible=False, fixedrange=True),
+        yaxis2=dict(title='价格', overlaying='y', side='left'),
+        height=600,
+        showlegend=True
+    )
+    
+    return fig
+
+def plot_underwater(underwater, episodes=None, symbol=DEFAULT_SYMBOL):
+    """绘制水下曲线（相对前高的回撤）
+
+    underwater: 回撤(%) Series；episodes: 可选的回撤区间表，标出其中各次回撤的谷底
+    """
+    fig = go.Figure()
+    
+    # 添加水下曲线，填充到零线
+    fig.add_trace(go.Scatter(
+        x=underwater.index,
+        y=underwater.values,
+        mode='lines',
+        fill='tozeroy',
+        name='回撤',
+        line=dict(color='green', width=1)
+    ))
+    
+    # 标出较深回撤的谷底
+    if episodes is not None and not episodes.empty:
+        fig.add_trace(go.Scatter(
+            x=episodes['谷底日期'],
+            y=episodes['最大回撤(%)'],
+            mode='markers',
+            name='谷底',
+            marker=dict(color='yellow', size=8),
+            hovertemplate='%{x|%Y-%m-%d}: %{y:.2f}%<extra></extra>'
+        ))
+    
+    # 更新布局
+    fig.update_layout(
+        title=f'{symbol_name(symbol)}水下曲线',
+        xaxis_title='日期',
+        yaxis_title='回撤(%)',
+        height=400,
+        showlegend=True
+    )
+    
+    return fig
+
+def plot_seasonality_heatmap(table, title, colorbar_title, zmid=0):
+    """标的 × 月份热力图（全市场月度平均收益率或上涨概率）"""
+    fig = go.Figure(go.Heatmap(
+        z=table.values,
+        x=table.columns,
+        y=table.index,
+        colorscale=[[0, 'green'], [0.5, 'white'], [1, 'red']],
+        zmid=zmid,
+        colorbar=dict(title=colorbar_title),
+        hovertemplate='%{y} %{x}: %{z:.2f}<extra></extra>'
+    ))
+    
+    fig.update_layout(
+        title=title,
+        xaxis_title='月份',
+        yaxis_title='标的',
+        height=max(400, min(1600, 20 * len(table))),
+        yaxis=dict(autorange='reversed')
+    )
+    
+    return fig
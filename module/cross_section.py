@@ -0,0 +1,171 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+
+from module.analytics import MONTH_NAMES, analyze_monthly_patterns
+from module.cycle_engine import PARALLEL_MIN_SYMBOLS
+from module.db_manager import FrameCache
+from module.instrumentation import span
+
+# 全市场季节性结果的进程级缓存，键由调用方提供（应包含数据版本）
+cross_section_cache = FrameCache(maxsize=16)
+
+
+class SharedMatrix:
+    """放在共享内存中的二维 float64 矩阵
+
+    主进程创建并写入一次，工作进程凭 descriptor（名称、形状）直接映射同一块内存，
+    不需要把矩阵序列化后传给每个进程。用 with 语句保证共享内存最终被释放。
+    """
+
+    def __init__(self, array):
+        array = np.ascontiguousarray(array, dtype=np.float64)
+        self._shm = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+        self.array = np.ndarray(array.shape, dtype=np.float64, buffer=self._shm.buf)
+        self.array[:] = array
+        self.descriptor = (self._shm.name, array.shape)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        del self.array
+        self._shm.close()
+        self._shm.unlink()
+
+
+def _attach(descriptor):
+    name, shape = descriptor
+    shm = shared_memory.SharedMemory(name=name)
+    return shm, np.ndarray(shape, dtype=np.float64, buffer=shm.buf)
+
+
+def monthly_returns_matrix(closes, month_ends):
+    """日线收盘价矩阵 (T, N) 转为月度收益率(%)矩阵 (月数, N)
+
+    month_ends: 每个月最后一行的位置。与逐个标的调用 calculate_monthly_returns 的结果相同：
+    月收盘价为月内最后一个有效收盘价，缺数据的月份沿用上月收盘价，
+    标的上市前和最后一个有数据的月份之后为 NaN
+    """
+    n_rows = closes.shape[0]
+    valid = ~np.isnan(closes)
+    # 截至每一行的最后一个有效行号，-1 表示之前没有数据
+    last_valid = np.maximum.accumulate(np.where(valid, np.arange(n_rows)[:, None], -1), axis=0)
+    month_last = last_valid[month_ends]
+    month_close = np.where(month_last >= 0, np.take_along_axis(closes, np.maximum(month_last, 0), axis=0), np.nan)
+
+    returns = np.full(month_close.shape, np.nan)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        returns[1:] = (month_close[1:] / month_close[:-1] - 1) * 100
+
+    # 最后一个有数据的月份之后不再沿用收盘价
+    month_start = np.concatenate(([0], month_ends[:-1] + 1))
+    has_data = np.add.reduceat(valid, month_start, axis=0) > 0
+    ended = np.flip(np.maximum.accumulate(np.flip(has_data, axis=0), axis=0), axis=0)
+    returns[~ended] = np.nan
+    return returns
+
+
+def _seasonality_block(descriptor, month_ends, calendar_months, start, stop):
+    """工作进程：对共享矩阵中 [start, stop) 列的标的计算各日历月份的平均收益率和上涨概率"""
+    shm, closes = _attach(descriptor)
+    try:
+        returns = monthly_returns_matrix(closes[:, start:stop], month_ends)
+    finally:
+        del closes
+        shm.close()
+    return returns, _calendar_month_stats(returns, calendar_months)
+
+
+def _calendar_month_stats(returns, calendar_months):
+    """按日历月份汇总月度收益率矩阵，返回 (平均收益率, 上涨概率, 样本数)，形状均为 (12, 标的数)"""
+    one_hot = (calendar_months[:, None] == np.arange(12)).astype(float)
+    valid = ~np.isnan(returns)
+    counts = one_hot.T @ valid
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = (one_hot.T @ np.where(valid, returns, 0.0)) / counts
+        hit_rate = (one_hot.T @ (returns > 0)) / counts * 100
+    return mean, hit_rate, counts
+
+
+def cross_sectional_seasonality(closes, max_workers=None):
+    """全市场各标的、各日历月份的平均收益率和上涨概率
+
+    closes: 收盘价宽表，索引为日期、列为标的（DBManager.load_data(symbols=[...], columns=['close'], wide=True)）
+    收盘价矩阵放在共享内存中，标的较多时按列分块交给进程池，各进程直接读取共享内存。
+    返回 {
+        'mean': 标的 × 月份 平均收益率(%),
+        'hit_rate': 标的 × 月份 上涨概率(%),
+        'count': 标的 × 月份 样本数,
+        'summary': 各月份的横截面汇总（各标的平均收益率的均值、中位数，平均收益率为正的标的占比等），
+        'universe': 等权组合月度收益率经 analyze_monthly_patterns 的统计
+    }
+    """
+    closes = closes.sort_index()
+    symbols = list(closes.columns)
+    months = closes.index.to_period('M')
+    month_ends = np.flatnonzero(np.append(months[1:] != months[:-1], True))
+    month_index = months[month_ends].to_timestamp(how='end').normalize()
+    calendar_months = (month_index.month - 1).to_numpy()
+
+    n_workers = max_workers or os.cpu_count() or 1
+    if len(symbols) < PARALLEL_MIN_SYMBOLS or n_workers == 1:
+        returns = monthly_returns_matrix(closes.to_numpy(dtype=float), month_ends)
+        blocks = [(returns, _calendar_month_stats(returns, calendar_months))]
+    else:
+        bounds = np.linspace(0, len(symbols), min(len(symbols), n_workers * 4) + 1).astype(int)
+        with SharedMatrix(closes.to_numpy(dtype=float)) as shared:
+            with ProcessPoolExecutor(max_workers=n_workers) as executor:
+                blocks = list(executor.map(
+                    _seasonality_block,
+                    repeat(shared.descriptor),
+                    repeat(month_ends),
+                    repeat(calendar_months),
+                    bounds[:-1],
+                    bounds[1:]
+                ))
+
+    returns = np.concatenate([block[0] for block in blocks], axis=1)
+    mean, hit_rate, counts = (np.concatenate([block[1][i] for block in blocks], axis=1) for i in range(3))
+
+    mean = pd.DataFrame(mean.T, index=symbols, columns=MONTH_NAMES)
+    hit_rate = pd.DataFrame(hit_rate.T, index=symbols, columns=MONTH_NAMES)
+    counts = pd.DataFrame(counts.T.astype(int), index=symbols, columns=MONTH_NAMES)
+
+    summary = pd.DataFrame({
+        '平均收益率均值': mean.mean(),
+        '平均收益率中位数': mean.median(),
+        '正收益标的占比': (mean > 0).sum() / mean.notna().sum() * 100,
+        '平均上涨概率': hit_rate.mean(),
+        '标的数': mean.notna().sum(),
+    })
+
+    # 等权组合：每个月对当月有收益率的标的取平均
+    available = (~np.isnan(returns)).sum(axis=1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        equal_weight = pd.Series(np.nansum(returns, axis=1) / available, index=month_index)
+    equal_weight[available == 0] = np.nan
+    universe = analyze_monthly_patterns(equal_weight)
+
+    return {'mean': mean, 'hit_rate': hit_rate, 'count': counts, 'summary': summary, 'universe': universe}
+
+
+def cached_cross_section(key, closes, max_workers=None):
+    """带缓存的 cross_sectional_seasonality；key 相同（同一数据版本、同一组标的）时直接返回缓存结果
+
+    结果与进程数无关，max_workers 不参与缓存键
+    """
+    with span('cross_section', symbols=closes.shape[1]) as record:
+        result = cross_section_cache.get(key)
+        record['cache'] = 'miss' if result is None else 'hit'
+        if result is None:
+            result = cross_sectional_seasonality(closes, max_workers=max_workers)
+            cross_section_cache.put(key, result)
+        return result
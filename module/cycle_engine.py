@@ -0,0 +1,240 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+
+import numpy as np
+import pandas as pd
+
+# 分块扫描时第一个块的长度，之后每块长度翻倍，直到 MAX_BLOCK
+MIN_BLOCK = 64
+MAX_BLOCK = 65536
+
+
+def _scan_phase(close, anchor, is_bull, factor):
+    """从 anchor 开始扫描一个牛市/熊市阶段
+
+    阶段内的最高价（牛市）或最低价（熊市）从 close[anchor] 开始，
+    寻找第一个从极值回撤/反弹超过阈值的位置。
+    返回 (触发反转的位置，没有则为 -1, 阶段内极值第一次出现的位置)
+    """
+    n = len(close)
+    extreme = close[anchor]
+    extreme_idx = anchor
+    pos = anchor + 1
+    block = MIN_BLOCK
+    if np.isnan(extreme):
+        # 与逐行比较相同：极值为 NaN 时任何比较都不成立，阶段一直持续到最后
+        return -1, extreme_idx
+
+    while pos < n:
+        seg = close[pos:pos + block]
+        # 包含之前极值的运行最高/最低价；fmax/fmin 忽略 NaN，与逐行比较的结果一致
+        if is_bull:
+            running = np.fmax.accumulate(np.concatenate(([extreme], seg)))[1:]
+            hit = seg < running * factor
+        else:
+            running = np.fmin.accumulate(np.concatenate(([extreme], seg)))[1:]
+            hit = seg > running * factor
+
+        k = int(hit.argmax()) if hit.any() else len(seg)
+        if k > 0:
+            # 触发点之前的块内极值；只有严格创新高/新低才更新，因此取第一次出现的位置
+            head = seg[:k]
+            block_extreme = np.fmax.reduce(head) if is_bull else np.fmin.reduce(head)
+            if (block_extreme > extreme) if is_bull else (block_extreme < extreme):
+                extreme = block_extreme
+                extreme_idx = pos + int(np.argmax(head == block_extreme))
+
+        if k < len(seg):
+            return pos + k, extreme_idx
+
+        pos += len(seg)
+        block = min(block * 2, MAX_BLOCK)
+
+    return -1, extreme_idx
+
+
+def detect_cycles(close, threshold=20):
+    """基于 NumPy 的牛熊市周期识别，结果与逐行扫描的 identify_market_cycles 完全一致
+
+    close: 收盘价一维数组
+    threshold: 从高点下跌或从低点上涨超过该百分比则认为是新的周期
+    返回 (is_bull, start_idx, end_idx) 三个等长数组，每个元素对应一个周期
+    """
+    close = np.asarray(close, dtype=float)
+    if close.size == 0:
+        raise ValueError("收盘价序列为空")
+
+    bull_factor = 1 - threshold / 100
+    bear_factor = 1 + threshold / 100
+
+    is_bull = []
+    starts = []
+    ends = []
+
+    # 与原实现相同：第一个周期总是从第一天开始的熊市
+    bull = False
+    cycle_start = 0
+    anchor = 0
+    while True:
+        breach, extreme_idx = _scan_phase(close, anchor, bull, bull_factor if bull else bear_factor)
+        is_bull.append(bull)
+        starts.append(cycle_start)
+        ends.append(extreme_idx)
+        if breach < 0:
+            break
+        # 新周期从上一阶段的极值开始，新阶段的极值从触发点开始计算
+        bull = not bull
+        cycle_start = extreme_idx
+        anchor = breach
+
+    return (
+        np.array(is_bull, dtype=bool),
+        np.array(starts, dtype=np.int64),
+        np.array(ends, dtype=np.int64),
+    )
+
+# 阈值扫描的默认网格：5% 到 50%，步长 0.5%
+THRESHOLD_GRID = tuple(round(5 + 0.5 * i, 1) for i in range(91))
+# 阈值扫描每一轮为每个阈值读取的收盘价个数
+SWEEP_BLOCK = 128
+# 标的数量达到该值时才使用进程池，标的较少时进程启动开销大于收益
+PARALLEL_MIN_SYMBOLS = 8
+
+
+def sweep_state(close, thresholds=THRESHOLD_GRID):
+    """一次扫描同时计算整个阈值网格的周期划分，结果与逐个阈值调用 detect_cycles 完全一致
+
+    所有阈值的状态（方向、阶段起点、阶段内极值）保存在数组中，每一轮为每个尚未结束的阈值
+    取从当前位置开始的 SWEEP_BLOCK 个收盘价组成 (阈值数, SWEEP_BLOCK) 矩阵，一次求出运行极值、
+    第一个触发反转的位置和块内新极值。熊市取收盘价的相反数，牛熊两种阶段使用同一套比较。
+    轮数约为 最多的周期数 + 序列长度 / SWEEP_BLOCK，与阈值个数无关。
+    返回 (各阈值已结束的周期 [(is_bull, start_idx, end_idx), ...]（每个阈值三个数组）,
+          最后一个（未结束）周期的状态 (bull, start, extreme, extreme_idx))；extreme 为实际价格
+    """
+    close = np.asarray(close, dtype=float)
+    if close.size == 0:
+        raise ValueError("收盘价序列为空")
+    threshold = np.asarray(thresholds, dtype=float)
+    size = len(threshold)
+    n = len(close)
+    padded = np.concatenate([close, np.full(SWEEP_BLOCK, np.nan)])
+    bull_factor = 1 - threshold / 100
+    bear_factor = 1 + threshold / 100
+    offsets = np.arange(SWEEP_BLOCK)
+
+    # 与 detect_cycles 相同：第一个周期总是从第一天开始的熊市；熊市的极值以相反数保存
+    bull = np.zeros(size, dtype=bool)
+    start = np.zeros(size, dtype=np.int64)
+    extreme = np.full(size, -close[0])
+    extreme_idx = np.zeros(size, dtype=np.int64)
+    pos = np.ones(size, dtype=np.int64)
+    # 每一轮结束的周期 (阈值序号, is_bull, start_idx, end_idx)，最后按阈值分组
+    closed = []
+
+    active = np.flatnonzero(pos < n)
+    while active.size:
+        phase_bull = bull[active]
+        factor = np.where(phase_bull, bull_factor[active], bear_factor[active])
+        seg = padded[pos[active, None] + offsets] * np.where(phase_bull, 1.0, -1.0)[:, None]
+        previous = extreme[active]
+
+        # 运行极值包含之前的极值；fmax 忽略 NaN，与 _scan_phase 逐块比较的结果一致
+        running = np.fmax.accumulate(np.concatenate([previous[:, None], seg], axis=1), axis=1)[:, 1:]
+        # 极值为 NaN（第一天的收盘价缺失）时与 _scan_phase 相同，阶段一直持续到最后
+        hit = (seg < running * factor[:, None]) & ~np.isnan(previous)[:, None]
+        breached = hit.any(axis=1)
+        k = np.where(breached, hit.argmax(axis=1), SWEEP_BLOCK)
+
+        # 触发点之前的运行极值；只有严格创新高/新低才更新，运行极值单调，第一次达到它的位置即极值的位置
+        block_extreme = running[np.arange(len(active)), np.maximum(k - 1, 0)]
+        improved = (k > 0) & (block_extreme > previous)
+        rows = active[improved]
+        extreme_idx[rows] = pos[rows] + np.argmax(running[improved] >= block_extreme[improved, None], axis=1)
+        extreme[rows] = block_extreme[improved]
+
+        # 新周期从上一阶段的极值开始，新阶段的极值从触发点开始计算
+        rows = active[breached]
+        breach = pos[rows] + k[breached]
+        closed.append((rows, bull[rows], start[rows], extreme_idx[rows]))
+        start[rows] = extreme_idx[rows]
+        bull[rows] = ~bull[rows]
+        extreme[rows] = np.where(bull[rows], 1.0, -1.0) * close[breach]
+        extreme_idx[rows] = breach
+        pos[rows] = breach + 1
+
+        rows = active[~breached]
+        pos[rows] += SWEEP_BLOCK
+        active = active[pos[active] < n]
+
+    rows, is_bull, starts, ends = (
+        np.concatenate([part[i] for part in closed]) if closed else np.array([], dtype=dtype)
+        for i, dtype in enumerate((np.int64, bool, np.int64, np.int64))
+    )
+    # 同一阈值的周期按结束的先后排列
+    order = np.argsort(rows, kind='stable')
+    bounds = np.searchsorted(rows[order], np.arange(1, size))
+    cycles = list(zip(*(np.split(values[order], bounds) for values in (is_bull, starts, ends))))
+    return cycles, (bull, start, np.where(bull, extreme, -extreme), extreme_idx)
+
+
+def sweep_cycles(close, thresholds=THRESHOLD_GRID):
+    """一次计算整个阈值网格的周期划分
+
+    返回 {阈值: (is_bull, start_idx, end_idx)}，阈值保留一位小数，
+    页面上切换阈值时只需查表
+    """
+    closed, (bull, start, _, extreme_idx) = sweep_state(close, thresholds)
+    return {
+        round(float(threshold), 1): (
+            np.append(is_bull, bull[j]),
+            np.append(starts, start[j]),
+            np.append(ends, extreme_idx[j]),
+        )
+        for j, (threshold, (is_bull, starts, ends)) in enumerate(zip(thresholds, closed))
+    }
+
+
+def sweep_universe(closes, thresholds=THRESHOLD_GRID, max_workers=None):
+    """对多个标的做阈值扫描
+
+    closes: {标的: 收盘价数组}
+    标的数量较多时分配到进程池中并行计算（max_workers=1 时串行），返回 {标的: sweep_cycles 的结果}
+    """
+    symbols = list(closes)
+    if max_workers == 1 or len(symbols) < PARALLEL_MIN_SYMBOLS:
+        return {symbol: sweep_cycles(closes[symbol], thresholds) for symbol in symbols}
+
+    chunksize = max(1, len(symbols) // ((max_workers or os.cpu_count() or 1) * 4))
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        results = executor.map(
+            sweep_cycles,
+            (closes[symbol] for symbol in symbols),
+            repeat(thresholds),
+            chunksize=chunksize
+        )
+        return dict(zip(symbols, results))
+
+
+def cycle_sensitivity(close, dates, sweep):
+    """阈值敏感性表：每个阈值下的周期数、平均持续天数和平均涨跌幅
+
+    close: 收盘价数组；dates: 与 close 对应的日期索引；sweep: sweep_cycles 的结果
+    """
+    close = np.asarray(close, dtype=float)
+    day_numbers = pd.DatetimeIndex(dates).values.astype('datetime64[D]').astype(np.int64)
+
+    rows = []
+    for threshold, (is_bull, starts, ends) in sweep.items():
+        durations = day_numbers[ends] - day_numbers[starts]
+        moves = (close[ends] - close[starts]) / close[starts] * 100
+        rows.append({
+            '阈值(%)': threshold,
+            '周期数': len(starts),
+            '牛市次数': int(is_bull.sum()),
+            '熊市次数': int((~is_bull).sum()),
+            '平均持续天数': durations.mean(),
+            '牛市平均涨幅(%)': moves[is_bull].mean() if is_bull.any() else np.nan,
+            '熊市平均跌幅(%)': moves[~is_bull].mean() if (~is_bull).any() else np.nan,
+        })
+    return pd.DataFrame(rows).set_index('阈值(%)')
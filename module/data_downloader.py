@@ -1,25 +1,40 @@
+import os
 import streamlit as st
-import yfinance as yf
 import pandas as pd
+import numpy as np
 from datetime import datetime
-from module.db_manager import DBManager
+from module.db_manager import DBManager, DEFAULT_SYMBOL
+from module.bulk_downloader import SOURCE_DIR_ENV, download_symbols
+from module.incremental import refresh_state
+from module.trading_calendar import trading_days
 
-def load_nasdaq_data(start_date, end_date):
-    """下载纳斯达克100指数数据和QQQ ETF市盈率"""
+# 指数本身没有市盈率，用跟踪该指数的ETF的市盈率代替
+PE_PROXIES = {
+    '^NDX': 'QQQ',
+}
+# 下载数据的最后一个交易日距今不超过该天数时，才把当前市盈率记为该日的估值观测
+PE_MAX_AGE_DAYS = 7
+
+def load_nasdaq_data(start_date, end_date, symbol=DEFAULT_SYMBOL):
+    """下载标的行情数据（默认纳斯达克100指数）和对应ETF的市盈率"""
     try:
-        # 下载纳斯达克100指数数据
-        ndx = yf.Ticker("^NDX")
-        df = ndx.history(start=start_date, end=end_date)
+        # 延迟导入，只在下载时加载 yfinance，不拖慢页面的首次打开
+        import yfinance as yf
+
+        # 下载行情数据
+        ticker = yf.Ticker(symbol)
+        df = ticker.history(start=start_date, end=end_date)
         
-        # 下载QQQ ETF的市盈率数据
-        qqq = yf.Ticker("QQQ")
-        pe_data = qqq.info.get('forwardPE', None)
-        if pe_data:
-            # 为所有日期添加相同的PE值
-            df['pe_ratio'] = float(pe_data)
+        # 下载市盈率数据（指数使用对应ETF的市盈率）
+        pe_ticker = yf.Ticker(PE_PROXIES.get(symbol, symbol))
+        pe_data = pe_ticker.info.get('forwardPE', None)
+        # 当前市盈率只是最新交易日的一次观测，只记在最后一行，历史行保持为空，
+        # 保存时写入估值观测表；下载的区间不包含最近几天时不记录，避免把今天的估值记到过去
+        df['pe_ratio'] = np.nan
+        if pe_data and not df.empty and df.index[-1].tz_localize(None) >= pd.Timestamp.now() - pd.Timedelta(days=PE_MAX_AGE_DAYS):
+            df.loc[df.index[-1], 'pe_ratio'] = float(pe_data)
             st.info(f"当前QQQ ETF的市盈率: {pe_data:.2f}")
-        else:
-            df['pe_ratio'] = None
+        elif not pe_data:
             st.warning("无法获取QQQ ETF的市盈率数据")
             
         # 添加QQQ的历史市盈率范围信息
@@ -57,42 +72,75 @@ def load_nasdaq_data(start_date, end_date):
         return None
 
 def analyze_yearly_data(df):
-    """分析每年的数据完整性"""
+    """分析每年的数据完整性
+
+    应有交易日按纽约证券交易所交易日历计算（不含节假日），并列出缺失的具体日期。
+    df 可以是单个标的以日期为索引的数据，也可以是 DBManager.load_data 返回的
+    以 (symbol, date) 为索引的多标的长表，此时结果按标的分行。
+    """
     if df is None or df.empty:
         return pd.DataFrame()
     
-    yearly_stats = []
-    years = df.index.year.unique()
-    
-    for year in years:
-        year_data = df[df.index.year == year]
-        
-        if year == datetime.now().year:
-            total_business_days = pd.date_range(
-                start=f"{year}-01-01",
-                end=datetime.now().date(),
-                freq='B'
-            ).size
-        else:
-            total_business_days = pd.date_range(
-                start=f"{year}-01-01",
-                end=f"{year}-12-31",
-                freq='B'
-            ).size
-        
-        actual_days = len(year_data)
-        missing_days = total_business_days - actual_days
-        completeness = (actual_days / total_business_days) * 100
-        
-        yearly_stats.append({
-            '年份': year,
-            '应有交易日': total_business_days,
-            '实际数据天数': actual_days,
-            '缺失天数': missing_days,
-            '完整性': f"{completeness:.2f}%"
-        })
+    multi_symbol = isinstance(df.index, pd.MultiIndex)
+    dates = pd.DatetimeIndex(df.index.get_level_values(-1))
+    if dates.tz is not None:
+        dates = dates.tz_localize(None)
+    if multi_symbol:
+        symbol_codes = df.index.codes[0]
+        symbol_index = df.index.levels[0].to_numpy()
+    else:
+        symbol_codes = np.zeros(len(df), dtype=int)
+        symbol_index = np.array([None])
+    days = dates.values.astype('datetime64[D]')
+    years = dates.year.to_numpy()
+    first_year = years.min()
+    year_count = years.max() - first_year + 1
+
+    # 每个 (标的, 年份) 的实际数据天数
+    actual = np.bincount(
+        symbol_codes * year_count + (years - first_year),
+        minlength=len(symbol_index) * year_count
+    ).reshape(len(symbol_index), year_count)
+    row_keys, year_offsets = np.nonzero(actual)
+
+    # 交易日历：最早年份的 1 月 1 日至最晚年份的 12 月 31 日，当年截至今天
+    today = np.datetime64(datetime.now().date(), 'D')
+    calendar = trading_days(f"{first_year}-01-01", min(np.datetime64(f"{years.max()}-12-31"), today))
+    calendar_years = calendar.astype('datetime64[Y]').astype(int) + 1970 - first_year
+    expected = np.bincount(calendar_years, minlength=year_count)
+
+    # (标的 × 交易日) 布尔矩阵：一次比较找出所有标的的缺失日期，只统计有数据的年份
+    positions = np.minimum(np.searchsorted(calendar, days), len(calendar) - 1)
+    on_calendar = calendar[positions] == days
+    present = np.zeros((len(symbol_index), len(calendar)), dtype=bool)
+    present[symbol_codes[on_calendar], positions[on_calendar]] = True
+    missing_rows, missing_cols = np.nonzero((actual > 0)[:, calendar_years] & ~present)
+
+    # 按 (标的, 年份) 把缺失日期切分成列表
+    missing_keys = missing_rows * year_count + calendar_years[missing_cols]
+    group_keys, group_starts = np.unique(missing_keys, return_index=True)
+    missing_by_key = dict(zip(
+        group_keys,
+        np.split(np.datetime_as_string(calendar[missing_cols]), group_starts[1:])
+    ))
+
+    actual_days = actual[row_keys, year_offsets]
+    expected_days = expected[year_offsets]
+    yearly_stats = pd.DataFrame({
+        '年份': year_offsets + first_year,
+        '应有交易日': expected_days,
+        '实际数据天数': actual_days,
+        '缺失天数': expected_days - actual_days,
+        '完整性': [f"{value:.2f}%" for value in actual_days / np.maximum(expected_days, 1) * 100],
+        '缺失日期': [
+            list(missing_by_key.get(key, []))
+            for key in row_keys * year_count + year_offsets
+        ],
+    })
+    if multi_symbol:
+        yearly_stats.insert(0, '标的', symbol_index[row_keys])
     
-    return pd.DataFrame(yearly_stats)
+    return yearly_stats
 
 def verify_data(df):
     """验证数据完整性"""
@@ -114,7 +162,8 @@ def show_downloader():
     st.title('数据下载')
     
     db_manager = DBManager()
-    metadata = db_manager.get_metadata()
+    symbol = st.text_input('标的代码:', st.session_state.get('symbol', DEFAULT_SYMBOL)).strip().upper()
+    metadata = db_manager.get_metadata(symbol)
     
     if metadata["total_records"] > 0:
         st.info(f"""现有数据信息:
@@ -143,8 +192,9 @@ def show_downloader():
     with col1:
         if st.button('下载并验证数据'):
             with st.spinner('正在下载数据...'):
-                df = load_nasdaq_data(start_date, end_date)
+                df = load_nasdaq_data(start_date, end_date, symbol)
                 st.session_state.downloaded_data = df
+                st.session_state.downloaded_symbol = symbol
                 
             if df is not None:
                 st.success(f'成功下载数据: {len(df)} 条记录')
@@ -177,7 +227,7 @@ def show_downloader():
                 st.download_button(
                     label="下载CSV文件",
                     data=csv,
-                    file_name=f"nasdaq100_{start_date}_{end_date}.csv",
+                    file_name=f"{symbol.lstrip('^').lower()}_{start_date}_{end_date}.csv",
                     mime='text/csv'
                 )
     
@@ -185,9 +235,36 @@ def show_downloader():
         if st.button('存入数据库', disabled=st.session_state.downloaded_data is None):
             if st.session_state.downloaded_data is not None:
                 with st.spinner('正在保存到数据库...'):
-                    db_manager.save_data(st.session_state.downloaded_data)
-                st.success("数据已成功保存到数据库！")
+                    saved_symbol = st.session_state.get('downloaded_symbol', DEFAULT_SYMBOL)
+                    result = db_manager.save_data(st.session_state.downloaded_data, saved_symbol)
+                    # 只追加了新交易日时分析状态增量更新，否则从头重建
+                    refresh_state(db_manager, saved_symbol)
+                st.success(f"数据已成功保存到数据库！新增 {result['inserted']} 条，更新 {result['updated']} 条")
                 # 清除已下载的数据
                 st.session_state.downloaded_data = None
             else:
-                st.warning("请先下载数据")
\ No newline at end of file
+                st.warning("请先下载数据")
+    
+    # 批量下载多个标的，直接写入数据库
+    st.subheader('批量下载')
+    if os.environ.get(SOURCE_DIR_ENV):
+        st.caption(f"使用本地数据源: {os.environ[SOURCE_DIR_ENV]}")
+    symbols_text = st.text_area('标的代码（每行一个或用逗号分隔）:', '')
+    if st.button('批量下载并存入数据库'):
+        symbols = [item.strip().upper() for item in symbols_text.replace(',', '\n').splitlines() if item.strip()]
+        if not symbols:
+            st.warning("请先输入标的代码")
+        else:
+            progress_bar = st.progress(0.0, text='正在下载...')
+            summary = download_symbols(
+                symbols, start_date, end_date, db_manager=db_manager,
+                progress=lambda done, total: progress_bar.progress(done / total, text=f'已完成 {done}/{total} 个分块')
+            )
+            progress_bar.empty()
+            st.dataframe(pd.DataFrame([
+                {'标的': symbol, '新增': result['inserted'], '更新': result['updated'], '失败分块': len(result['failed'])}
+                for symbol, result in summary.items()
+            ]))
+            for symbol, result in summary.items():
+                for start, end, error in result['failed']:
+                    st.error(f"{symbol} {start} 至 {end} 下载失败: {error}")
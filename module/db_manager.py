@@ -1,96 +1,959 @@
 import sqlite3
 import json
+import queue
+import tempfile
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from urllib.parse import quote
+import numpy as np
 import pandas as pd
 from pathlib import Path
 import os
+import atexit
+from module.instrumentation import span
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc
+except ImportError:  # 没有 pyarrow 时不维护列式镜像，读取回退到 SQLite
+    pa = None
+
+# 连接池中保留的空闲只读连接数（并发会话更多时临时新建，归还时关闭多余的连接）
+READER_POOL_SIZE = 8
+# 每个连接的页缓存（负数表示 KiB）和内存映射大小
+CACHE_SIZE_KIB = 64 * 1024
+MMAP_SIZE = 256 * 1024 * 1024
+# 写锁被其他进程占用时的等待时间(ms)
+BUSY_TIMEOUT_MS = 5000
+
+# 默认分析的标的：纳斯达克100指数
+DEFAULT_SYMBOL = '^NDX'
+# 页面上显示的标的名称
+SYMBOL_NAMES = {
+    '^NDX': '纳斯达克100指数',
+}
+
+# load_data 可以读取的数据列
+PRICE_COLUMNS = ['open', 'high', 'low', 'close', 'volume', 'dividends', 'stock_splits', 'pe_ratio']
+# prices 表中除 (symbol, date) 外的数据列（与建表语句保持一致）；
+# pe_ratio 不在行情表中，而是在读取时从 valuation 表按日期向前匹配
+PRICE_TABLE_COLUMNS = [col for col in PRICE_COLUMNS if col != 'pe_ratio']
+# 列式镜像的统一 schema：所有标的的文件列类型相同，某列全为空值（如没有分红数据）的标的也可以直接拼接
+COLUMNAR_SCHEMA = None if pa is None else pa.schema(
+    [('date', pa.timestamp('ns'))] + [(col, pa.float64()) for col in PRICE_TABLE_COLUMNS]
+)
+# 每个 executemany 批次写入的行数
+UPSERT_BATCH_SIZE = 500
+# 日期在数据库中的存储格式
+DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+# 以 (symbol, date) 为主键的行情表。WITHOUT ROWID 使主键 B 树直接存放整行，
+# 即一个覆盖所有列的聚簇索引：按标的 + 日期范围读取只需一次索引范围扫描
+PRICES_TABLE_SQL = '''
+    CREATE TABLE IF NOT EXISTS prices (
+        symbol TEXT NOT NULL,
+        date DATE NOT NULL,
+        open REAL,
+        high REAL,
+        low REAL,
+        close REAL,
+        volume REAL,
+        dividends REAL,
+        stock_splits REAL,
+        PRIMARY KEY (symbol, date)
+    ) WITHOUT ROWID
+'''
+
+# 估值（市盈率）观测表：稀疏记录 (标的, 观测日期, 市盈率)，随每次下载追加，
+# 只在数值变化时写入新的一行；某一天的市盈率为该日及之前最近一次观测的值
+VALUATION_TABLE_SQL = '''
+    CREATE TABLE IF NOT EXISTS valuation (
+        symbol TEXT NOT NULL,
+        date DATE NOT NULL,
+        pe REAL NOT NULL,
+        PRIMARY KEY (symbol, date)
+    ) WITHOUT ROWID
+'''
+
+# 旧版本建立的 prices(date) 索引：按标的 + 日期范围的查询（包括跨全部标的读取最近几天）
+# 都走 (symbol, date) 主键，该索引从未被使用，只增加写入和存储开销，迁移时删除
+DROP_PRICES_DATE_INDEX_SQL = "DROP INDEX IF EXISTS idx_prices_date"
+
+# 月线表：在 save_data 写入日线时增量维护，月度分析直接读取，无需再对日线 resample
+# month 为 'YYYY-MM'；close 为月末收盘价，first_close 为月初收盘价；
+# month_return 为相对上一个月收盘价的收益率（小数），第一个月为 NULL
+MONTHLY_BARS_TABLE_SQL = '''
+    CREATE TABLE IF NOT EXISTS monthly_bars (
+        symbol TEXT NOT NULL,
+        month TEXT NOT NULL,
+        open REAL,
+        high REAL,
+        low REAL,
+        close REAL,
+        first_close REAL,
+        month_return REAL,
+        trading_days INTEGER,
+        PRIMARY KEY (symbol, month)
+    ) WITHOUT ROWID
+'''
+MONTHLY_BAR_COLUMNS = ['open', 'high', 'low', 'close', 'first_close', 'month_return', 'trading_days']
+
+# 每个标的的元数据（数据范围、记录数、最后更新时间），与行情在同一事务中更新
+METADATA_TABLE_SQL = '''
+    CREATE TABLE IF NOT EXISTS symbol_metadata (
+        symbol TEXT PRIMARY KEY,
+        start_date TEXT,
+        end_date TEXT,
+        total_records INTEGER NOT NULL DEFAULT 0,
+        last_updated TEXT
+    ) WITHOUT ROWID
+'''
+METADATA_FIELDS = ["start_date", "end_date", "total_records", "last_updated"]
+
+# 可增量更新的分析状态（module.incremental），payload 为 JSON；
+# last_date 为状态已包含的最后一个交易日，该日及之前的数据被修改时删除状态，下次使用时从头重建
+ANALYTICS_STATE_TABLE_SQL = '''
+    CREATE TABLE IF NOT EXISTS analytics_state (
+        symbol TEXT PRIMARY KEY,
+        last_date TEXT NOT NULL,
+        payload TEXT NOT NULL
+    ) WITHOUT ROWID
+'''
+
+# 分析状态中已结束的牛熊市周期，只追加；序号 seq 为该阈值下的第几个周期
+ANALYTICS_CYCLES_TABLE_SQL = '''
+    CREATE TABLE IF NOT EXISTS analytics_cycles (
+        symbol TEXT NOT NULL,
+        threshold REAL NOT NULL,
+        seq INTEGER NOT NULL,
+        is_bull INTEGER NOT NULL,
+        start_idx INTEGER NOT NULL,
+        end_idx INTEGER NOT NULL,
+        PRIMARY KEY (symbol, threshold, seq)
+    ) WITHOUT ROWID
+'''
+
+# 兼容旧代码的 nasdaq_data 视图，只包含默认标的；pe_ratio 为当日及之前最近一次的估值观测
+NASDAQ_VIEW_SQL = f'''
+    CREATE VIEW IF NOT EXISTS nasdaq_data AS
+    SELECT date, {', '.join(PRICE_TABLE_COLUMNS)},
+        (SELECT pe FROM valuation v WHERE v.symbol = p.symbol AND v.date <= p.date
+         ORDER BY v.date DESC LIMIT 1) AS pe_ratio
+    FROM prices p WHERE symbol = '{DEFAULT_SYMBOL}'
+'''
+
+
+def symbol_name(symbol):
+    """标的在页面上显示的名称"""
+    return SYMBOL_NAMES.get(symbol, symbol)
+
+
+def aggregate_monthly_bars(df):
+    """按自然月把日线聚合为月线（不含 month_return），索引为 'YYYY-MM'"""
+    grouped = df.groupby(df.index.strftime('%Y-%m'))
+    bars = pd.DataFrame({
+        'open': grouped['open'].first(),
+        'high': grouped['high'].max(),
+        'low': grouped['low'].min(),
+        'close': grouped['close'].last(),
+        'first_close': grouped['close'].first(),
+        'trading_days': grouped.size(),
+    })
+    bars.index.name = 'month'
+    return bars
+
+
+# 进程内共享缓存最多保留的 DataFrame 个数
+FRAME_CACHE_SIZE = 32
+
+
+class FrameCache:
+    """进程内共享、线程安全的 LRU 缓存
+
+    所有 Streamlit 会话运行在同一个进程中，共用一个缓存实例；
+    缓存键中包含数据版本，数据写入后旧版本的条目不会再被命中。
+    """
+
+    def __init__(self, maxsize=FRAME_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            if key not in self._items:
+                self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+            return self._items[key]
+
+    def put(self, key, value):
+        with self._lock:
+            self._items[key] = value
+            self._items.move_to_end(key)
+            while len(self._items) > self.maxsize:
+                self._items.popitem(last=False)
+
+    def invalidate(self, predicate=None):
+        """删除满足 predicate(key) 的条目；不传 predicate 时清空缓存"""
+        with self._lock:
+            if predicate is None:
+                self._items.clear()
+                return
+            for key in [key for key in self._items if predicate(key)]:
+                del self._items[key]
+
+    def __len__(self):
+        return len(self._items)
+
+
+class ConnectionPool:
+    """某个数据库文件的长连接池：一个写连接和若干只读连接，所有线程共享
+
+    数据库使用 WAL 日志模式：写入只追加到 -wal 文件，读连接读取开始时已提交的快照，
+    save_data 写入期间读取不会被阻塞，写入也不需要等待读取结束。
+    只读连接以 mode=ro 打开，不可能意外写入；写连接由锁保证同一时间只有一个线程使用。
+    """
+
+    def __init__(self, db_path, size=READER_POOL_SIZE):
+        self.db_path = db_path
+        self.size = size
+        self.pid = os.getpid()
+        self._readers = queue.LifoQueue()
+        self._writer = None
+        # 可重入：持有写连接的线程可以在其中调用其他写入方法
+        self._write_lock = threading.RLock()
+
+    def _configure(self, conn):
+        conn.execute(f"PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}")
+        conn.execute(f"PRAGMA cache_size = -{CACHE_SIZE_KIB}")
+        conn.execute(f"PRAGMA mmap_size = {MMAP_SIZE}")
+        return conn
+
+    def _open_writer(self):
+        conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._configure(conn)
+        # WAL 模式记录在数据库文件中，设置一次后对所有连接（包括其他进程）生效
+        conn.execute("PRAGMA journal_mode = WAL")
+        # WAL 模式下 NORMAL 只在检查点时同步磁盘，断电最多丢失最近的事务，不会损坏数据库
+        conn.execute("PRAGMA synchronous = NORMAL")
+        return conn
+
+    def _open_reader(self):
+        uri = f"{Path(os.path.abspath(self.db_path)).as_uri()}?mode=ro"
+        return self._configure(sqlite3.connect(uri, uri=True, check_same_thread=False, isolation_level=None))
+
+    @contextmanager
+    def reader(self):
+        """借出一个只读连接，用完后归还"""
+        try:
+            conn = self._readers.get_nowait()
+        except queue.Empty:
+            conn = self._open_reader()
+        try:
+            yield conn
+        finally:
+            if self._readers.qsize() < self.size:
+                self._readers.put(conn)
+            else:
+                conn.close()
+
+    @contextmanager
+    def writer(self):
+        """独占写连接；事务由调用方用 with conn 控制"""
+        with self._write_lock:
+            if self._writer is None:
+                self._writer = self._open_writer()
+            yield self._writer
+
+    def close(self):
+        """关闭所有空闲连接（借出中的读连接归还时会重新放回池中）"""
+        while True:
+            try:
+                self._readers.get_nowait().close()
+            except queue.Empty:
+                break
+        with self._write_lock:
+            if self._writer is not None:
+                # 关闭前更新规划器统计信息（只在统计信息过期时才会真正执行 ANALYZE）
+                self._writer.execute("PRAGMA optimize")
+                self._writer.close()
+                self._writer = None
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(db_path):
+    """数据库文件对应的进程级连接池
+
+    子进程（如报表、显著性检验的进程池）不能使用从父进程继承的连接，按进程号重新创建
+    """
+    with _pools_lock:
+        pool = _pools.get(db_path)
+        if pool is None or pool.pid != os.getpid():
+            pool = _pools[db_path] = ConnectionPool(db_path)
+        return pool
+
+
+def close_pools():
+    """关闭本进程的所有连接池（进程退出时自动调用）"""
+    with _pools_lock:
+        pools = [pool for pool in _pools.values() if pool.pid == os.getpid()]
+        _pools.clear()
+    for pool in pools:
+        pool.close()
+
+
+atexit.register(close_pools)
+
+
+# load_data 结果的进程级缓存
+frame_cache = FrameCache()
+# 每个数据库文件在本进程内的写入次数，作为数据版本的一部分
+_ingest_counters = {}
+# 本进程内已完成建表和迁移的数据库文件，页面每次重新运行时不再重复初始化
+_initialized_dbs = set()
+_init_lock = threading.Lock()
+# 列式镜像的导出与失效互斥：导出期间提交的写入会在导出完成后再删除镜像，不会留下过期的文件
+_columnar_lock = threading.Lock()
+
 
 class DBManager:
-    def __init__(self):
-        # 确保db目录存在
-        Path("db").mkdir(exist_ok=True)
-        self.db_path = "db/qqq.db"
-        self.json_path = "db/qqq.json"
-        self.init_db()
-        self.init_json()
+    def __init__(self, db_dir="db"):
+        self.db_path = os.path.join(db_dir, "qqq.db")
+        # 旧版元数据文件，只在首次迁移时读取
+        self.json_path = os.path.join(db_dir, "qqq.json")
+        # SQLite 之外的列式（Arrow IPC）镜像，每个标的一个文件，SQLite 仍是唯一的数据源
+        self.columnar_dir = os.path.join(db_dir, "columnar")
+        # 建表和迁移每个进程只做一次；数据库文件被删除后重新初始化
+        with _init_lock:
+            if self.db_path not in _initialized_dbs or not os.path.exists(self.db_path):
+                # 确保db目录存在
+                Path(db_dir).mkdir(exist_ok=True)
+                if self.db_path in _initialized_dbs:
+                    # 旧连接仍指向已删除的文件
+                    get_pool(self.db_path).close()
+                self.init_db()
+                _initialized_dbs.add(self.db_path)
+        self.pool = get_pool(self.db_path)
 
     def init_db(self):
         """初始化数据库"""
-        conn = sqlite3.connect(self.db_path)
+        with get_pool(self.db_path).writer() as conn:
+            self._init_tables(conn)
+        self.optimize()
+
+    def _init_tables(self, conn):
+        """建表并执行迁移"""
         cursor = conn.cursor()
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS nasdaq_data (
-                date DATE PRIMARY KEY,
-                open REAL,
-                high REAL,
-                low REAL,
-                close REAL,
-                volume REAL,
-                dividends REAL,
-                stock_splits REAL,
-                pe_ratio REAL
+        cursor.execute(PRICES_TABLE_SQL)
+        cursor.execute(DROP_PRICES_DATE_INDEX_SQL)
+        cursor.execute(MONTHLY_BARS_TABLE_SQL)
+        cursor.execute(VALUATION_TABLE_SQL)
+        cursor.execute(METADATA_TABLE_SQL)
+        cursor.execute(ANALYTICS_STATE_TABLE_SQL)
+        cursor.execute(ANALYTICS_CYCLES_TABLE_SQL)
+        self._migrate_legacy_table(conn)
+        self._migrate_pe_column(conn)
+        cursor.execute(NASDAQ_VIEW_SQL)
+        self._backfill_monthly_bars(conn)
+        self._backfill_metadata(conn)
+        conn.commit()
+
+    def optimize(self):
+        """更新规划器统计信息（只在统计信息过期时才会真正执行 ANALYZE）"""
+        with get_pool(self.db_path).writer() as conn:
+            conn.execute("PRAGMA optimize")
+
+    def _migrate_legacy_table(self, conn):
+        """将旧版单标的 nasdaq_data 表（包括 to_sql 生成的无主键表）迁移到 prices 表"""
+        is_table = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'nasdaq_data'"
+        ).fetchone()
+        if not is_table:
+            return
+
+        # 旧表的列名可能带空格（如 "stock splits"），按规范化后的名称映射
+        table_info = conn.execute("PRAGMA table_info(nasdaq_data)").fetchall()
+        legacy_columns = {name.lower().replace(' ', '_'): name for _, name, _, _, _, _ in table_info}
+        columns = [col for col in PRICE_TABLE_COLUMNS if col in legacy_columns]
+        select_list = ', '.join(f'"{legacy_columns[col]}"' for col in columns)
+
+        conn.execute(f'''
+            INSERT OR REPLACE INTO prices (symbol, date, {', '.join(columns)})
+            SELECT ?, date, {select_list} FROM nasdaq_data
+            WHERE date IS NOT NULL ORDER BY date
+        ''', (DEFAULT_SYMBOL,))
+        if 'pe_ratio' in legacy_columns:
+            self._keep_latest_pe(conn, 'nasdaq_data', DEFAULT_SYMBOL)
+        conn.execute("DROP TABLE nasdaq_data")
+
+    def _keep_latest_pe(self, conn, table, symbol=None):
+        """旧版把下载当天的市盈率写进了所有历史行，只有最后一行的日期是真实的观测日期
+
+        每个标的只保留最后一个有市盈率的行，作为该日期的一次估值观测
+        """
+        symbol_expr = '?' if symbol else 'symbol'
+        params = (symbol,) if symbol else ()
+        conn.execute(f'''
+            INSERT OR IGNORE INTO valuation (symbol, date, pe)
+            SELECT {symbol_expr}, MAX(date), pe_ratio FROM {table}
+            WHERE pe_ratio IS NOT NULL {'' if symbol else 'GROUP BY symbol'}
+        ''', params)
+
+    def _migrate_pe_column(self, conn):
+        """旧版 prices 表带有 pe_ratio 列：保留每个标的最后一次市盈率到 valuation 表，然后删除该列"""
+        columns = [row[1] for row in conn.execute("PRAGMA table_info(prices)").fetchall()]
+        if 'pe_ratio' not in columns:
+            return
+        self._keep_latest_pe(conn, 'prices')
+        # 视图引用了该列，先删除，之后由 init_db 重新创建
+        conn.execute("DROP VIEW IF EXISTS nasdaq_data")
+        if sqlite3.sqlite_version_info >= (3, 35, 0):
+            conn.execute("ALTER TABLE prices DROP COLUMN pe_ratio")
+        else:
+            # 旧版 SQLite 不支持删除列，清空后 NULL 几乎不占空间
+            conn.execute("UPDATE prices SET pe_ratio = NULL")
+
+    def _backfill_monthly_bars(self, conn):
+        """月线表为空而日线表有数据时（首次升级），一次性生成所有标的的月线"""
+        if conn.execute("SELECT 1 FROM monthly_bars LIMIT 1").fetchone():
+            return
+        ranges = conn.execute("SELECT symbol, MIN(date), MAX(date) FROM prices GROUP BY symbol").fetchall()
+        for symbol, start, end in ranges:
+            self._refresh_monthly_bars(conn, symbol, start, end)
+
+    def _refresh_monthly_bars(self, conn, symbol, start, end):
+        """重新计算 start 至 end 所在月份的月线，并更新其后一个月的收益率
+
+        只读取受影响月份的日线，每日增量更新时只涉及一到两个月
+        """
+        first_month = start[:7]
+        last_month = end[:7]
+        after_last = (pd.Period(last_month, 'M') + 1).strftime('%Y-%m')
+
+        daily = pd.read_sql_query(
+            "SELECT date, open, high, low, close FROM prices "
+            "WHERE symbol = ? AND date >= ? AND date < ? ORDER BY date",
+            conn,
+            params=(symbol, f'{first_month}-01', f'{after_last}-01'),
+            index_col='date'
+        )
+        daily.index = pd.to_datetime(daily.index)
+        bars = aggregate_monthly_bars(daily)
+        if bars.empty:
+            return
+
+        # 与 resample('M').last().pct_change() 相同的计算方式：本月收盘 / 上月收盘 - 1
+        previous = conn.execute(
+            "SELECT close FROM monthly_bars WHERE symbol = ? AND month < ? ORDER BY month DESC LIMIT 1",
+            (symbol, first_month)
+        ).fetchone()
+        closes = pd.concat([pd.Series([previous[0] if previous else None], dtype=float), bars['close']])
+        bars['month_return'] = (closes / closes.shift() - 1).iloc[1:].to_numpy()
+
+        conn.executemany(
+            f"INSERT OR REPLACE INTO monthly_bars (symbol, month, {', '.join(MONTHLY_BAR_COLUMNS)}) "
+            f"VALUES ({', '.join('?' * (len(MONTHLY_BAR_COLUMNS) + 2))})",
+            [
+                (symbol, month, *(None if pd.isna(value) else value for value in values))
+                for month, values in zip(bars.index, bars[MONTHLY_BAR_COLUMNS].astype(object).itertuples(index=False, name=None))
+            ]
+        )
+
+        following = conn.execute(
+            "SELECT month, close FROM monthly_bars WHERE symbol = ? AND month > ? ORDER BY month LIMIT 1",
+            (symbol, bars.index[-1])
+        ).fetchone()
+        if following:
+            conn.execute(
+                "UPDATE monthly_bars SET month_return = ? WHERE symbol = ? AND month = ?",
+                (following[1] / bars['close'].iloc[-1] - 1, symbol, following[0])
             )
+
+    def _backfill_metadata(self, conn):
+        """元数据表为空而日线表有数据时（首次升级），根据日线表生成各标的的元数据
+
+        数据范围和记录数以日线表为准；旧版 JSON 文件中的最后更新时间保留下来
+        """
+        if conn.execute("SELECT 1 FROM symbol_metadata LIMIT 1").fetchone():
+            return
+        legacy = {}
+        if os.path.exists(self.json_path):
+            try:
+                with open(self.json_path, 'r') as f:
+                    legacy = json.load(f)
+            except (OSError, ValueError):
+                legacy = {}
+        # 旧版元数据只记录了默认标的
+        symbols = legacy.get("symbols", {DEFAULT_SYMBOL: legacy})
+        conn.execute('''
+            INSERT INTO symbol_metadata (symbol, start_date, end_date, total_records)
+            SELECT symbol, substr(MIN(date), 1, 10), substr(MAX(date), 1, 10), COUNT(*)
+            FROM prices GROUP BY symbol
         ''')
-        conn.commit()
-        conn.close()
-
-    def init_json(self):
-        """初始化JSON文件"""
-        if not os.path.exists(self.json_path):
-            self.save_metadata({
-                "start_date": None,
-                "end_date": None,
-                "total_records": 0,
-                "last_updated": None
-            })
-
-    def save_metadata(self, metadata):
-        """保存元数据到JSON文件"""
-        with open(self.json_path, 'w') as f:
-            json.dump(metadata, f, indent=4)
-
-    def get_metadata(self):
-        """读取元数据"""
-        with open(self.json_path, 'r') as f:
-            return json.load(f)
-
-    def save_data(self, df):
-        """保存数据到SQLite数据库"""
-        conn = sqlite3.connect(self.db_path)
+        conn.executemany(
+            "UPDATE symbol_metadata SET last_updated = ? WHERE symbol = ?",
+            [(entry.get("last_updated"), symbol) for symbol, entry in symbols.items() if entry.get("last_updated")]
+        )
+
+    def _update_metadata(self, conn, symbol, start_date, end_date, inserted):
+        """在写入行情的事务中更新该标的的元数据
+
+        数据范围取原范围与本次写入范围的并集，记录数加上新增的行数；
+        在数据库中原地累加，新增行数在同一个 BEGIN IMMEDIATE 事务中计算，多个会话或进程同时写入时不会重复计入
+        """
+        conn.execute('''
+            INSERT INTO symbol_metadata (symbol, start_date, end_date, total_records, last_updated)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT(symbol) DO UPDATE SET
+                start_date = COALESCE(MIN(start_date, excluded.start_date), start_date, excluded.start_date),
+                end_date = COALESCE(MAX(end_date, excluded.end_date), end_date, excluded.end_date),
+                total_records = total_records + excluded.total_records,
+                last_updated = excluded.last_updated
+        ''', (symbol, start_date, end_date, inserted, pd.Timestamp.now().strftime('%Y-%m-%d %H:%M:%S')))
+
+    def _read_metadata(self):
+        """所有标的的元数据 {标的: {字段: 值}}，按数据版本缓存在进程内"""
+        key = (self.db_path, self.data_version(), 'metadata')
+        metadata = frame_cache.get(key)
+        if metadata is None:
+            with self.pool.reader() as conn:
+                rows = conn.execute(
+                    f"SELECT symbol, {', '.join(METADATA_FIELDS)} FROM symbol_metadata "
+                    "WHERE total_records > 0 ORDER BY symbol"
+                ).fetchall()
+            metadata = {row[0]: dict(zip(METADATA_FIELDS, row[1:])) for row in rows}
+            frame_cache.put(key, metadata)
+        return metadata
+
+    def get_metadata(self, symbol=None):
+        """读取元数据
+
+        symbol 为空时返回所有标的的汇总信息，否则返回该标的的信息；
+        结果来自进程内缓存，数据写入后自动失效，页面每次重新运行不需要查询数据库
+        """
+        symbols = self._read_metadata()
+        if symbol is not None:
+            if symbol not in symbols:
+                return {"start_date": None, "end_date": None, "total_records": 0, "last_updated": None}
+            return dict(symbols[symbol])
+
+        entries = list(symbols.values())
+        return {
+            "start_date": min(filter(None, (entry["start_date"] for entry in entries)), default=None),
+            "end_date": max(filter(None, (entry["end_date"] for entry in entries)), default=None),
+            "total_records": sum(entry["total_records"] for entry in entries),
+            "last_updated": max(filter(None, (entry["last_updated"] for entry in entries)), default=None),
+            "symbols": {symbol: dict(entry) for symbol, entry in symbols.items()},
+        }
+
+    def get_symbols(self):
+        """数据库中已有数据的标的列表"""
+        return sorted(self.get_metadata()["symbols"])
+
+    def data_version(self):
+        """当前数据版本：数据库文件和 WAL 文件的修改时间 + 本进程内的写入次数
+
+        WAL 模式下其他进程的写入先追加到 -wal 文件，检查点时才写回数据库文件，
+        两个文件的修改时间和本进程的写入计数任一变化都会使旧的缓存失效。
+        """
+        mtimes = []
+        for path in (self.db_path, f"{self.db_path}-wal"):
+            try:
+                mtimes.append(os.stat(path).st_mtime_ns)
+            except FileNotFoundError:
+                mtimes.append(0)
+        return (*mtimes, _ingest_counters.get(self.db_path, 0))
+
+    def invalidate_cache(self):
+        """数据写入后使该数据库的缓存失效"""
+        _ingest_counters[self.db_path] = _ingest_counters.get(self.db_path, 0) + 1
+        frame_cache.invalidate(lambda key: key[0] == self.db_path)
+
+    def _prepare_frame(self, df):
+        """将下载的数据整理为与表结构一致的格式（日期字符串 + 数据列）"""
         # 重置索引，将日期变成列
         df_to_save = df.reset_index()
         # 重命名 index 列为 date
         df_to_save = df_to_save.rename(columns={'index': 'date'})
-        # 转换所有列名为小写
-        df_to_save.columns = df_to_save.columns.str.lower()
+        # 转换所有列名为小写，空格替换为下划线（如 "Stock Splits" -> stock_splits）
+        df_to_save.columns = df_to_save.columns.str.lower().str.replace(' ', '_')
         # 确保日期列是UTC时间
         df_to_save['date'] = pd.to_datetime(df_to_save['date']).dt.tz_localize(None)
-        
-        df_to_save.to_sql('nasdaq_data', conn, if_exists='replace', index=False)
-        conn.close()
-
-        # 更新元数据
-        metadata = {
-            "start_date": df_to_save['date'].min().strftime('%Y-%m-%d'),
-            "end_date": df_to_save['date'].max().strftime('%Y-%m-%d'),
-            "total_records": len(df),
-            "last_updated": pd.Timestamp.now().strftime('%Y-%m-%d %H:%M:%S')
-        }
-        self.save_metadata(metadata)
-
-    def load_data(self, start_date=None, end_date=None):
-        """从数据库加载数据"""
-        conn = sqlite3.connect(self.db_path)
-        query = "SELECT * FROM nasdaq_data"
-        if start_date and end_date:
-            query += f" WHERE date BETWEEN '{start_date}' AND '{end_date}'"
-        query += " ORDER BY date"  # 确保数据按日期排序
+        df_to_save = df_to_save.drop_duplicates('date', keep='last').sort_values('date')
+
+        columns = [col for col in PRICE_COLUMNS if col in df_to_save.columns]
+        prepared = df_to_save[columns].astype(float)
+        prepared.index = df_to_save['date'].dt.strftime(DATE_FORMAT)
+        return prepared
+
+    def _changed_rows(self, conn, prepared, symbol):
+        """与数据库中已有的行比较，返回 (新增或内容有变化的行, 其中新增的行数)"""
+        columns = list(prepared.columns)
+        existing = pd.read_sql_query(
+            f"SELECT date, {', '.join(columns)} FROM prices WHERE symbol = ? AND date BETWEEN ? AND ?",
+            conn,
+            params=(symbol, prepared.index[0], prepared.index[-1]),
+            index_col='date'
+        )
+        is_new = ~prepared.index.isin(existing.index)
+        existing = existing.reindex(prepared.index).astype(float)
+
+        same = (prepared == existing) | (prepared.isna() & existing.isna())
+        changed = ~same.all(axis=1)
+        return prepared[changed], int((changed & is_new).sum())
+
+    def _save_valuation(self, conn, symbol, pe):
+        """把市盈率序列中数值发生变化的点写入 valuation 表，返回写入的观测数
+
+        pe: 以日期字符串为索引的市盈率，缺失值表示当天没有观测
+        """
+        pe = pe.dropna()
+        if pe.empty:
+            return 0
+
+        # 与写入范围之前最近一次观测相同的值不需要重复记录
+        previous = conn.execute(
+            "SELECT pe FROM valuation WHERE symbol = ? AND date < ? ORDER BY date DESC LIMIT 1",
+            (symbol, pe.index[0])
+        ).fetchone()
+        values = pe.to_numpy()
+        before = np.concatenate(([previous[0] if previous else np.nan], values[:-1]))
+        observations = pe[values != before]
+
+        existing = dict(conn.execute(
+            "SELECT date, pe FROM valuation WHERE symbol = ? AND date BETWEEN ? AND ?",
+            (symbol, observations.index[0], observations.index[-1])
+        ).fetchall())
+        rows = [(symbol, date, value) for date, value in observations.items() if existing.get(date) != value]
+        conn.executemany(
+            "INSERT INTO valuation (symbol, date, pe) VALUES (?, ?, ?) "
+            "ON CONFLICT(symbol, date) DO UPDATE SET pe = excluded.pe",
+            rows
+        )
+        return len(rows)
+
+    def load_valuation(self, symbol=DEFAULT_SYMBOL):
+        """某个标的的全部估值观测，返回以观测日期为索引的市盈率 Series"""
+        with self.pool.reader() as conn:
+            pe = pd.read_sql_query(
+                "SELECT date, pe FROM valuation WHERE symbol = ? ORDER BY date",
+                conn, params=(symbol,), index_col='date'
+            )['pe']
+        pe.index = pd.to_datetime(pe.index)
+        return pe
+
+    def load_analytics_state(self, symbol):
+        """某个标的持久化的分析状态（JSON 字符串），没有则返回 None"""
+        with self.pool.reader() as conn:
+            row = conn.execute("SELECT payload FROM analytics_state WHERE symbol = ?", (symbol,)).fetchone()
+        return row[0] if row else None
+
+    def load_analytics_snapshot(self, symbol):
+        """在同一个读事务中读取某个标的的分析状态和全部已结束的周期，两者来自同一快照
+
+        返回 (状态 JSON 字符串或 None, [(阈值, 序号, is_bull, start_idx, end_idx), ...])
+        """
+        with self.pool.reader() as conn:
+            conn.execute("BEGIN")
+            try:
+                row = conn.execute("SELECT payload FROM analytics_state WHERE symbol = ?", (symbol,)).fetchone()
+                cycles = conn.execute(
+                    "SELECT threshold, seq, is_bull, start_idx, end_idx FROM analytics_cycles "
+                    "WHERE symbol = ? ORDER BY threshold, seq",
+                    (symbol,)
+                ).fetchall()
+            finally:
+                conn.execute("COMMIT")
+        return (row[0] if row else None), cycles
+
+    def save_analytics_state(self, symbol, last_date, payload, cycles=(), replace=False):
+        """在一个事务中保存某个标的的分析状态和新结束的周期
+
+        replace=True（从头重建）时先删除该标的已有的周期
+        """
+        with self.pool.writer() as conn:
+            with conn:
+                if replace:
+                    conn.execute("DELETE FROM analytics_cycles WHERE symbol = ?", (symbol,))
+                conn.execute(
+                    "INSERT INTO analytics_state (symbol, last_date, payload) VALUES (?, ?, ?) "
+                    "ON CONFLICT(symbol) DO UPDATE SET last_date = excluded.last_date, payload = excluded.payload",
+                    (symbol, last_date, payload)
+                )
+                conn.executemany(
+                    "INSERT OR REPLACE INTO analytics_cycles (symbol, threshold, seq, is_bull, start_idx, end_idx) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    [(symbol, *row) for row in cycles]
+                )
+
+    def save_data(self, df, symbol=DEFAULT_SYMBOL):
+        """增量保存某个标的的数据到SQLite数据库，只写入新增或有变化的行
+
+        df 中的 pe_ratio 列不写入行情表，只把数值变化的点作为估值观测写入 valuation 表
+        返回 {'inserted': 新增行数, 'updated': 更新行数}
+        """
+        prepared = self._prepare_frame(df)
+        if prepared.empty:
+            return {'inserted': 0, 'updated': 0}
+        pe = prepared.pop('pe_ratio') if 'pe_ratio' in prepared else None
+
+        # 写连接由连接池独占，同一进程内的多个会话依次写入
+        with self.pool.writer() as conn:
+            # BEGIN IMMEDIATE 先取得数据库的写锁，与已有数据的比较和写入在同一事务中：
+            # 其他进程（如命令行批量下载、报表）不能在比较之后写入同样的行，新增行数不会被重复计入元数据
+            conn.execute("BEGIN IMMEDIATE")
+            # 分批在同一个事务中写入，并在同一事务中更新受影响月份的月线和估值观测
+            with conn:
+                touched, inserted = self._changed_rows(conn, prepared, symbol)
+
+                columns = list(touched.columns)
+                upsert_sql = f'''
+                    INSERT INTO prices (symbol, date, {', '.join(columns)})
+                    VALUES ({', '.join('?' * (len(columns) + 2))})
+                    ON CONFLICT(symbol, date) DO UPDATE SET
+                    {', '.join(f'{col} = excluded.{col}' for col in columns)}
+                '''
+                rows = [
+                    (symbol, date, *(None if pd.isna(value) else value for value in values))
+                    for date, values in zip(touched.index, touched.itertuples(index=False, name=None))
+                ]
+                for i in range(0, len(rows), UPSERT_BATCH_SIZE):
+                    conn.executemany(upsert_sql, rows[i:i + UPSERT_BATCH_SIZE])
+                if rows:
+                    self._refresh_monthly_bars(conn, symbol, touched.index[0], touched.index[-1])
+                    # 只追加新交易日时状态可以增量更新；修改了状态已包含的数据则需要重建
+                    conn.execute(
+                        "DELETE FROM analytics_state WHERE symbol = ? AND last_date >= ?",
+                        (symbol, touched.index[0])
+                    )
+                if pe is not None:
+                    self._save_valuation(conn, symbol, pe)
+                # 元数据与数据在同一事务中提交，中途失败时两者一起回滚
+                self._update_metadata(
+                    conn, symbol,
+                    touched.index[0][:10] if rows else None,
+                    touched.index[-1][:10] if rows else None,
+                    inserted
+                )
+
+        # 元数据的最后更新时间每次都会变化，缓存总是需要失效
+        self.invalidate_cache()
+        if not touched.empty:
+            self.invalidate_columnar(symbol)
+
+        return {'inserted': inserted, 'updated': len(touched) - inserted}
+
+    def _columnar_path(self, symbol):
+        return os.path.join(self.columnar_dir, f"{quote(symbol, safe='')}.arrow")
+
+    def invalidate_columnar(self, symbol):
+        """删除某个标的已过期的列式镜像，下次按列式读取时再从 SQLite 重新导出
+
+        按年分块下载时每块都会调用 save_data，镜像只在下载完成后第一次读取时导出一次
+        """
+        with _columnar_lock:
+            try:
+                os.remove(self._columnar_path(symbol))
+            except FileNotFoundError:
+                pass
+
+    def write_columnar(self, symbol):
+        """从 SQLite 导出某个标的的全部日线，原子地替换其列式镜像文件；返回是否导出
+
+        文件统一使用 COLUMNAR_SCHEMA；没有数据的标的不导出。
+        每次导出写入唯一的临时文件，并发导出同一标的时不会互相覆盖
+        """
+        if pa is None:
+            return False
+        Path(self.columnar_dir).mkdir(exist_ok=True)
+        with _columnar_lock:
+            df = self._read_data(symbol, None, None, PRICE_TABLE_COLUMNS, False)
+            if df.empty:
+                return False
+            table = pa.Table.from_pandas(df.reset_index(), schema=COLUMNAR_SCHEMA, preserve_index=False)
+
+            with tempfile.NamedTemporaryFile(dir=self.columnar_dir, suffix='.tmp', delete=False) as sink:
+                try:
+                    with pa.ipc.new_file(sink, COLUMNAR_SCHEMA) as writer:
+                        writer.write_table(table)
+                except BaseException:
+                    sink.close()
+                    os.remove(sink.name)
+                    raise
+            os.replace(sink.name, self._columnar_path(symbol))
+            return True
+
+    def load_data(self, start_date=None, end_date=None, columns=None, symbols=None, wide=False, engine="sqlite"):
+        """从数据库加载数据
+
+        symbols: 单个标的代码时返回以日期为索引的数据（默认为 DEFAULT_SYMBOL）；
+                 传入列表时在一次查询中读取所有标的，返回以 (symbol, date) 为索引的长表，
+                 wide=True 时返回以日期为索引、标的为列的宽表
+        start_date/end_date: 日期范围（包含两端），可以只给其中一端
+        columns: 需要的数据列，默认读取全部列；只读取需要的列可以显著减少读取的数据量
+        engine: "sqlite" 直接查询数据库；"columnar" 以内存映射方式读取列式镜像，
+                批量分析时更快，镜像缺失或因写入失效时先从 SQLite 生成，没有 pyarrow 时回退到 SQLite
+
+        结果按 (数据版本, 标的, 日期范围, 列) 缓存在进程内，所有会话共享；
+        返回的是缓存的副本，调用方可以自由修改。
+        """
+        if columns is not None:
+            unknown = set(columns) - set(PRICE_COLUMNS)
+            if unknown:
+                raise ValueError(f"未知的数据列: {sorted(unknown)}")
+            columns = tuple(columns)
+        if symbols is None:
+            symbols = DEFAULT_SYMBOL
+        if not isinstance(symbols, str):
+            symbols = tuple(symbols)
+
+        with span('load_data', engine=engine) as record:
+            key = (self.db_path, self.data_version(), symbols, start_date, end_date, columns, wide)
+            df = frame_cache.get(key)
+            record['cache'] = 'miss' if df is None else 'hit'
+            if df is None:
+                if engine == "columnar" and pa is not None:
+                    df = self._read_columnar(symbols, start_date, end_date, columns, wide)
+                else:
+                    df = self._read_data(symbols, start_date, end_date, columns, wide)
+                frame_cache.put(key, df)
+            record['rows'] = len(df)
+            return df.copy()
+
+    def load_monthly_bars(self, symbol=DEFAULT_SYMBOL, start_month=None, end_month=None):
+        """加载某个标的的月线，索引为月末日期（与 resample('M') 的标签一致）
+
+        start_month/end_month: 'YYYY-MM'，包含两端
+        """
+        with span('load_monthly_bars') as record:
+            key = (self.db_path, self.data_version(), 'monthly_bars', symbol, start_month, end_month)
+            bars = frame_cache.get(key)
+            record['cache'] = 'miss' if bars is None else 'hit'
+            if bars is None:
+                query = f"SELECT month, {', '.join(MONTHLY_BAR_COLUMNS)} FROM monthly_bars WHERE symbol = ?"
+                params = [symbol]
+                if start_month:
+                    query += " AND month >= ?"
+                    params.append(start_month)
+                if end_month:
+                    query += " AND month <= ?"
+                    params.append(end_month)
+                query += " ORDER BY month"
+
+                with self.pool.reader() as conn:
+                    bars = pd.read_sql_query(query, conn, params=params)
+
+                bars.index = pd.PeriodIndex(bars.pop('month'), freq='M').to_timestamp(how='end').normalize()
+                bars.index.name = 'date'
+                bars['month_return'] = bars['month_return'].astype(float)
+                frame_cache.put(key, bars)
+            record['rows'] = len(bars)
+            return bars.copy()
+
+    def _read_data(self, symbols, start_date, end_date, columns, wide):
+        """从SQLite读取数据（不经过缓存）"""
+        symbol_list = [symbols] if isinstance(symbols, str) else list(symbols)
+        value_columns = list(columns or PRICE_COLUMNS)
+        table_columns = [col for col in value_columns if col in PRICE_TABLE_COLUMNS]
+
+        query = (
+            f"SELECT {', '.join(['symbol', 'date'] + table_columns)} FROM prices "
+            f"WHERE symbol IN ({', '.join('?' * len(symbol_list))})"
+        )
+        params = list(symbol_list)
+        # 日期范围可以只给一端，参数化后由 SQLite 在索引上做范围查找
+        if start_date:
+            query += " AND date >= ?"
+            params.append(pd.Timestamp(start_date).strftime(DATE_FORMAT))
+        if end_date:
+            query += " AND date <= ?"
+            params.append(pd.Timestamp(end_date).strftime(DATE_FORMAT))
+        query += " ORDER BY symbol, date"  # 确保数据按日期排序
         
         # 读取数据
-        df = pd.read_sql_query(query, conn)
-        conn.close()
+        with self.pool.reader() as conn:
+            df = pd.read_sql_query(query, conn, params=params)
         
         # 将日期列转换为UTC时间并设置为索引
         df['date'] = pd.to_datetime(df['date'], utc=True).dt.tz_localize(None)
-        df.set_index('date', inplace=True)
-        
-        return df
\ No newline at end of file
+
+        if 'pe_ratio' in value_columns:
+            df = self._attach_valuation(df, symbol_list, end_date)
+        return self._shape_frame(df[['symbol', 'date'] + value_columns], symbols, value_columns, wide)
+
+    def _attach_valuation(self, df, symbol_list, end_date):
+        """按 (标的, 日期) 向前匹配估值观测，为每个交易日加上当日及之前最近一次的市盈率"""
+        # 估值表是稀疏的，读取 end_date 之前的全部观测，以便匹配 start_date 之前的最后一次观测
+        query = f"SELECT symbol, date, pe AS pe_ratio FROM valuation WHERE symbol IN ({', '.join('?' * len(symbol_list))})"
+        params = list(symbol_list)
+        if end_date:
+            query += " AND date <= ?"
+            params.append(pd.Timestamp(end_date).strftime(DATE_FORMAT))
+        with self.pool.reader() as conn:
+            valuation = pd.read_sql_query(query + " ORDER BY date", conn, params=params)
+        valuation['date'] = pd.to_datetime(valuation['date'])
+        valuation['pe_ratio'] = valuation['pe_ratio'].astype(float)
+
+        # merge_asof 要求按匹配键整体有序，合并后恢复 (symbol, date) 的顺序
+        order = df['date'].argsort(kind='stable')
+        merged = pd.merge_asof(
+            df.iloc[order].reset_index(drop=True),
+            valuation,
+            on='date',
+            by='symbol',
+            direction='backward'
+        )
+        merged.index = order
+        return merged.sort_index()
+
+    def _read_columnar(self, symbols, start_date, end_date, columns, wide):
+        """以内存映射方式读取列式镜像（不经过缓存）
+
+        按日期二分查找切片只是零拷贝的视图，所有标的拼接后只在 to_pandas 时复制一次
+        """
+        symbol_list = [symbols] if isinstance(symbols, str) else list(symbols)
+        value_columns = list(columns or PRICE_COLUMNS)
+        table_columns = [col for col in value_columns if col in PRICE_TABLE_COLUMNS]
+
+        # 没有数据的标的不在结果中，与 SQLite 查询相同；空表保证全部标的都没有数据时也能拼接
+        tables = [COLUMNAR_SCHEMA.empty_table().select(['date'] + table_columns)
+                  .append_column('symbol', pa.array([], pa.string()))]
+        for symbol in symbol_list:
+            try:
+                source = pa.memory_map(self._columnar_path(symbol), 'r')
+            except FileNotFoundError:
+                if not self.write_columnar(symbol):
+                    continue
+                source = pa.memory_map(self._columnar_path(symbol), 'r')
+            with source:
+                # 旧版本按各自推断的类型写入的文件，读取时统一转换为 COLUMNAR_SCHEMA
+                table = pa.ipc.open_file(source).read_all().cast(COLUMNAR_SCHEMA).select(['date'] + table_columns)
+
+            if start_date or end_date:
+                dates = table.column('date').to_numpy()
+                lo = np.searchsorted(dates, np.datetime64(pd.Timestamp(start_date)), side='left') if start_date else 0
+                hi = np.searchsorted(dates, np.datetime64(pd.Timestamp(end_date)), side='right') if end_date else len(dates)
+                table = table.slice(lo, hi - lo)
+            tables.append(table.append_column('symbol', pa.array([symbol] * table.num_rows, pa.string())))
+
+        df = pa.concat_tables(tables).to_pandas()[['symbol', 'date'] + table_columns]
+        if 'pe_ratio' in value_columns:
+            df = self._attach_valuation(df, symbol_list, end_date)
+        return self._shape_frame(df[['symbol', 'date'] + value_columns], symbols, value_columns, wide)
+
+    def _shape_frame(self, df, symbols, value_columns, wide):
+        """把 (symbol, date, 数据列) 的长表整理为 load_data 约定的返回格式"""
+        if isinstance(symbols, str):
+            return df.drop(columns='symbol').set_index('date')
+        if wide:
+            values = value_columns[0] if len(value_columns) == 1 else value_columns
+            return df.pivot(index='date', columns='symbol', values=values)
+        return df.set_index(['symbol', 'date'])
@@ -0,0 +1,139 @@
+import numpy as np
+import pandas as pd
+
+from module.db_manager import FrameCache
+from module.instrumentation import span
+
+# 回撤分析结果的进程级缓存，键由调用方提供（应包含数据版本）
+drawdown_cache = FrameCache(maxsize=64)
+
+
+def _forward_fill(closes):
+    """收盘价矩阵 (T, N) 沿时间轴沿用上一个有效值（停牌、其他标的的交易日）
+
+    返回 (填充后的矩阵, 截至每一行的最后一个有效行号, 该行及之后是否仍有有效值)；
+    上市前的行仍为 NaN，最后一个有效值之后沿用最后的收盘价
+    """
+    n_rows = closes.shape[0]
+    valid = ~np.isnan(closes)
+    last_valid = np.maximum.accumulate(np.where(valid, np.arange(n_rows)[:, None], 0), axis=0)
+    filled = np.take_along_axis(closes, last_valid, axis=0)
+    listed = np.flip(np.logical_or.accumulate(np.flip(valid, axis=0), axis=0), axis=0)
+    return filled, last_valid, listed
+
+
+def _drawdown(filled):
+    """每一天相对此前最高收盘价的回撤(%)，在高点为 0，其余为负数；fmax 跳过上市前的 NaN"""
+    peak = np.fmax.accumulate(filled, axis=0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return (filled / peak - 1) * 100
+
+
+def _episodes(drawdown):
+    """对水下状态做行程编码，得到所有标的的回撤区间
+
+    每个标的（列）后补一个不在水下的位置再按列展开，相邻标的的区间不会连在一起，
+    一次 diff 即可找出所有区间的起止，区间内的最深回撤用 minimum.reduceat 计算。
+    返回 (列号, 开始行, 结束行, 最深回撤所在行, 最深回撤(%))，均为一维数组；
+    结束行为回到前高的行，等于 T 表示尚未恢复
+    """
+    n_rows, n_cols = drawdown.shape
+    under = np.zeros((n_cols, n_rows + 1), dtype=np.int8)
+    under[:, :n_rows] = (drawdown < 0).T
+    values = np.zeros((n_cols, n_rows + 1))
+    values[:, :n_rows] = np.where(under[:, :n_rows], drawdown.T, 0.0)
+    under = under.ravel()
+    values = values.ravel()
+
+    change = np.diff(under, prepend=0)
+    starts = np.flatnonzero(change == 1)
+    ends = np.flatnonzero(change == -1)
+    if starts.size == 0:
+        empty = np.array([], dtype=np.int64)
+        return empty, empty, empty, empty, np.array([], dtype=float)
+
+    depth = np.minimum.reduceat(values, np.column_stack([starts, ends]).ravel())[::2]
+    # 每个区间内第一次达到最深回撤的位置
+    run = np.cumsum(change == 1) - 1
+    hit = np.flatnonzero(under.astype(bool) & (values == depth[np.maximum(run, 0)]))
+    _, first = np.unique(run[hit], return_index=True)
+    troughs = hit[first]
+
+    width = n_rows + 1
+    return starts // width, starts % width, ends % width, troughs % width, depth
+
+
+def drawdown_analysis(closes):
+    """多个标的的回撤分析，所有标的一次向量化计算
+
+    closes: 收盘价宽表，索引为日期、列为标的（DBManager.load_data(symbols=[...], columns=['close'], wide=True)）
+    缺失的收盘价沿用上一个有效值。天数均为自然日。
+    返回 {
+        'underwater': 日期 × 标的 水下曲线(%),
+        'episodes': 每次回撤一行（峰值、谷底、恢复日期，最大回撤、下跌/恢复/持续天数），未恢复的恢复日期为 NaT,
+        'summary': 每个标的一行（最大回撤、最长持续天数、平均恢复天数、当前回撤等）
+    }
+    """
+    closes = closes.sort_index()
+    dates = closes.index
+    symbols = np.asarray(closes.columns)
+    values = closes.to_numpy(dtype=float)
+    n_rows = len(dates)
+
+    filled, last_valid, listed = _forward_fill(values)
+    drawdown = _drawdown(filled)
+    columns, starts, ends, troughs, depth = _episodes(drawdown)
+    drawdown[~listed] = np.nan
+
+    # 最后一个有效收盘价所在的行；没有数据的标的为 -1
+    last_row = np.where(listed.any(axis=0), n_rows - 1 - np.argmax(np.flip(listed, axis=0), axis=0), -1)
+    recovered = ends < n_rows
+    # 峰值为开始行之前最后一个有效收盘价的日期
+    peak_dates = dates[last_valid[starts - 1, columns]]
+    trough_dates = dates[last_valid[troughs, columns]]
+    recovery_dates = pd.DatetimeIndex(np.where(
+        recovered, dates[np.minimum(ends, n_rows - 1)].values, np.datetime64('NaT')
+    ))
+    until = recovery_dates.where(recovered, dates[last_row[columns]])
+
+    episodes = pd.DataFrame({
+        '标的': symbols[columns],
+        '峰值日期': peak_dates,
+        '谷底日期': trough_dates,
+        '恢复日期': recovery_dates,
+        '最大回撤(%)': depth,
+        '下跌天数': (trough_dates - peak_dates).days,
+        '恢复天数': np.where(recovered, (recovery_dates - trough_dates).days, np.nan),
+        '持续天数': (until - peak_dates).days,
+    })
+
+    listed_days = listed.sum(axis=0) - np.argmax(~np.isnan(values), axis=0)
+    masked = np.where(np.isnan(drawdown), np.inf, drawdown)
+    has_data = last_row >= 0
+    grouped = episodes.groupby('标的', sort=False)
+    summary = pd.DataFrame({
+        '最大回撤(%)': np.where(has_data, masked.min(axis=0), np.nan),
+        '最大回撤谷底': pd.DatetimeIndex(np.where(has_data, dates[masked.argmin(axis=0)].values, np.datetime64('NaT'))),
+        '当前回撤(%)': np.where(has_data, drawdown[np.maximum(last_row, 0), np.arange(len(symbols))], np.nan),
+        '回撤次数': np.bincount(columns, minlength=len(symbols)),
+        '最长持续天数': grouped['持续天数'].max().reindex(symbols).to_numpy(),
+        '平均恢复天数': grouped['恢复天数'].mean().reindex(symbols).to_numpy(),
+        '水下时间占比(%)': (drawdown < 0).sum(axis=0) / np.maximum(listed_days, 1) * 100,
+    }, index=pd.Index(symbols, name='标的'))
+
+    return {
+        'underwater': pd.DataFrame(drawdown, index=dates, columns=closes.columns),
+        'episodes': episodes,
+        'summary': summary,
+    }
+
+
+def cached_drawdowns(key, closes):
+    """带缓存的 drawdown_analysis；key 相同（同一数据版本、同一组标的）时直接返回缓存结果"""
+    with span('drawdown', symbols=closes.shape[1]) as record:
+        result = drawdown_cache.get(key)
+        record['cache'] = 'miss' if result is None else 'hit'
+        if result is None:
+            result = drawdown_analysis(closes)
+            drawdown_cache.put(key, result)
+        return result
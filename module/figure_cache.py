@@ -0,0 +1,33 @@
+import json
+
+import plotly.graph_objects as go
+import streamlit as st
+
+from module.db_manager import FrameCache
+from module.instrumentation import span
+
+# 序列化后的图表(JSON)的进程级缓存，键由调用方提供：(数据库路径, 数据版本, 页面, 参数...)
+figure_cache = FrameCache(maxsize=128)
+
+
+def cached_figure_json(key, build, **attrs):
+    """带缓存的图表 JSON；未命中时调用 build() 构建图表并序列化一次，attrs 记入 figure 计时区间"""
+    with span('figure', **attrs) as record:
+        spec = figure_cache.get(key)
+        record['cache'] = 'miss' if spec is None else 'hit'
+        if spec is None:
+            spec = build().to_json()
+            figure_cache.put(key, spec)
+        return spec
+
+
+def show_figure(key, build, **attrs):
+    """在页面上显示图表，重复查看、滑块回到之前的取值时不再构建和序列化图表
+
+    key: (数据库路径, 数据版本, 页面, 参数...)；build: 无参数、返回 Plotly Figure 的函数。
+    缓存的 JSON 在首次构建时已经过校验，这里不经校验直接还原为 Figure，
+    st.plotly_chart 只需把它重新编码一次
+    """
+    spec = cached_figure_json(key, build, **attrs)
+    with span('plotly_chart'):
+        st.plotly_chart(go.Figure(json.loads(spec), _validate=False), use_container_width=True)
@@ -0,0 +1,379 @@
+import json
+import math
+
+import numpy as np
+import pandas as pd
+
+from module.analytics import MONTH_NAMES
+from module.cycle_engine import THRESHOLD_GRID, sweep_state
+from module.db_manager import DATE_FORMAT, FrameCache
+from module.instrumentation import span
+from module.rolling_stats import ROLLING_WINDOWS, rolling_grid
+
+# 持久化状态的格式版本；累加器的定义变化时递增，旧状态会被丢弃并从头重建
+STATE_VERSION = 1
+
+# 增量分析状态的进程级缓存，键为 (数据库, 数据版本, 标的)
+state_cache = FrameCache(maxsize=256)
+
+
+class MonthAccumulator:
+    """某个日历月份历年月度收益率的累加器
+
+    均值与 pandas groupby mean 相同使用 Kahan 补偿求和，方差与 groupby std 相同使用 Welford 算法，
+    按时间顺序逐个加入时结果与 analyze_monthly_patterns 完全一致
+    """
+
+    __slots__ = ('count', 'total', 'compensation', 'mean', 'm2', 'max', 'min')
+
+    def __init__(self, count=0, total=0.0, compensation=0.0, mean=0.0, m2=0.0, max=math.nan, min=math.nan):
+        self.count = count
+        self.total = total
+        self.compensation = compensation
+        self.mean = mean
+        self.m2 = m2
+        self.max = max
+        self.min = min
+
+    def add(self, value):
+        if math.isnan(value):
+            return
+        self.count += 1
+        y = value - self.compensation
+        t = self.total + y
+        self.compensation = t - self.total - y
+        if math.isnan(self.compensation):
+            self.compensation = 0.0
+        self.total = t
+        old_mean = self.mean
+        self.mean += (value - old_mean) / self.count
+        self.m2 += (value - self.mean) * (value - old_mean)
+        self.max = value if not self.max >= value else self.max
+        self.min = value if not self.min <= value else self.min
+
+    def copy(self):
+        return MonthAccumulator(*self.to_list())
+
+    def to_list(self):
+        return [self.count, self.total, self.compensation, self.mean, self.m2, self.max, self.min]
+
+    def stats(self):
+        """(平均收益率, 最大涨幅, 最大跌幅, 标准差, 样本数)，与 analyze_monthly_patterns 的列对应"""
+        if self.count == 0:
+            return math.nan, math.nan, math.nan, math.nan, 0
+        std = math.sqrt(self.m2 / (self.count - 1)) if self.count > 1 else math.nan
+        return self.total / self.count, self.max, self.min, std, self.count
+
+
+class CycleState:
+    """整个阈值网格的牛熊市周期状态机，与 detect_cycles 逐日等价
+
+    每个阈值只需保存当前阶段的方向、周期起点和阶段内极值（牛市为最高价、熊市为最低价），
+    已结束的周期只追加不再改动；新增 k 个交易日的代价为 O(k × 阈值数)。
+    从头构建时直接由 sweep_state 一次扫描得到，逐日更新只用于追加新交易日。
+    已结束的周期单独持久化（DBManager.save_analytics_state 的 cycles），增量更新时不需要读入，
+    closed 中只有本次新结束的周期，offset 为之前已持久化的个数；load_closed 读入全部历史后才能查询周期划分
+    """
+
+    def __init__(self, thresholds=THRESHOLD_GRID):
+        self.thresholds = tuple(round(float(threshold), 1) for threshold in thresholds)
+        size = len(self.thresholds)
+        self.bull = np.zeros(size, dtype=bool)
+        self.start = np.zeros(size, dtype=np.int64)
+        self.extreme = np.full(size, np.nan)
+        self.extreme_idx = np.zeros(size, dtype=np.int64)
+        # 每个阈值已结束的周期 [(is_bull, start_idx, end_idx), ...]
+        self.closed = [[] for _ in range(size)]
+        self.offset = np.zeros(size, dtype=np.int64)
+        self.n_bars = 0
+
+    def update(self, close):
+        close = np.asarray(close, dtype=float)
+        if self.n_bars == 0 and close.size:
+            self._seed(close)
+            return
+
+        threshold = np.asarray(self.thresholds)
+        bull_factor = 1 - threshold / 100
+        bear_factor = 1 + threshold / 100
+        for value in close:
+            i = self.n_bars
+            self.n_bars += 1
+
+            # 阶段内极值包含当天的价格（fmax/fmin 忽略 NaN）
+            running = np.where(self.bull, np.fmax(self.extreme, value), np.fmin(self.extreme, value))
+            hit = np.where(self.bull, value < running * bull_factor, value > running * bear_factor)
+            # 严格创新高/新低才更新，极值的位置为第一次出现的位置
+            improved = ~hit & np.where(self.bull, value > self.extreme, value < self.extreme)
+            self.extreme[improved] = value
+            self.extreme_idx[improved] = i
+
+            for j in np.flatnonzero(hit):
+                # 新周期从上一阶段的极值开始，新阶段的极值从触发当天开始计算
+                self.closed[j].append((bool(self.bull[j]), int(self.start[j]), int(self.extreme_idx[j])))
+                self.start[j] = self.extreme_idx[j]
+            self.bull[hit] = ~self.bull[hit]
+            self.extreme[hit] = value
+            self.extreme_idx[hit] = i
+
+    def _seed(self, close):
+        """从第一个交易日开始的全部收盘价一次构建状态，与逐日 update 的结果相同"""
+        closed, (bull, start, extreme, extreme_idx) = sweep_state(close, self.thresholds)
+        self.closed = [
+            list(zip(is_bull.tolist(), starts.tolist(), ends.tolist())) for is_bull, starts, ends in closed
+        ]
+        self.bull, self.start, self.extreme, self.extreme_idx = bull, start, extreme, extreme_idx
+        self.n_bars = len(close)
+
+    def closed_rows(self):
+        """内存中已结束的周期，格式为 (阈值, 序号, is_bull, start_idx, end_idx)，用于持久化"""
+        return [
+            (threshold, int(self.offset[j]) + seq, *cycle)
+            for j, threshold in enumerate(self.thresholds)
+            for seq, cycle in enumerate(self.closed[j])
+        ]
+
+    def load_closed(self, rows):
+        """读入全部已持久化的周期（DBManager.load_analytics_snapshot），替换内存中的部分"""
+        index = {threshold: j for j, threshold in enumerate(self.thresholds)}
+        self.closed = [[] for _ in self.thresholds]
+        for threshold, _, is_bull, start, end in rows:
+            self.closed[index[threshold]].append((bool(is_bull), int(start), int(end)))
+        self.offset[:] = 0
+
+    def cycles(self, threshold):
+        """某个阈值下的周期划分 (is_bull, start_idx, end_idx)，与 detect_cycles 的返回值相同"""
+        if self.offset.any():
+            raise ValueError("已结束的周期尚未读入，请先调用 load_closed")
+        j = self.thresholds.index(round(float(threshold), 1))
+        records = self.closed[j] + [(bool(self.bull[j]), int(self.start[j]), int(self.extreme_idx[j]))]
+        is_bull, starts, ends = zip(*records)
+        return (
+            np.array(is_bull, dtype=bool),
+            np.array(starts, dtype=np.int64),
+            np.array(ends, dtype=np.int64),
+        )
+
+    def sweep(self):
+        """与 sweep_cycles 相同格式的 {阈值: (is_bull, start_idx, end_idx)}"""
+        return {threshold: self.cycles(threshold) for threshold in self.thresholds}
+
+    def to_dict(self):
+        return {
+            'thresholds': list(self.thresholds),
+            'bull': self.bull.tolist(),
+            'start': self.start.tolist(),
+            'extreme': self.extreme.tolist(),
+            'extreme_idx': self.extreme_idx.tolist(),
+            'n_closed': (self.offset + [len(cycles) for cycles in self.closed]).tolist(),
+            'n_bars': self.n_bars,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        state = cls(data['thresholds'])
+        state.bull = np.array(data['bull'], dtype=bool)
+        state.start = np.array(data['start'], dtype=np.int64)
+        state.extreme = np.array(data['extreme'], dtype=float)
+        state.extreme_idx = np.array(data['extreme_idx'], dtype=np.int64)
+        state.offset = np.array(data['n_closed'], dtype=np.int64)
+        state.n_bars = data['n_bars']
+        return state
+
+
+class AnalyticsState:
+    """可增量更新的单标的分析状态
+
+    - 各日历月份月度收益率的累加器（analyze_monthly_patterns）
+    - 最近 max(ROLLING_WINDOWS) 个月的收益率，用于计算各窗口当前的滚动指标
+    - 整个阈值网格的牛熊市周期状态机（identify_market_cycles / sweep_cycles）
+    当前月份尚未结束，它的收益率随每个新交易日变化，不计入累加器，只在查询时临时加入。
+    除已结束的周期外状态的大小固定，新增 k 个交易日的代价（包括读写持久化状态）为 O(k)，与历史长度无关；
+    从头逐日加入全部历史得到的状态与增量更新的状态完全相同。
+    """
+
+    def __init__(self, thresholds=THRESHOLD_GRID, windows=ROLLING_WINDOWS):
+        self.windows = tuple(windows)
+        self.last_date = None
+        # 当前（未结束）月份、其最后一个收盘价，以及上一个月的收盘价
+        self.month = None
+        self.month_close = math.nan
+        self.previous_close = math.nan
+        self.months = [MonthAccumulator() for _ in range(12)]
+        # 已结束月份的收益率，只保留最近 max(windows) 个
+        self.recent_returns = []
+        self.cycles = CycleState(thresholds)
+
+    def update(self, close):
+        """按日期顺序加入新的交易日收盘价；close 为以日期为索引的 Series，日期必须晚于已有数据"""
+        if close.empty:
+            return
+        if self.last_date is not None and close.index[0] <= pd.Timestamp(self.last_date):
+            raise ValueError(f"新数据的日期必须晚于 {self.last_date}")
+
+        months = close.index.year * 12 + close.index.month - 1
+        for month, value in zip(months, close.to_numpy(dtype=float)):
+            if self.month is None:
+                self.month = month
+            while month > self.month:
+                self._close_month()
+            if not math.isnan(value):
+                self.month_close = value
+        self.cycles.update(close.to_numpy(dtype=float))
+        self.last_date = close.index[-1].strftime(DATE_FORMAT)
+
+    def _month_return(self):
+        """当前月份相对上月收盘价的收益率(%)，与 resample('M').last().pct_change() * 100 相同"""
+        return (self.month_close / self.previous_close - 1) * 100
+
+    def _close_month(self):
+        """当前月份结束：收益率计入对应日历月份的累加器，然后进入下一个月
+
+        没有交易日的月份与 pct_change 的默认行为相同，收盘价沿用上月，收益率为 0
+        """
+        value = self._month_return()
+        self.months[self.month % 12].add(value)
+        self.recent_returns.append(value)
+        del self.recent_returns[:-max(self.windows)]
+        self.previous_close = self.month_close
+        self.month += 1
+
+    def monthly_patterns(self):
+        """各月份的平均涨幅统计，与 analyze_monthly_patterns(calculate_monthly_returns(df)) 相同"""
+        months = self.months
+        if self.month is not None:
+            # 当前月份的收益率临时加入，累加器本身不变
+            months = list(months)
+            months[self.month % 12] = months[self.month % 12].copy()
+            months[self.month % 12].add(self._month_return())
+        return pd.DataFrame(
+            [accumulator.stats() for accumulator in months],
+            columns=['平均收益率', '最大涨幅', '最大跌幅', '标准差', '样本数'],
+            index=MONTH_NAMES
+        ).round(2)
+
+    def latest_rolling(self):
+        """各窗口截至当前月份的滚动指标，返回 {指标: 以窗口为索引的 Series}
+
+        与 rolling_stats 最后一行相同（浮点舍入误差以内），只用最近 max(windows) + 1 个月计算
+        """
+        if self.month is None:
+            values = np.array([])
+        else:
+            values = np.array(self.recent_returns + [self._month_return()])
+        if len(values) == 0:
+            return {metric: pd.Series(np.nan, index=list(self.windows)) for metric in ('return', 'volatility', 'sharpe', 'sortino')}
+        grid = rolling_grid(values, self.windows)
+        return {metric: pd.Series(array[:, -1], index=list(self.windows)) for metric, array in grid.items()}
+
+    def to_dict(self):
+        return {
+            'version': STATE_VERSION,
+            'windows': list(self.windows),
+            'last_date': self.last_date,
+            'month': self.month,
+            'month_close': self.month_close,
+            'previous_close': self.previous_close,
+            'months': [accumulator.to_list() for accumulator in self.months],
+            'recent_returns': self.recent_returns,
+            'cycles': self.cycles.to_dict(),
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        state = cls(data['cycles']['thresholds'], data['windows'])
+        state.last_date = data['last_date']
+        state.month = data['month']
+        state.month_close = data['month_close']
+        state.previous_close = data['previous_close']
+        state.months = [MonthAccumulator(*values) for values in data['months']]
+        state.recent_returns = list(data['recent_returns'])
+        state.cycles = CycleState.from_dict(data['cycles'])
+        return state
+
+    def dumps(self):
+        return json.dumps(self.to_dict())
+
+    @classmethod
+    def loads(cls, payload):
+        return cls.from_dict(json.loads(payload))
+
+
+def _parse_state(payload, thresholds, windows):
+    """解析持久化的状态；不存在、版本或参数不同时返回 None"""
+    if payload is None:
+        return None
+    data = json.loads(payload)
+    if (data.get('version') != STATE_VERSION or tuple(data['windows']) != tuple(windows)
+            or tuple(data['cycles']['thresholds']) != tuple(round(float(t), 1) for t in thresholds)):
+        return None
+    return AnalyticsState.from_dict(data)
+
+
+def _new_closes(db_manager, symbol, state):
+    """状态之后的新交易日收盘价；没有状态时为全部历史"""
+    if state.last_date is None:
+        return db_manager.load_data(symbols=symbol, columns=['close'])['close']
+    new = db_manager.load_data(symbols=symbol, start_date=state.last_date, columns=['close'])['close']
+    return new[new.index > pd.Timestamp(state.last_date)]
+
+
+def refresh_state(db_manager, symbol, thresholds=THRESHOLD_GRID, windows=ROLLING_WINDOWS):
+    """把某个标的的分析状态更新到数据库中的最新数据，并写回数据库；在 save_data 之后由下载流程调用
+
+    只读取上次更新之后的新交易日，只写入新结束的周期；没有状态（首次使用，或历史数据被修改后
+    save_data 删除了状态）时从头重建。整个过程持有写连接，避免读取之后 save_data 修改了历史数据、却把旧状态写回。
+    返回的状态没有读入历史周期，不能查询周期划分
+    """
+    with span('analytics_state', symbol=symbol) as record, db_manager.pool.writer():
+        state = _parse_state(db_manager.load_analytics_state(symbol), thresholds, windows)
+        rebuild = state is None
+        if rebuild:
+            state = AnalyticsState(thresholds, windows)
+        new = _new_closes(db_manager, symbol, state)
+        record['mode'] = 'rebuild' if rebuild else 'append'
+        record['rows'] = len(new)
+
+        if not new.empty:
+            state.update(new)
+            db_manager.save_analytics_state(
+                symbol, state.last_date, state.dumps(), state.cycles.closed_rows(), replace=rebuild
+            )
+        return state
+
+
+def refresh_states(db_manager, symbols):
+    """批量写入后更新多个标的的分析状态"""
+    for symbol in symbols:
+        refresh_state(db_manager, symbol)
+
+
+def read_state(db_manager, symbol, thresholds=THRESHOLD_GRID, windows=ROLLING_WINDOWS):
+    """某个标的截至最新数据的分析状态，只读，不写回数据库
+
+    读入持久化的状态和全部已结束的周期，在内存中追加之后的新交易日；
+    没有持久化的状态（如下载流程之外写入的数据）时在内存中从头构建。
+    页面查看不会写数据库，也就不会改变数据版本、使其他缓存失效
+    """
+    with span('analytics_state', symbol=symbol) as record:
+        payload, cycles = db_manager.load_analytics_snapshot(symbol)
+        state = _parse_state(payload, thresholds, windows)
+        record['mode'] = 'append' if state is not None else 'rebuild'
+        if state is None:
+            state = AnalyticsState(thresholds, windows)
+        else:
+            state.cycles.load_closed(cycles)
+        new = _new_closes(db_manager, symbol, state)
+        record['rows'] = len(new)
+        state.update(new)
+        return state
+
+
+def cached_state(db_manager, symbol):
+    """当前数据版本下某个标的的分析状态（read_state）；同一数据版本内直接返回缓存"""
+    key = (db_manager.db_path, db_manager.data_version(), symbol)
+    state = state_cache.get(key)
+    if state is None:
+        state = read_state(db_manager, symbol)
+        state_cache.put(key, state)
+    return state
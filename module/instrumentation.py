@@ -0,0 +1,171 @@
+import json
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+
+# 页面耗时的结构化日志（JSON Lines，每次页面渲染一行），可跨会话汇总分析
+PERF_LOG_PATH = os.environ.get('PERF_LOG_PATH', 'logs/perf.jsonl')
+# 日志超过该大小时轮转为 perf.jsonl.1（只保留一个旧文件），磁盘占用不超过两倍
+PERF_LOG_MAX_BYTES = 8 * 1024 * 1024
+# 调试面板只读取最近的若干条记录
+PERF_LOG_TAIL_RECORDS = 2000
+# 从文件末尾向前读取时每次读取的字节数
+TAIL_BLOCK_BYTES = 64 * 1024
+
+# Streamlit 每个会话在自己的线程中运行脚本，当前页面的记录按线程保存
+_local = threading.local()
+_log_lock = threading.Lock()
+
+
+class PageTrace:
+    """一次页面渲染的耗时记录，由若干个计时区间组成"""
+
+    def __init__(self, page, **context):
+        self.page = page
+        self.context = context
+        self.spans = []
+        self.depth = 0
+        self.started_at = datetime.now()
+        self.t0 = time.perf_counter()
+        self.total_ms = None
+        self.error = None
+
+    def to_record(self):
+        return {
+            'ts': self.started_at.isoformat(timespec='milliseconds'),
+            'page': self.page,
+            **self.context,
+            'total_ms': self.total_ms,
+            'error': self.error,
+            'spans': self.spans,
+        }
+
+    def to_frame(self):
+        """各计时区间的表格，用于调试面板"""
+        # 本模块在导航栏渲染前导入，pandas 只在生成表格时才加载
+        import pandas as pd
+        if not self.spans:
+            return pd.DataFrame(columns=['name', 'ms'])
+        df = pd.DataFrame(self.spans)
+        # 嵌套的区间加缩进，便于看出包含关系
+        df['name'] = ['  ' * depth + name for depth, name in zip(df.pop('depth'), df['name'])]
+        return df
+
+
+def current_trace():
+    """当前线程正在记录的页面，没有则为 None"""
+    return getattr(_local, 'trace', None)
+
+
+@contextmanager
+def span(name, **attrs):
+    """记录一个计时区间
+
+    用法: with span('compute') as s: ...; s['rows'] = len(df)
+    yield 出的字典可在区间内补充行数、缓存命中等属性；没有正在记录的页面时只计时不保存
+    """
+    trace = current_trace()
+    record = {'name': name, **attrs}
+    start = time.perf_counter()
+    if trace is not None:
+        record['depth'] = trace.depth
+        record['start_ms'] = round((start - trace.t0) * 1000, 3)
+        trace.depth += 1
+    try:
+        yield record
+    finally:
+        record['ms'] = round((time.perf_counter() - start) * 1000, 3)
+        if trace is not None:
+            trace.depth -= 1
+            trace.spans.append(record)
+
+
+@contextmanager
+def trace_page(page, log_path=PERF_LOG_PATH, **context):
+    """记录一次页面渲染：期间的所有 span 归入该页面，结束后写入结构化日志
+
+    context 中的字段（如 session、symbol）原样写入日志，用于跨会话聚合
+    """
+    previous = current_trace()
+    trace = PageTrace(page, **context)
+    _local.trace = trace
+    try:
+        yield trace
+    except Exception as e:
+        trace.error = repr(e)
+        raise
+    finally:
+        trace.total_ms = round((time.perf_counter() - trace.t0) * 1000, 3)
+        # 区间按结束顺序追加，改为按开始顺序排列
+        trace.spans.sort(key=lambda s: s['start_ms'])
+        _local.trace = previous
+        if log_path:
+            write_log(trace.to_record(), log_path)
+
+
+def write_log(record, log_path=PERF_LOG_PATH, max_bytes=PERF_LOG_MAX_BYTES):
+    """追加一条 JSON 日志，超过 max_bytes 后轮转；写日志失败不影响页面"""
+    try:
+        directory = os.path.dirname(log_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        line = json.dumps(record, ensure_ascii=False, default=str)
+        with _log_lock:
+            with open(log_path, 'a', encoding='utf-8') as f:
+                f.write(line + '\n')
+                size = f.tell()
+            if size > max_bytes:
+                os.replace(log_path, f"{log_path}.1")
+    except OSError:
+        pass
+
+
+def new_session_id():
+    return uuid.uuid4().hex[:12]
+
+
+def _tail_lines(path, count):
+    """文件的最后 count 行，从末尾按块向前读取，耗时与文件大小无关"""
+    with open(path, 'rb') as f:
+        end = f.seek(0, os.SEEK_END)
+        data = b''
+        position = end
+        # 多读一行：第一行可能不完整
+        while position > 0 and data.count(b'\n') <= count:
+            step = min(TAIL_BLOCK_BYTES, position)
+            position -= step
+            f.seek(position)
+            data = f.read(step) + data
+    lines = data.decode('utf-8', errors='replace').splitlines()
+    if position > 0:
+        lines = lines[1:]
+    return lines[-count:]
+
+
+def load_perf_log(log_path=PERF_LOG_PATH, max_records=PERF_LOG_TAIL_RECORDS):
+    """读取结构化日志中最近的 max_records 条记录，展开为每个计时区间一行的表格"""
+    import pandas as pd
+    if not os.path.exists(log_path):
+        return pd.DataFrame()
+    rows = []
+    for line in _tail_lines(log_path, max_records):
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError:
+            continue
+        spans = record.pop('spans', [])
+        rows.append({**record, 'name': 'total', 'ms': record['total_ms'], 'depth': -1})
+        rows.extend({**record, **s} for s in spans)
+    return pd.DataFrame(rows)
+
+
+def summarize_perf_log(df):
+    """按页面和区间名汇总耗时分位数"""
+    if df.empty:
+        return df
+    return df.groupby(['page', 'name'])['ms'].describe(percentiles=[0.5, 0.95])[
+        ['count', 'mean', '50%', '95%', 'max']
+    ].round(1)
@@ -1,148 +1,59 @@
 import streamlit as st
-import pandas as pd
-import plotly.graph_objects as go
-import numpy as np
-from module.db_manager import DBManager
+from module.db_manager import DBManager, DEFAULT_SYMBOL, symbol_name
+from module.instrumentation import span
+from module.cycle_engine import THRESHOLD_GRID, cycle_sensitivity
+from module.incremental import cached_state
+from module.analytics import cycles_to_records, cycles_table
+from module.drawdown import cached_drawdowns
+from module.charts import plot_market_cycles, plot_underwater
+from module.figure_cache import show_figure
 
-def identify_market_cycles(df, threshold=20):
-    """识别牛熊市周期
-    threshold: 从高点下跌或从低点上涨超过该百分比则认为是新的周期
-    """
-    cycles = []
-    current_cycle = {'type': None, 'start_date': None, 'end_date': None, 'start_price': None, 'end_price': None}
-    high_price = low_price = df['close'].iloc[0]
-    high_date = low_date = df.index[0]
-    
-    for date, row in df.iterrows():
-        price = row['close']
-        
-        if current_cycle['type'] is None:
-            # 初始化第一个周期
-            current_cycle = {
-                'type': 'bull' if price > df['close'].iloc[0] else 'bear',
-                'start_date': df.index[0],
-                'start_price': df['close'].iloc[0]
-            }
-        
-        if current_cycle['type'] == 'bull':
-            if price > high_price:
-                high_price = price
-                high_date = date
-            elif price < high_price * (1 - threshold/100):
-                # 确认熊市开始
-                current_cycle['end_date'] = high_date
-                current_cycle['end_price'] = high_price
-                cycles.append(current_cycle)
-                current_cycle = {
-                    'type': 'bear',
-                    'start_date': high_date,
-                    'start_price': high_price
-                }
-                low_price = price
-                low_date = date
-        else:  # bear market
-            if price < low_price:
-                low_price = price
-                low_date = date
-            elif price > low_price * (1 + threshold/100):
-                # 确认牛市开始
-                current_cycle['end_date'] = low_date
-                current_cycle['end_price'] = low_price
-                cycles.append(current_cycle)
-                current_cycle = {
-                    'type': 'bull',
-                    'start_date': low_date,
-                    'start_price': low_price
-                }
-                high_price = price
-                high_date = date
-    
-    # 添加最后一个未完成的周期
-    if current_cycle['type'] == 'bull':
-        current_cycle['end_date'] = high_date
-        current_cycle['end_price'] = high_price
-    else:
-        current_cycle['end_date'] = low_date
-        current_cycle['end_price'] = low_price
-    cycles.append(current_cycle)
-    
-    return cycles
-
-def plot_market_cycles(df, cycles):
-    """绘制带有牛熊市标记的价格图"""
-    fig = go.Figure()
-    
-    # 添加价格线
-    fig.add_trace(go.Scatter(
-        x=df.index,
-        y=df['close'],
-        mode='lines',
-        name='价格',
-        line=dict(color='white')
-    ))
-    
-    # 添加牛熊市区域
-    for cycle in cycles:
-        color = 'rgba(255,0,0,0.2)' if cycle['type'] == 'bull' else 'rgba(0,255,0,0.2)'
-        fig.add_vrect(
-            x0=cycle['start_date'],
-            x1=cycle['end_date'],
-            fillcolor=color,
-            opacity=0.5,
-            layer="below",
-            line_width=0,
-        )
-    
-    # 更新布局
-    fig.update_layout(
-        title='纳斯达克100指数牛熊市周期',
-        xaxis_title='日期',
-        yaxis_title='价格',
-        height=600,
-        showlegend=True
-    )
-    
-    return fig
+# 回撤分析中列出的最深回撤次数
+TOP_DRAWDOWNS = 10
 
 def show_market_cycle():
     st.title('牛熊市周期分析')
     
     db_manager = DBManager()
-    metadata = db_manager.get_metadata()
+    symbol = st.session_state.get('symbol', DEFAULT_SYMBOL)
+    metadata = db_manager.get_metadata(symbol)
     
     if metadata["total_records"] == 0:
-        st.warning("数据库中没有数据，请先在'下载数据'页面下载数据。")
+        st.warning(f"数据库中没有 {symbol} 的数据，请先在'下载数据'页面下载数据。")
         return
     
-    st.info(f"""当前数据范围: {metadata["start_date"]} 至 {metadata["end_date"]}
+    st.info(f"""{symbol_name(symbol)} 当前数据范围: {metadata["start_date"]} 至 {metadata["end_date"]}
     总记录数: {metadata["total_records"]}""")
     
     # 加载数据
-    df = db_manager.load_data()
+    df = db_manager.load_data(symbols=symbol, columns=['close'])
     
     if not df.empty:
         # 设置牛熊市判断阈值
-        threshold = st.slider(
+        threshold = st.select_slider(
             "设置牛熊市判断阈值(%)",
-            min_value=10,
-            max_value=30,
-            value=20,
+            options=THRESHOLD_GRID,
+            value=20.0,
             help="从高点下跌或从低点上涨超过该百分比则认为是新的周期"
         )
         
-        # 识别牛熊市周期
-        cycles = identify_market_cycles(df, threshold)
+        # 整个阈值网格的周期状态随新交易日增量更新，拖动滑块只需查表
+        with span('compute', rows=len(df), threshold=threshold):
+            close = df['close'].to_numpy(dtype=float)
+            sweep = cached_state(db_manager, symbol).cycles.sweep()
+            cycles = cycles_to_records(df, sweep[threshold])
         
         # 绘制周期图
-        fig = plot_market_cycles(df, cycles)
-        st.plotly_chart(fig, use_container_width=True)
+        show_figure(
+            (db_manager.db_path, db_manager.data_version(), 'market_cycle', symbol, threshold),
+            lambda: plot_market_cycles(df, cycles, symbol),
+            cycles=len(cycles)
+        )
         
         # 显示周期统计
         st.subheader("牛熊市周期统计")
         
-        cycles_df = pd.DataFrame(cycles)
-        cycles_df['持续天数'] = (cycles_df['end_date'] - cycles_df['start_date']).dt.days
-        cycles_df['涨跌幅(%)'] = ((cycles_df['end_price'] - cycles_df['start_price']) / cycles_df['start_price'] * 100).round(2)
+        cycles_df = cycles_table(cycles)
         
         # 分别统计牛熊市
         bull_cycles = cycles_df[cycles_df['type'] == 'bull']
@@ -165,10 +76,52 @@ def show_market_cycle():
             - 平均跌幅: {bear_cycles['涨跌幅(%)'].mean():.2f}%
             """)
         
+        with st.expander("阈值敏感性分析"):
+            st.dataframe(cycle_sensitivity(close, df.index, sweep).round(2))
+        
         # 显示详细周期数据
         st.subheader("周期详细数据")
         display_df = cycles_df.copy()
         display_df['start_date'] = display_df['start_date'].dt.strftime('%Y-%m-%d')
         display_df['end_date'] = display_df['end_date'].dt.strftime('%Y-%m-%d')
         display_df['type'] = display_df['type'].map({'bull': '牛市', 'bear': '熊市'})
-        st.dataframe(display_df) 
\ No newline at end of file
+        st.dataframe(display_df) 
+        
+        show_drawdowns(db_manager, symbol, df)
+
+def show_drawdowns(db_manager, symbol, df):
+    """回撤分析：最大回撤、持续时间、恢复时间和水下曲线"""
+    st.subheader("回撤分析")
+    
+    result = cached_drawdowns((db_manager.db_path, db_manager.data_version(), symbol), df['close'].to_frame(symbol))
+    summary = result['summary'].loc[symbol]
+    episodes = result['episodes'].nsmallest(TOP_DRAWDOWNS, '最大回撤(%)')
+    
+    col1, col2 = st.columns(2)
+    with col1:
+        st.info(f"""
+        📉 回撤统计：
+        - 最大回撤: {summary['最大回撤(%)']:.2f}%（谷底 {summary['最大回撤谷底']:%Y-%m-%d}）
+        - 当前回撤: {summary['当前回撤(%)']:.2f}%
+        - 回撤次数: {summary['回撤次数']}
+        """)
+    
+    with col2:
+        st.info(f"""
+        ⏱️ 持续时间：
+        - 最长持续天数: {summary['最长持续天数']:.0f}
+        - 平均恢复天数: {summary['平均恢复天数']:.0f}
+        - 水下时间占比: {summary['水下时间占比(%)']:.2f}%
+        """)
+    
+    show_figure(
+        (db_manager.db_path, db_manager.data_version(), 'drawdown', symbol),
+        lambda: plot_underwater(result['underwater'][symbol], episodes, symbol),
+        rows=len(df)
+    )
+    
+    st.markdown(f"**最深的 {TOP_DRAWDOWNS} 次回撤**")
+    display_df = episodes.drop(columns='标的').reset_index(drop=True)
+    for column in ['峰值日期', '谷底日期', '恢复日期']:
+        display_df[column] = display_df[column].dt.strftime('%Y-%m-%d').fillna('未恢复')
+    st.dataframe(display_df.round(2))
@@ -1,121 +1,50 @@
 import streamlit as st
-import pandas as pd
-import plotly.express as px
-import plotly.graph_objects as go
-from datetime import datetime
-from module.db_manager import DBManager
-
-def calculate_monthly_returns(df):
-    """计算月度收益率"""
-    monthly_returns = df['close'].resample('M').last().pct_change() * 100
-    return monthly_returns
-
-def analyze_monthly_patterns(monthly_returns):
-    """分析每个月的平均涨幅"""
-    # 为每个收益率添加月份信息
-    monthly_returns.index = pd.to_datetime(monthly_returns.index)
-    monthly_data = pd.DataFrame({
-        'month': monthly_returns.index.month,
-        'returns': monthly_returns.values
-    })
-    
-    # 计算每个月的平均收益率
-    monthly_stats = monthly_data.groupby('month')['returns'].agg([
-        ('平均收益率', 'mean'),
-        ('最大涨幅', 'max'),
-        ('最大跌幅', 'min'),
-        ('标准差', 'std'),
-        ('样本数', 'count')
-    ]).round(2)
-    
-    # 添加月份名称
-    month_names = ['一月', '二月', '三月', '四月', '五月', '六月',
-                   '七月', '八月', '九月', '十月', '十一月', '十二月']
-    monthly_stats.index = month_names
-    
-    return monthly_stats
-
-def plot_monthly_patterns(monthly_stats):
-    """绘制月度模式图表"""
-    # 计算年化平均收益率
-    annual_return = (1 + monthly_stats['平均收益率'].mean() / 100) ** 12 - 1
-    annual_return_percentage = annual_return * 100
-    
-    # 计算月度平均收益率
-    monthly_avg = monthly_stats['平均收益率'].mean()
-    
-    # 创建柱状图
-    fig = go.Figure()
-    
-    # 添加柱状图
-    fig.add_trace(go.Bar(
-        x=monthly_stats.index,
-        y=monthly_stats['平均收益率'],
-        name='月度收益率',
-        text=monthly_stats['平均收益率'].apply(lambda x: f'{x:.2f}%'),
-        textposition='auto',
-    ))
-    
-    # 添加月度平均线
-    fig.add_trace(go.Scatter(
-        x=monthly_stats.index,
-        y=[monthly_avg] * len(monthly_stats),
-        mode='lines',
-        line=dict(dash='dash', color='yellow', width=2),
-        name=f'月度平均: {monthly_avg:.2f}%'
-    ))
-    
-    # 更新布局
-    fig.update_layout(
-        title=f'纳斯达克100指数月度平均收益率(%) (年化收益率: {annual_return_percentage:.2f}%)',
-        xaxis_title='月份',
-        yaxis_title='收益率(%)',
-        height=600,
-        showlegend=True,
-        barmode='relative',
-        legend=dict(
-            yanchor="top",
-            y=0.99,
-            xanchor="left",
-            x=0.01
-        )
-    )
-    
-    # 设置正负值的颜色
-    fig.update_traces(
-        marker_color=['red' if x > 0 else 'green' for x in monthly_stats['平均收益率']],
-        selector=dict(type='bar')
-    )
-    
-    return fig
+from module.db_manager import DBManager, DEFAULT_SYMBOL, symbol_name
+from module.instrumentation import span
+from module.charts import plot_monthly_patterns, plot_seasonality_heatmap
+from module.figure_cache import show_figure
+from module.cross_section import cached_cross_section
+from module.incremental import cached_state
+from module.significance import BLOCK_LENGTH, CONFIDENCE, N_RESAMPLES, cached_significance
 
 def show_monthly_analysis():
     st.title('月度涨幅分析')
     
     db_manager = DBManager()
-    metadata = db_manager.get_metadata()
+    symbol = st.session_state.get('symbol', DEFAULT_SYMBOL)
+    metadata = db_manager.get_metadata(symbol)
     
     if metadata["total_records"] == 0:
-        st.warning("数据库中没有数据，请先在'下载数据'页面下载数据。")
+        st.warning(f"数据库中没有 {symbol} 的数据，请先在'下载数据'页面下载数据。")
         return
     
-    st.info(f"""当前数据范围: {metadata["start_date"]} 至 {metadata["end_date"]}
+    st.info(f"""{symbol_name(symbol)} 当前数据范围: {metadata["start_date"]} 至 {metadata["end_date"]}
     总记录数: {metadata["total_records"]}""")
     
     # 直接加载并分析数据
     with st.spinner('正在分析数据...'):
-        df = db_manager.load_data()
+        # 月线在写入日线时已预先聚合，直接读取月度收益率
+        bars = db_manager.load_monthly_bars(symbol)
         
-        if not df.empty:
+        if not bars.empty:
             # 计算月度收益率
-            monthly_returns = calculate_monthly_returns(df)
+            monthly_returns = bars['month_return'] * 100
+            
+            # 分析月度模式：各日历月份的累加器随新交易日增量更新，不需要重新汇总全部历史
+            with span('compute', rows=len(monthly_returns)):
+                monthly_stats = cached_state(db_manager, symbol).monthly_patterns()
             
-            # 分析月度模式
-            monthly_stats = analyze_monthly_patterns(monthly_returns)
+            # 重采样检验各月份的差异是否显著，结果按数据版本缓存；
+            # 几个分块在页面线程中串行计算，比在多线程的 Streamlit 服务进程中启动进程池更快
+            significance = cached_significance(
+                (db_manager.db_path, db_manager.data_version(), symbol), monthly_returns, max_workers=1
+            )
             
             # 显示月度统计图表
-            fig = plot_monthly_patterns(monthly_stats)
-            st.plotly_chart(fig, use_container_width=True)
+            show_figure(
+                (db_manager.db_path, db_manager.data_version(), 'monthly', symbol),
+                lambda: plot_monthly_patterns(monthly_stats, symbol, significance)
+            )
             
             # 显示最佳和最差月份
             best_month = monthly_stats['平均收益率'].idxmax()
@@ -137,5 +66,48 @@ def show_monthly_analysis():
                 formatted_stats[col] = formatted_stats[col].apply(lambda x: f'{x:.2f}%')
             st.dataframe(formatted_stats)
             
+            # 显示显著性检验结果
+            st.subheader('显著性检验')
+            st.caption(f"""图中误差线为块自助法（{BLOCK_LENGTH}个月为一块）{N_RESAMPLES}次重采样得到的{CONFIDENCE:.0%}置信区间。
+            置换检验p值：打乱月份标签后，该月与其余月份的平均收益率之差不小于实际差值的概率，校正p值为12个月份多重比较校正后的结果；
+            自助法p值：该月平均收益率为0的双侧检验。每月只有十几个样本，p值较大说明差异可能只是噪声。""")
+            formatted_significance = significance.copy()
+            for col in ['平均收益率', '置信下限', '置信上限', '与其他月份之差']:
+                formatted_significance[col] = formatted_significance[col].apply(lambda x: f'{x:.2f}%')
+            for col in ['置换检验p值', '校正p值', '自助法p值']:
+                formatted_significance[col] = formatted_significance[col].apply(lambda x: f'{x:.3f}')
+            st.dataframe(formatted_significance)
+            
+            show_cross_section(db_manager)
+            
         else:
-            st.warning("数据库中没有数据")
\ No newline at end of file
+            st.warning("数据库中没有数据")
+
+def show_cross_section(db_manager):
+    """数据库中有多个标的时，显示全市场各月份强弱"""
+    symbols = db_manager.get_symbols()
+    if len(symbols) < 2:
+        return
+    
+    st.subheader('全市场月度强弱')
+    closes = db_manager.load_data(symbols=symbols, columns=['close'], wide=True)
+    # 与显著性检验相同，在页面线程中串行计算，不在多线程的 Streamlit 服务进程中启动进程池
+    result = cached_cross_section(
+        (db_manager.db_path, db_manager.data_version(), tuple(symbols)), closes, max_workers=1
+    )
+    
+    metric = st.radio('热力图指标', ['平均收益率', '上涨概率'], horizontal=True)
+    if metric == '平均收益率':
+        build = lambda: plot_seasonality_heatmap(result['mean'], f'{len(symbols)}个标的各月平均收益率(%)', '收益率(%)')
+    else:
+        build = lambda: plot_seasonality_heatmap(result['hit_rate'], f'{len(symbols)}个标的各月上涨概率(%)', '上涨概率(%)', zmid=50)
+    show_figure(
+        (db_manager.db_path, db_manager.data_version(), 'cross_section', tuple(symbols), metric),
+        build,
+        symbols=len(symbols)
+    )
+    
+    st.markdown('**横截面汇总**（各标的月度平均收益率的分布）')
+    st.dataframe(result['summary'].round(2))
+    st.markdown('**等权组合月度统计**')
+    st.dataframe(result['universe'])
\ No newline at end of file
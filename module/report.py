@@ -0,0 +1,241 @@
+"""批量生成分析报表，不需要启动 Streamlit
+
+对每个标的运行月度涨幅、月夏普比率、单月表现和牛熊市周期分析，结果写成 JSON、Parquet 或静态 HTML。
+标的较多时在进程池中并行计算，每个进程各自读取数据库并写出自己的报表文件。
+summary.json 中另有全部标的的横向对比表（universe），所有标的一次向量化计算。
+
+用法: python -m module.report ^NDX QQQ --format json --output reports
+      python -m module.report --all --format html --workers 8
+"""
+import argparse
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from pathlib import Path
+from urllib.parse import quote
+
+import pandas as pd
+
+from module.analytics import (analyze_monthly_patterns, calculate_sharpe_stats, cycles_table,
+                              identify_market_cycles, rolling_sharpe)
+from module.cycle_engine import PARALLEL_MIN_SYMBOLS, sweep_universe
+from module.db_manager import DBManager, symbol_name
+from module.rolling_stats import universe_rolling_stats
+from module.seasonality import seasonality_from_bars
+
+FORMATS = ('json', 'parquet', 'html')
+# 滚动夏普比率的窗口(月)
+ROLLING_WINDOW = 12
+# 横向对比表中滚动指标的列名
+ROLLING_COLUMNS = {'return': '年化收益率', 'volatility': '年化波动率', 'sharpe': '夏普比率', 'sortino': '索提诺比率'}
+
+
+def build_report(db_manager, symbol, threshold=20, window=ROLLING_WINDOW):
+    """计算一个标的的全部分析结果
+
+    返回 (概要字典, {表名: DataFrame})；数据库中没有该标的时返回 (None, {})
+    """
+    bars = db_manager.load_monthly_bars(symbol)
+    df = db_manager.load_data(symbols=symbol, columns=['close'])
+    if bars.empty or df.empty:
+        return None, {}
+
+    monthly_returns = bars['month_return'] * 100
+    monthly_stats = analyze_monthly_patterns(monthly_returns.copy())
+    sharpe_ratio, annual_return, annual_std = calculate_sharpe_stats(monthly_returns)
+    cycles = cycles_table(identify_market_cycles(df, threshold))
+
+    tables = {
+        'monthly_stats': monthly_stats.rename_axis('月份').reset_index(),
+        'monthly_returns': monthly_returns.rename('收益率').rename_axis('date').reset_index(),
+        'rolling_sharpe': rolling_sharpe(monthly_returns, window).rename('夏普比率').rename_axis('date').reset_index(),
+        'seasonality': seasonality_from_bars(bars),
+        'cycles': cycles,
+        'prices': df.reset_index(),
+    }
+    summary = {
+        'symbol': symbol,
+        'name': symbol_name(symbol),
+        'start_date': df.index[0].strftime('%Y-%m-%d'),
+        'end_date': df.index[-1].strftime('%Y-%m-%d'),
+        'trading_days': len(df),
+        'sharpe_ratio': float(sharpe_ratio),
+        'annual_return': float(annual_return),
+        'annual_std': float(annual_std),
+        'best_month': monthly_stats['平均收益率'].idxmax(),
+        'worst_month': monthly_stats['平均收益率'].idxmin(),
+        'threshold': threshold,
+        'bull_cycles': int((cycles['type'] == 'bull').sum()),
+        'bear_cycles': int((cycles['type'] == 'bear').sum()),
+    }
+    return summary, tables
+
+
+def build_universe_tables(db_manager, symbols, window=ROLLING_WINDOW, max_workers=None):
+    """全部标的的横向对比表，返回 {表名: DataFrame}；没有数据时返回 {}
+
+    rolling: 每个标的截至最后一个月的 window 个月滚动指标，由 universe_rolling_stats 对月度收益率宽表一次计算
+    cycle_counts: 每个标的在阈值网格各阈值下的周期数，由 sweep_universe 计算，标的较多时在进程池中并行
+    """
+    returns = {symbol: db_manager.load_monthly_bars(symbol)['month_return'] * 100 for symbol in symbols}
+    returns = {symbol: series for symbol, series in returns.items() if not series.empty}
+    if not returns:
+        return {}
+
+    stats = universe_rolling_stats(pd.DataFrame(returns), (window,))
+    # 各标的的数据截止月份不同，取每个标的最后一个有效值
+    latest = pd.DataFrame({ROLLING_COLUMNS[metric]: frame[window].ffill().iloc[-1] for metric, frame in stats.items()})
+
+    # 批量读取全部历史收盘价，列式镜像比逐个查询 SQLite 快
+    closes = db_manager.load_data(symbols=list(returns), columns=['close'], engine='columnar')['close']
+    sweeps = sweep_universe(
+        {symbol: series.to_numpy() for symbol, series in closes.groupby(level='symbol', sort=False)},
+        max_workers=max_workers
+    )
+    cycle_counts = pd.DataFrame({
+        symbol: {f"{threshold}%": len(starts) for threshold, (_, starts, _) in sweep.items()}
+        for symbol, sweep in sweeps.items()
+    }).T
+
+    return {
+        'rolling': latest.rename_axis('symbol').reset_index(),
+        'cycle_counts': cycle_counts.rename_axis('symbol').reset_index(),
+    }
+
+
+def _records(table):
+    # to_json 负责把日期和 NaN 转成合法的 JSON
+    return json.loads(table.to_json(orient='records', date_format='iso', force_ascii=False))
+
+
+def _write_json(path, summary, tables):
+    payload = dict(summary)
+    payload['tables'] = {name: _records(table) for name, table in tables.items()}
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(payload, f, ensure_ascii=False, indent=4)
+
+
+def _write_parquet(path, summary, tables):
+    # 每个标的一个目录，每张表一个 Parquet 文件
+    path.mkdir(parents=True, exist_ok=True)
+    for name, table in tables.items():
+        table.to_parquet(path / f"{name}.parquet", index=False)
+    with open(path / 'summary.json', 'w', encoding='utf-8') as f:
+        json.dump(summary, f, ensure_ascii=False, indent=4)
+
+
+def _write_html(path, summary, tables, window=ROLLING_WINDOW):
+    # 只有生成 HTML 时才需要 Plotly
+    from module.charts import plot_market_cycles, plot_monthly_patterns, plot_rolling_sharpe
+
+    symbol = summary['symbol']
+    monthly_returns = tables['monthly_returns'].set_index('date')['收益率']
+    cycles = tables['cycles']
+    prices = tables['prices'].set_index('date')
+
+    figures = [
+        plot_monthly_patterns(tables['monthly_stats'].set_index('月份'), symbol),
+        plot_rolling_sharpe(monthly_returns, window),
+        plot_market_cycles(prices, cycles.to_dict('records'), symbol),
+    ]
+    sections = [
+        f"<h1>{summary['name']} ({symbol})</h1>",
+        f"<p>{summary['start_date']} 至 {summary['end_date']}，共 {summary['trading_days']} 个交易日；"
+        f"夏普比率 {summary['sharpe_ratio']:.2f}，年化收益率 {summary['annual_return']:.2f}%，"
+        f"年化波动率 {summary['annual_std']:.2f}%</p>",
+    ]
+    # 第一张图内联一次 plotly.js 之外，其余图表复用，保证报表离线可看
+    for i, fig in enumerate(figures):
+        sections.append(fig.to_html(full_html=False, include_plotlyjs=(i == 0)))
+    sections.append("<h2>月度统计</h2>" + tables['monthly_stats'].to_html(index=False))
+    sections.append("<h2>周期详细数据</h2>" + cycles.to_html(index=False))
+
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write("<!DOCTYPE html><html><head><meta charset='utf-8'>"
+                f"<title>{symbol} 分析报表</title></head><body>{''.join(sections)}</body></html>")
+
+
+def report_symbol(symbol, output_dir, fmt='json', db_dir='db', threshold=20):
+    """生成并写出一个标的的报表，返回概要字典；没有数据时返回 None
+
+    在工作进程中运行，只把概要传回主进程
+    """
+    summary, tables = build_report(DBManager(db_dir), symbol, threshold)
+    if summary is None:
+        return None
+
+    stem = Path(output_dir) / quote(symbol, safe='')
+    if fmt == 'json':
+        path = stem.with_suffix('.json')
+        _write_json(path, summary, tables)
+    elif fmt == 'parquet':
+        path = stem
+        _write_parquet(path, summary, tables)
+    elif fmt == 'html':
+        path = stem.with_suffix('.html')
+        _write_html(path, summary, tables)
+    else:
+        raise ValueError(f"不支持的报表格式: {fmt}")
+
+    summary['path'] = str(path)
+    return summary
+
+
+def run_reports(symbols, output_dir='reports', fmt='json', db_dir='db', threshold=20, max_workers=None):
+    """为多个标的生成报表，标的较多时在进程池中并行；返回 {标的: 概要或 None}"""
+    os.makedirs(output_dir, exist_ok=True)
+    symbols = list(symbols)
+    if max_workers == 1 or len(symbols) < PARALLEL_MIN_SYMBOLS:
+        return {symbol: report_symbol(symbol, output_dir, fmt, db_dir, threshold) for symbol in symbols}
+
+    chunksize = max(1, len(symbols) // ((max_workers or os.cpu_count() or 1) * 4))
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        results = executor.map(
+            report_symbol,
+            symbols,
+            repeat(output_dir),
+            repeat(fmt),
+            repeat(db_dir),
+            repeat(threshold),
+            chunksize=chunksize
+        )
+        return dict(zip(symbols, results))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='批量生成分析报表')
+    parser.add_argument('symbols', nargs='*', help='标的代码，如 ^NDX')
+    parser.add_argument('--all', action='store_true', help='数据库中的全部标的')
+    parser.add_argument('--format', choices=FORMATS, default='json')
+    parser.add_argument('--output', default='reports', help='报表输出目录')
+    parser.add_argument('--db-dir', default='db')
+    parser.add_argument('--threshold', type=float, default=20, help='牛熊市判断阈值(%%)')
+    parser.add_argument('--workers', type=int, default=None, help='工作进程数，默认为 CPU 核数')
+    args = parser.parse_args(argv)
+
+    symbols = DBManager(args.db_dir).get_symbols() if args.all else args.symbols
+    if not symbols:
+        parser.error('请指定标的或使用 --all')
+
+    results = run_reports(symbols, args.output, args.format, args.db_dir, args.threshold, args.workers)
+
+    missing = [symbol for symbol, summary in results.items() if summary is None]
+    summaries = [summary for summary in results.values() if summary is not None]
+    universe = build_universe_tables(
+        DBManager(args.db_dir), [summary['symbol'] for summary in summaries], max_workers=args.workers
+    )
+    with open(os.path.join(args.output, 'summary.json'), 'w', encoding='utf-8') as f:
+        json.dump({
+            'reports': summaries,
+            'missing': missing,
+            'universe': {name: _records(table) for name, table in universe.items()},
+        }, f, ensure_ascii=False, indent=4)
+
+    print(f"已生成 {len(summaries)} 个标的的报表: {args.output}")
+    if missing:
+        print(f"数据库中没有数据: {', '.join(missing)}")
+
+
+if __name__ == '__main__':
+    main()
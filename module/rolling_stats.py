@@ -0,0 +1,121 @@
+import numpy as np
+import pandas as pd
+
+from module.db_manager import FrameCache
+from module.instrumentation import span
+
+# 计算夏普比率、索提诺比率时使用的无风险利率(%)
+RISK_FREE_RATE = 2.0
+# 滚动窗口(月)：3 到 120 个月
+ROLLING_WINDOWS = tuple(range(3, 121))
+ROLLING_METRICS = ('return', 'volatility', 'sharpe', 'sortino')
+
+# 滚动统计结果的进程级缓存，键由调用方提供（应包含数据版本）
+rolling_cache = FrameCache(maxsize=64)
+
+
+def _prefix(values):
+    """沿时间轴的前缀和，首行补 0，使窗口 (t-w, t] 的和为 s[t] - s[t-w]"""
+    return np.concatenate([np.zeros((1, values.shape[1])), np.cumsum(values, axis=0)])
+
+
+def rolling_grid(values, windows=ROLLING_WINDOWS, risk_free_rate=RISK_FREE_RATE):
+    """基于前缀和一次计算所有窗口的滚动年化收益率、年化波动率、夏普比率和索提诺比率
+
+    values: 月度收益率(%)，一维 (T,) 或二维 (T, 标的数)
+    返回 {指标: 数组}，数组形状为 (窗口数, T) 或 (窗口数, T, 标的数)。
+    与 pandas rolling(window) 相同：窗口未满或窗口内有缺失值时为 NaN，标准差为样本标准差。
+    索提诺比率的下行偏差以月度无风险收益率为目标收益。
+    """
+    values = np.asarray(values, dtype=float)
+    squeeze = values.ndim == 1
+    if squeeze:
+        values = values[:, None]
+    n_periods = values.shape[0]
+
+    valid = ~np.isnan(values)
+    # 减去整体均值再累加，降低前缀和相减时的舍入误差（方差与平移无关）
+    with np.errstate(invalid='ignore'):
+        center = np.where(valid.any(axis=0), np.nanmean(np.where(valid, values, np.nan), axis=0), 0.0)
+    centered = np.where(valid, values - center, 0.0)
+    downside = np.where(valid, np.minimum(values - risk_free_rate / 12, 0.0), 0.0)
+
+    sum1 = _prefix(centered)
+    sum2 = _prefix(centered ** 2)
+    sum_down = _prefix(downside ** 2)
+    count = _prefix(valid.astype(float))
+
+    # (窗口数, T) 的窗口起止位置，一次花式索引得到所有窗口的区间和
+    w = np.asarray(windows, dtype=np.int64)[:, None]
+    end = np.arange(1, n_periods + 1)[None, :]
+    start = end - w
+    complete = start >= 0
+    start = np.maximum(start, 0)
+
+    def window_sum(prefix):
+        return prefix[end] - prefix[start]
+
+    w = w[:, :, None].astype(float)
+    complete = complete[:, :, None] & (window_sum(count) == w)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        s1 = window_sum(sum1)
+        mean = s1 / w + center
+        variance = np.maximum((window_sum(sum2) - s1 ** 2 / w) / (w - 1), 0.0)
+        annual_return = mean * 12
+        volatility = np.sqrt(variance) * (12 ** 0.5)
+        downside_deviation = np.sqrt(window_sum(sum_down) / w) * (12 ** 0.5)
+        grid = {
+            'return': annual_return,
+            'volatility': volatility,
+            'sharpe': (annual_return - risk_free_rate) / volatility,
+            'sortino': (annual_return - risk_free_rate) / downside_deviation,
+        }
+
+    for metric, array in grid.items():
+        array[~complete] = np.nan
+        grid[metric] = array[:, :, 0] if squeeze else array
+    return grid
+
+
+def rolling_stats(monthly_returns, windows=ROLLING_WINDOWS, risk_free_rate=RISK_FREE_RATE):
+    """单个标的所有窗口的滚动指标
+
+    monthly_returns: 月度收益率(%) Series
+    返回 {指标: DataFrame}，索引为日期、列为窗口(月)，取某个窗口只需 df[window]
+    """
+    grid = rolling_grid(monthly_returns.to_numpy(dtype=float), windows, risk_free_rate)
+    return {
+        metric: pd.DataFrame(array.T, index=monthly_returns.index, columns=list(windows))
+        for metric, array in grid.items()
+    }
+
+
+def cached_rolling_stats(key, monthly_returns, windows=ROLLING_WINDOWS):
+    """带缓存的 rolling_stats；key 相同（同一数据版本、同一标的）时直接返回缓存结果"""
+    with span('rolling_stats') as record:
+        key = (key, tuple(windows))
+        stats = rolling_cache.get(key)
+        record['cache'] = 'miss' if stats is None else 'hit'
+        if stats is None:
+            stats = rolling_stats(monthly_returns, windows)
+            rolling_cache.put(key, stats)
+        return stats
+
+
+def universe_rolling_stats(returns, windows=(12,), risk_free_rate=RISK_FREE_RATE):
+    """多个标的的滚动指标，所有标的和窗口一次向量化计算
+
+    returns: 月度收益率(%) 宽表，索引为日期、列为标的（如 DBManager.load_data(wide=True) 按月汇总后的结果）
+    返回 {指标: DataFrame}，列为 (窗口, 标的) 两级索引。
+    结果大小为 窗口数 × 月数 × 标的数，全市场计算全部窗口时可分批传入 windows。
+    """
+    grid = rolling_grid(returns.to_numpy(dtype=float), windows, risk_free_rate)
+    columns = pd.MultiIndex.from_product([list(windows), returns.columns], names=['window', 'symbol'])
+    return {
+        metric: pd.DataFrame(
+            array.transpose(1, 0, 2).reshape(len(returns), -1),
+            index=returns.index,
+            columns=columns
+        )
+        for metric, array in grid.items()
+    }
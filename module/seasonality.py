@@ -0,0 +1,44 @@
+import pandas as pd
+
+# 每年每月表现表的列
+SEASONALITY_COLUMNS = ['年份', '月份', '收益率', '开盘价', '收盘价', '最高价', '最低价']
+
+
+def monthly_seasonality(df):
+    """对日线按 (年, 月) 做一次 groupby，得到每年每个月的月内表现
+
+    收益率为月内第一个收盘价到最后一个收盘价的涨跌幅(%)，
+    返回按年份、月份排序的 SEASONALITY_COLUMNS 表
+    """
+    grouped = df.groupby([df.index.year, df.index.month])
+    first_close = grouped['close'].first()
+    last_close = grouped['close'].last()
+
+    table = pd.DataFrame({
+        '收益率': (last_close - first_close) / first_close * 100,
+        '开盘价': grouped['open'].first(),
+        '收盘价': last_close,
+        '最高价': grouped['high'].max(),
+        '最低价': grouped['low'].min(),
+    })
+    table.index.names = ['年份', '月份']
+    return table.reset_index()[SEASONALITY_COLUMNS]
+
+
+def seasonality_from_bars(bars):
+    """由预先聚合的月线（DBManager.load_monthly_bars）得到与 monthly_seasonality 相同的表"""
+    return pd.DataFrame({
+        '年份': bars.index.year,
+        '月份': bars.index.month,
+        '收益率': (bars['close'] - bars['first_close']) / bars['first_close'] * 100,
+        '开盘价': bars['open'],
+        '收盘价': bars['close'],
+        '最高价': bars['high'],
+        '最低价': bars['low'],
+    }).reset_index(drop=True)
+
+
+def analyze_month(seasonality, month):
+    """从每年每月表现表中取出某个月份的历年数据"""
+    month_data = seasonality[seasonality['月份'] == month]
+    return month_data.drop(columns='月份').reset_index(drop=True)
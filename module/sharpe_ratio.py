@@ -1,77 +1,34 @@
 import streamlit as st
-import pandas as pd
-import plotly.graph_objects as go
-from module.db_manager import DBManager
-
-def calculate_monthly_sharpe(df):
-    """计算月度夏普比率"""
-    # 计算月度收益率
-    monthly_returns = df['close'].resample('M').last().pct_change() * 100
-    
-    # 计算年化收益率和标准差
-    annual_return = monthly_returns.mean() * 12
-    annual_std = monthly_returns.std() * (12 ** 0.5)
-    
-    # 假设无风险利率为2%
-    risk_free_rate = 2.0
-    
-    # 计算夏普比率
-    sharpe_ratio = (annual_return - risk_free_rate) / annual_std
-    
-    return monthly_returns, sharpe_ratio, annual_return, annual_std
-
-def plot_rolling_sharpe(monthly_returns, window=12):
-    """绘制滚动夏普比率"""
-    # 计算滚动夏普比率
-    rolling_return = monthly_returns.rolling(window).mean() * 12
-    rolling_std = monthly_returns.rolling(window).std() * (12 ** 0.5)
-    risk_free_rate = 2.0
-    rolling_sharpe = (rolling_return - risk_free_rate) / rolling_std
-    
-    # 创建图表
-    fig = go.Figure()
-    
-    # 添加滚动夏普比率线
-    fig.add_trace(go.Scatter(
-        x=rolling_sharpe.index,
-        y=rolling_sharpe.values,
-        mode='lines',
-        name='滚动夏普比率'
-    ))
-    
-    # 添加零线
-    fig.add_hline(y=0, line_dash="dash", line_color="red")
-    
-    # 更新布局
-    fig.update_layout(
-        title=f'{window}个月滚动夏普比率',
-        xaxis_title='日期',
-        yaxis_title='夏普比率',
-        height=500,
-        showlegend=True
-    )
-    
-    return fig
+from module.db_manager import DBManager, DEFAULT_SYMBOL, symbol_name
+from module.instrumentation import span
+from module.analytics import calculate_sharpe_stats
+from module.rolling_stats import ROLLING_WINDOWS, cached_rolling_stats
+from module.charts import ROLLING_METRIC_LABELS, plot_rolling_metric
+from module.figure_cache import show_figure
+from module.incremental import cached_state
 
 def show_sharpe_analysis():
     st.title('月夏普比率分析')
     
     db_manager = DBManager()
-    metadata = db_manager.get_metadata()
+    symbol = st.session_state.get('symbol', DEFAULT_SYMBOL)
+    metadata = db_manager.get_metadata(symbol)
     
     if metadata["total_records"] == 0:
-        st.warning("数据库中没有数据，请先在'下载数据'页面下载数据。")
+        st.warning(f"数据库中没有 {symbol} 的数据，请先在'下载数据'页面下载数据。")
         return
     
-    st.info(f"""当前数据范围: {metadata["start_date"]} 至 {metadata["end_date"]}
+    st.info(f"""{symbol_name(symbol)} 当前数据范围: {metadata["start_date"]} 至 {metadata["end_date"]}
     总记录数: {metadata["total_records"]}""")
     
-    # 加载数据
-    df = db_manager.load_data()
+    # 加载月线数据
+    bars = db_manager.load_monthly_bars(symbol)
     
-    if not df.empty:
-        # 计算夏普比率
-        monthly_returns, sharpe_ratio, annual_return, annual_std = calculate_monthly_sharpe(df)
+    if not bars.empty:
+        # 计算夏普比率（月度收益率来自预先聚合的月线）
+        monthly_returns = bars['month_return'] * 100
+        with span('compute', rows=len(monthly_returns)):
+            sharpe_ratio, annual_return, annual_std = calculate_sharpe_stats(monthly_returns)
         
         # 显示总体统计
         col1, col2, col3 = st.columns(3)
@@ -84,9 +41,23 @@ def show_sharpe_analysis():
         
         # 绘制滚动夏普比率图
         st.subheader("滚动夏普比率分析")
-        window = st.slider("选择滚动窗口(月)", min_value=6, max_value=36, value=12, step=6)
-        fig = plot_rolling_sharpe(monthly_returns, window)
-        st.plotly_chart(fig, use_container_width=True)
+        col1, col2 = st.columns([3, 1])
+        with col1:
+            window = st.slider("选择滚动窗口(月)", min_value=ROLLING_WINDOWS[0], max_value=ROLLING_WINDOWS[-1], value=12)
+        with col2:
+            metrics = {ROLLING_METRIC_LABELS[m]: m for m in ('sharpe', 'sortino', 'volatility')}
+            metric = metrics[st.selectbox("指标", list(metrics))]
+        # 所有窗口的滚动指标只在数据变化时计算一次，拖动滑块只需查表
+        stats = cached_rolling_stats((db_manager.db_path, db_manager.data_version(), symbol), monthly_returns)
+        show_figure(
+            (db_manager.db_path, db_manager.data_version(), 'sharpe', symbol, window, metric),
+            lambda: plot_rolling_metric(stats[metric][window], window, metric),
+            window=window,
+            metric=metric
+        )
+        # 当前值来自增量更新的分析状态，只用最近的月份计算
+        latest = cached_state(db_manager, symbol).latest_rolling()[metric][window]
+        st.caption(f"截至最新交易日的 {window} 个月滚动{ROLLING_METRIC_LABELS[metric]}: {latest:.2f}")
         
         # 解释说明
         st.info("""
@@ -94,6 +65,7 @@ def show_sharpe_analysis():
         - 夏普比率 > 1: 优秀的风险调整后收益
         - 夏普比率 0-1: 可接受的风险调整后收益
         - 夏普比率 < 0: 风险调整后收益不及无风险利率
+        - 索提诺比率只把低于无风险收益的月份计入波动，不惩罚上涨带来的波动
         
         当前分析使用2%作为无风险利率基准。
         """) 
\ No newline at end of file
@@ -0,0 +1,139 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+
+import numpy as np
+import pandas as pd
+
+from module.analytics import MONTH_NAMES
+from module.db_manager import FrameCache
+from module.instrumentation import span
+
+# 默认重采样次数
+N_RESAMPLES = 10000
+# 块自助法的块长度(月)，保留收益率的自相关
+BLOCK_LENGTH = 12
+# 每个任务的重采样次数；分块数量只由总次数决定，结果与进程数无关
+CHUNK_SIZE = 2000
+# 置信区间水平
+CONFIDENCE = 0.95
+
+# 显著性检验结果的进程级缓存，键由调用方提供（应包含数据版本）
+significance_cache = FrameCache(maxsize=64)
+
+
+def _month_means(values, months, counts):
+    """每一行样本中各日历月份的平均值；values、months 形状为 (重采样次数, n)"""
+    n_rows = values.shape[0]
+    keys = (np.arange(n_rows)[:, None] * 12 + months).ravel()
+    sums = np.bincount(keys, weights=values.ravel(), minlength=n_rows * 12).reshape(n_rows, 12)
+    if counts is None:
+        counts = np.bincount(keys, minlength=n_rows * 12).reshape(n_rows, 12)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return sums / counts
+
+
+def _resample_chunk(returns, months, seed, size, block_length):
+    """一个分块的置换检验和块自助法
+
+    返回 (置换后各月份均值与其余月份均值之差 (size, 12), 块自助法各月份均值 (size, 12))
+    """
+    rng = np.random.default_rng(seed)
+    n = len(returns)
+    counts = np.bincount(months, minlength=12)
+    total = returns.sum()
+
+    # 置换检验：打乱月份标签（等价于打乱收益率的位置），月份样本数保持不变
+    order = rng.permuted(np.tile(np.arange(n), (size, 1)), axis=1)
+    permuted = _month_means(returns[order], np.broadcast_to(months, (size, n)), counts)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        others = (total - permuted * counts) / (n - counts)
+    permuted_diff = permuted - others
+
+    # 循环块自助法：随机起点的连续块拼接，块内保留原来的月份标签
+    n_blocks = -(-n // block_length)
+    starts = rng.integers(0, n, size=(size, n_blocks))
+    index = ((starts[:, :, None] + np.arange(block_length)) % n).reshape(size, -1)[:, :n]
+    boot = _month_means(returns[index], months[index], None)
+    return permuted_diff, boot
+
+
+def _bh_adjust(p_values):
+    """Benjamini-Hochberg 多重比较校正"""
+    p = np.asarray(p_values, dtype=float)
+    order = np.argsort(p)
+    ranked = p[order] * len(p) / np.arange(1, len(p) + 1)
+    adjusted = np.minimum.accumulate(ranked[::-1])[::-1]
+    result = np.empty_like(p)
+    result[order] = np.minimum(adjusted, 1.0)
+    return result
+
+
+def seasonality_significance(monthly_returns, n_resamples=N_RESAMPLES, seed=0,
+                             block_length=BLOCK_LENGTH, confidence=CONFIDENCE, max_workers=None):
+    """各日历月份平均收益率的显著性检验
+
+    monthly_returns: 月度收益率(%) Series，索引为日期
+    置换检验：打乱月份标签，检验该月平均收益率与其余月份是否不同（双侧）；
+    块自助法：按 block_length 个月的块重采样，得到该月平均收益率的置信区间，
+    以及平均收益率是否不为 0 的双侧 p 值。
+    重采样按 CHUNK_SIZE 分块，每块的随机种子由 seed 派生，分块多于一个时在进程池中并行；
+    相同的 seed 和 n_resamples 得到相同的结果，与进程数无关。
+    返回以月份名称为索引的 DataFrame
+    """
+    returns = monthly_returns.dropna()
+    values = returns.to_numpy(dtype=float)
+    months = (returns.index.month - 1).to_numpy()
+    counts = np.bincount(months, minlength=12)
+
+    sizes = [CHUNK_SIZE] * (n_resamples // CHUNK_SIZE)
+    if n_resamples % CHUNK_SIZE:
+        sizes.append(n_resamples % CHUNK_SIZE)
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+
+    if len(sizes) == 1 or max_workers == 1:
+        results = [_resample_chunk(values, months, s, size, block_length) for s, size in zip(seeds, sizes)]
+    else:
+        with ProcessPoolExecutor(max_workers=min(len(sizes), max_workers or os.cpu_count() or 1)) as executor:
+            results = list(executor.map(
+                _resample_chunk, repeat(values), repeat(months), seeds, sizes, repeat(block_length)
+            ))
+    permuted_diff = np.concatenate([r[0] for r in results])
+    boot = np.concatenate([r[1] for r in results])
+
+    observed = _month_means(values[None, :], months[None, :], counts[None, :])[0]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        observed_diff = observed - (values.sum() - observed * counts) / (len(values) - counts)
+
+    # p 值加 1 校正，避免重采样次数有限时得到 0
+    permutation_p = ((np.abs(permuted_diff) >= np.abs(observed_diff)).sum(axis=0) + 1) / (n_resamples + 1)
+    below = ((boot <= 0).sum(axis=0) + 1) / (n_resamples + 1)
+    above = ((boot >= 0).sum(axis=0) + 1) / (n_resamples + 1)
+    bootstrap_p = np.minimum(2 * np.minimum(below, above), 1.0)
+    alpha = (1 - confidence) / 2
+
+    return pd.DataFrame({
+        '平均收益率': observed,
+        '置信下限': np.nanquantile(boot, alpha, axis=0),
+        '置信上限': np.nanquantile(boot, 1 - alpha, axis=0),
+        '与其他月份之差': observed_diff,
+        '置换检验p值': permutation_p,
+        '校正p值': _bh_adjust(permutation_p),
+        '自助法p值': bootstrap_p,
+        '样本数': counts,
+    }, index=MONTH_NAMES)
+
+
+def cached_significance(key, monthly_returns, n_resamples=N_RESAMPLES, seed=0, max_workers=None):
+    """带缓存的 seasonality_significance；key 相同（同一数据版本、同一标的）时直接返回缓存结果
+
+    结果与进程数无关，max_workers 不参与缓存键
+    """
+    with span('significance', resamples=n_resamples) as record:
+        key = (key, n_resamples, seed)
+        result = significance_cache.get(key)
+        record['cache'] = 'miss' if result is None else 'hit'
+        if result is None:
+            result = seasonality_significance(monthly_returns, n_resamples, seed, max_workers=max_workers)
+            significance_cache.put(key, result)
+        return result.copy()
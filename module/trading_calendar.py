@@ -0,0 +1,97 @@
+import numpy as np
+
+# 因特殊事件临时休市的交易日（国葬、9·11、飓风桑迪等）
+NYSE_SPECIAL_CLOSURES = np.array([
+    '1994-04-27',
+    '2001-09-11', '2001-09-12', '2001-09-13', '2001-09-14',
+    '2004-06-11',
+    '2007-01-02',
+    '2012-10-29', '2012-10-30',
+    '2018-12-05',
+    '2025-01-09',
+], dtype='datetime64[D]')
+
+
+def _weekday(days):
+    """星期几，周一为 0（1970-01-01 是周四）"""
+    return (days.astype(np.int64) + 3) % 7
+
+
+def _month_first_day(years, month):
+    """每年 month 月 1 日；month 可以是数组，13 表示下一年 1 月"""
+    months = (years - 1970) * 12 + (month - 1)
+    return months.astype('datetime64[M]').astype('datetime64[D]')
+
+
+def _nth_weekday(years, month, weekday, n):
+    """每年 month 月第 n 个星期 weekday（'Mon'、'Thu' 等）"""
+    return np.busday_offset(_month_first_day(years, month), n - 1, roll='forward', weekmask=weekday)
+
+
+def _last_weekday(years, month, weekday):
+    """每年 month 月最后一个星期 weekday"""
+    return np.busday_offset(_month_first_day(years, month + 1), -1, roll='forward', weekmask=weekday)
+
+
+def _observed(days):
+    """固定日期假日遇周六提前到周五、遇周日顺延到周一"""
+    weekday = _weekday(days)
+    return days + np.where(weekday == 5, -1, 0) + np.where(weekday == 6, 1, 0)
+
+
+def _easter(years):
+    """公历复活节日期（Anonymous Gregorian algorithm），对年份数组向量化计算"""
+    a = years % 19
+    b = years // 100
+    c = years % 100
+    d = b // 4
+    e = b % 4
+    f = (b + 8) // 25
+    g = (b - f + 1) // 3
+    h = (19 * a + b - d - g + 15) % 30
+    i = c // 4
+    k = c % 4
+    l = (32 + 2 * e + 2 * i - h - k) % 7
+    m = (a + 11 * h + 22 * l) // 451
+    month = (h + l - 7 * m + 114) // 31
+    day = (h + l - 7 * m + 114) % 31 + 1
+    return _month_first_day(years, month) + (day - 1)
+
+
+def nyse_holidays(start_year, end_year):
+    """纽约证券交易所 start_year 至 end_year（含）的休市日，返回排序后的 datetime64[D] 数组"""
+    years = np.arange(start_year, end_year + 1)
+
+    # 元旦遇周日顺延到周一；遇周六不提前（前一年 12 月 31 日照常交易）
+    new_year = _month_first_day(years, 1)
+    new_year = np.where(_weekday(new_year) == 6, new_year + 1, new_year)
+    new_year = new_year[_weekday(new_year) < 5]
+
+    juneteenth_years = years[years >= 2022]
+
+    holidays = np.concatenate([
+        new_year,
+        _nth_weekday(years[years >= 1998], 1, 'Mon', 3),   # 马丁·路德·金纪念日
+        _nth_weekday(years, 2, 'Mon', 3),                   # 华盛顿诞辰纪念日
+        _easter(years) - 2,                                 # 耶稣受难日
+        _last_weekday(years, 5, 'Mon'),                     # 阵亡将士纪念日
+        _observed(_month_first_day(juneteenth_years, 6) + 18),  # 六月节
+        _observed(_month_first_day(years, 7) + 3),          # 独立日
+        _nth_weekday(years, 9, 'Mon', 1),                   # 劳动节
+        _nth_weekday(years, 11, 'Thu', 4),                  # 感恩节
+        _observed(_month_first_day(years, 12) + 24),        # 圣诞节
+        NYSE_SPECIAL_CLOSURES,
+    ]).astype('datetime64[D]')
+
+    in_range = (holidays >= _month_first_day(np.array([start_year]), 1)[0]) & \
+               (holidays < _month_first_day(np.array([end_year + 1]), 1)[0])
+    return np.unique(holidays[in_range])
+
+
+def trading_days(start, end):
+    """[start, end] 之间（含两端）的纽约证券交易所交易日"""
+    start = np.datetime64(start, 'D')
+    end = np.datetime64(end, 'D')
+    days = np.arange(start, end + 1)
+    holidays = nyse_holidays(start.astype(object).year, end.astype(object).year)
+    return days[np.is_busday(days, holidays=holidays)]
@@ -0,0 +1,51 @@
+"""批量下载的命令行入口使用本地文件数据源（离线运行）
+
+用法: python -m pytest tests
+"""
+import os
+
+import pytest
+
+from benchmarks.synthetic import make_ohlcv
+from module import bulk_downloader
+from module.db_manager import DBManager
+
+
+@pytest.fixture
+def csv_dir(tmp_path):
+    directory = tmp_path / 'csv'
+    directory.mkdir()
+    for i, symbol in enumerate(['AAA', 'BBB']):
+        # 与 yfinance history 导出的 CSV 相同的列名
+        df = make_ohlcv(600, seed=i, start='2015-01-02').drop(columns='pe_ratio')
+        df.columns = ['Open', 'High', 'Low', 'Close', 'Volume', 'Dividends', 'Stock Splits']
+        df.rename_axis('Date').to_csv(directory / f"{symbol}.csv")
+    return directory
+
+
+def _run(tmp_path, *extra):
+    db_dir = tmp_path / 'db'
+    db_dir.mkdir(exist_ok=True)
+    summary = bulk_downloader.main(['AAA', 'BBB', '--start', '2015-01-01', '--end', '2018-01-01',
+                                    '--db-dir', str(db_dir), *extra])
+    return summary, DBManager(str(db_dir))
+
+
+def test_cli_source_dir(tmp_path, csv_dir, monkeypatch):
+    monkeypatch.delenv(bulk_downloader.SOURCE_DIR_ENV, raising=False)
+    summary, db_manager = _run(tmp_path, '--source-dir', str(csv_dir))
+    assert summary['AAA']['inserted'] == 600 and not summary['AAA']['failed']
+    assert db_manager.get_symbols() == ['AAA', 'BBB']
+    assert os.path.exists(tmp_path / 'db' / bulk_downloader.CHECKPOINT_FILE)
+
+    # 重新运行时所有分块已记入断点，不再读取
+    summary, _ = _run(tmp_path, '--source-dir', str(csv_dir))
+    assert summary['AAA'] == {'inserted': 0, 'updated': 0, 'failed': []}
+
+
+def test_cli_source_env(tmp_path, csv_dir, monkeypatch):
+    monkeypatch.setenv(bulk_downloader.SOURCE_DIR_ENV, str(csv_dir))
+    assert isinstance(bulk_downloader.default_source(), bulk_downloader.FileSource)
+    summary, db_manager = _run(tmp_path)
+    assert summary['BBB']['inserted'] == 600
+    assert len(db_manager.load_data(symbols='BBB', columns=['close'])) == 600
@@ -0,0 +1,61 @@
+"""列式镜像（engine="columnar"）与 SQLite 读取结果的一致性
+
+用法: python -m pytest tests
+"""
+import os
+
+import pandas as pd
+import pytest
+
+from benchmarks.synthetic import make_ohlcv
+from module.db_manager import DBManager
+
+pa = pytest.importorskip('pyarrow')
+
+
+@pytest.fixture
+def db_manager(tmp_path):
+    db_manager = DBManager(str(tmp_path))
+    db_manager.save_data(make_ohlcv(300, seed=1), 'AAA')
+    # 没有分红和拆股列的标的，镜像中这两列全为空值
+    db_manager.save_data(make_ohlcv(200, seed=2).drop(columns=['dividends', 'stock_splits']), 'BBB')
+    return db_manager
+
+
+def _load_both(db_manager, **kwargs):
+    sqlite_df = db_manager.load_data(engine='sqlite', **kwargs)
+    columnar_df = db_manager.load_data(engine='columnar', **kwargs)
+    return sqlite_df, columnar_df
+
+
+@pytest.mark.parametrize('symbols', [
+    ['NOPE', 'AAA'],
+    ['AAA', 'NOPE'],
+    ['BBB', 'AAA'],
+    ['AAA', 'BBB', 'NOPE'],
+])
+def test_mixed_and_missing_symbols(db_manager, symbols):
+    sqlite_df, columnar_df = _load_both(db_manager, symbols=symbols)
+    pd.testing.assert_frame_equal(sqlite_df, columnar_df, check_dtype=False)
+    assert len(columnar_df) == len(db_manager.load_data(symbols=[s for s in symbols if s != 'NOPE']))
+
+
+def test_missing_optional_columns(db_manager):
+    sqlite_df, columnar_df = _load_both(db_manager, symbols=['BBB', 'AAA'], columns=['close', 'dividends'], wide=True)
+    pd.testing.assert_frame_equal(sqlite_df, columnar_df, check_dtype=False)
+    assert columnar_df[('dividends', 'BBB')].isna().loc['2000-01-03':'2000-09-01'].all()
+
+
+def test_unknown_symbol_not_exported(db_manager):
+    _, columnar_df = _load_both(db_manager, symbols=['NOPE', 'MISSING'])
+    assert columnar_df.empty
+    assert not os.path.exists(db_manager._columnar_path('NOPE'))
+    assert db_manager.write_columnar('NOPE') is False
+
+
+def test_mirror_schema(db_manager):
+    assert db_manager.write_columnar('BBB')
+    with pa.memory_map(db_manager._columnar_path('BBB'), 'r') as source:
+        schema = pa.ipc.open_file(source).schema
+    assert schema.field('date').type == pa.timestamp('ns')
+    assert all(schema.field(name).type == pa.float64() for name in schema.names if name != 'date')
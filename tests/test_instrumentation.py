@@ -0,0 +1,35 @@
+"""结构化性能日志的轮转和尾部读取
+
+用法: python -m pytest tests
+"""
+import os
+
+from module import instrumentation
+from module.instrumentation import load_perf_log, write_log
+
+
+def _record(i):
+    return {'ts': str(i), 'page': 'p', 'total_ms': float(i), 'error': None,
+            'spans': [{'name': 'load', 'ms': 1.0, 'depth': 0, 'start_ms': 0.0}]}
+
+
+def test_load_reads_only_tail(tmp_path, monkeypatch):
+    # 块小于一行，跨块拼接的行也要完整
+    monkeypatch.setattr(instrumentation, 'TAIL_BLOCK_BYTES', 37)
+    path = str(tmp_path / 'perf.jsonl')
+    for i in range(50):
+        write_log(_record(i), path)
+    df = load_perf_log(path, max_records=7)
+    totals = df.loc[df['name'] == 'total', 'ms'].tolist()
+    assert totals == [float(i) for i in range(43, 50)]
+    assert len(load_perf_log(path, max_records=1000)) == 100
+
+
+def test_log_rotates(tmp_path):
+    path = str(tmp_path / 'perf.jsonl')
+    for i in range(200):
+        write_log(_record(i), path, max_bytes=4096)
+    assert os.path.getsize(path) <= 4096
+    assert os.path.getsize(f"{path}.1") <= 4096 + 200
+    assert not os.path.exists(f"{path}.2")
+    assert load_perf_log(path, max_records=1000)['ms'].max() == 199.0
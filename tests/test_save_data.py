@@ -0,0 +1,30 @@
+"""多个进程同时写入同一个数据库时元数据的记录数与行情表一致
+
+用法: python -m pytest tests
+"""
+import multiprocessing
+
+from benchmarks.synthetic import make_ohlcv
+from module.db_manager import DBManager
+
+
+def _save(db_dir, start):
+    DBManager(db_dir).save_data(make_ohlcv(2000, seed=0).iloc[start:start + 1500], 'AAA')
+
+
+def test_concurrent_processes_count_rows_once(tmp_path):
+    db_dir = str(tmp_path)
+    DBManager(db_dir)
+    # 各进程写入的日期范围互相重叠
+    processes = [multiprocessing.Process(target=_save, args=(db_dir, start)) for start in (0, 100, 200, 300, 500)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+    assert all(process.exitcode == 0 for process in processes)
+
+    db_manager = DBManager(db_dir)
+    with db_manager.pool.reader() as conn:
+        count = conn.execute("SELECT COUNT(*) FROM prices WHERE symbol = 'AAA'").fetchone()[0]
+    assert count == 2000
+    assert db_manager.get_metadata('AAA')['total_records'] == count